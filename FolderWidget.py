@@ -11,7 +11,6 @@ try:
 except:
     from PySide.QtCore import *
     from PySide.QtGui import *
-    from PySide.QtWebKit import *
 
 
 class BrowserButton(QToolButton):
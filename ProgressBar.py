@@ -12,7 +12,6 @@ try:
 except:
     from PySide.QtCore import *
     from PySide.QtGui import *
-    from PySide.QtWebKit import *
 
 
 class ProgressTask(QDialog):
@@ -0,0 +1,502 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+素材库的常驻序列索引。第一次用DayuPath.scan扫描整个素材库，之后通过文件系统监听（linux下inotify，其他系统轮询文件夹的修改时间）
+增量更新文件的增加、重命名和删除，get_new_file_knob_dict可以直接查询索引而不用重新扫描磁盘。
+索引也可以保存成JSON文件，下次启动时直接读取。
+"""
+
+import bisect
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from dayu_path import DayuPath as DiskPath
+from dayu_path.constants import SCAN_IGNORE
+from dayu_path.prune import DirectoryPruner
+from dayu_path.prune import walk_tree
+from utils import name_format
+from utils import norm_key
+from utils import split_version
+
+
+class IndexView(object):
+    """
+    索引的只读视图，只包含指定文件夹下、指定文件格式的序列，get(name)的结果和get_path_all_file返回的字典一样
+    """
+    def __init__(self, index, path=None, exts=None):
+        self.index = index
+        self.prefix = norm_key(DiskPath(path).rstrip('/') + '/') if path else ''
+        self.exts = tuple(e.lower() for e in exts) if exts else None
+
+    def get(self, name, default=None):
+        # 监听线程会在锁里原地修改帧列表，返回的是锁里复制出来的属性字典
+        with self.index.lock:
+            attr_dict_list = [dict(attr_dict, frames=list(attr_dict['frames']))
+                              for attr_dict in (self.index.sequences[p] for p in self.index.names.get(name, ()))
+                              if norm_key(attr_dict['filename']).startswith(self.prefix)
+                              and (self.exts is None or norm_key(attr_dict['filename']).endswith(self.exts))]
+        return attr_dict_list or default
+
+    def versions(self, name):
+        """
+        见SequenceIndex.versions，不按文件夹和文件格式过滤，get(name)时才过滤
+        """
+        return self.index.versions(name)
+
+
+class SequenceIndex(object):
+    """
+    一个文件夹下所有序列的索引，序列的属性字典和get_path_all_file里的一样：
+    {'ext': 'exr', 'filename': 'd:/a/b/c.%04d.exr', 'pattern': '%04d', 'pattern_num': 4, 'frames': [1001, 1002]}
+    """
+    def __init__(self, root):
+        self.root = DiskPath(root).absolute()
+        # {序列路径: 属性字典}
+        self.sequences = {}
+        # {name_format得到的name: set(序列路径)}
+        self.names = {}
+        # {资产名字（name去掉版本号）: [(版本号, name), ...]}，按版本号排序
+        self.versions_dict = {}
+        self.lock = threading.RLock()
+        # 每次索引有变化都会加1，方便调用者判断是否需要刷新
+        self.generation = 0
+
+    def build(self):
+        """
+        扫描根目录，重新建立索引
+        :return: self
+        """
+        sequences = list(self.root.scan(recursive=True))
+        with self.lock:
+            self.sequences = {}
+            self.names = {}
+            self.versions_dict = {}
+            for sequence in sequences:
+                self._add_sequence(sequence, sequence.frames)
+            self.generation += 1
+        return self
+
+    def _add_sequence(self, pattern_path, frames):
+        nf = name_format(pattern_path)
+        if not nf:
+            return None
+        attr_dict = {
+            'ext': nf.ext,
+            'filename': pattern_path,
+            'pattern': nf.pattern,
+            'pattern_num': nf.pattern_num,
+            'frames': list(frames),
+        }
+        self.sequences[pattern_path] = attr_dict
+        if nf.name not in self.names:
+            split = split_version(nf.name)
+            if split is not None:
+                bisect.insort(self.versions_dict.setdefault(split[0], []), (split[1], nf.name))
+        self.names.setdefault(nf.name, set()).add(pattern_path)
+        return attr_dict
+
+    def _remove_sequence(self, pattern_path):
+        self.sequences.pop(pattern_path, None)
+        nf = name_format(pattern_path)
+        if nf:
+            paths = self.names.get(nf.name)
+            if paths is not None:
+                paths.discard(pattern_path)
+                if not paths:
+                    del self.names[nf.name]
+                    split = split_version(nf.name)
+                    if split is not None:
+                        version_list = self.versions_dict.get(split[0], [])
+                        if (split[1], nf.name) in version_list:
+                            version_list.remove((split[1], nf.name))
+                        if not version_list:
+                            self.versions_dict.pop(split[0], None)
+
+    def add_file(self, path):
+        """
+        把一个新增的文件加入索引
+        :param path: 文件完整路径
+        :return:
+        """
+        path = DiskPath(path)
+        if path.name.startswith(SCAN_IGNORE['start']):
+            return
+        pattern_path = path.to_pattern()
+        with self.lock:
+            attr_dict = self.sequences.get(pattern_path)
+            if attr_dict is None:
+                attr_dict = self._add_sequence(pattern_path, [])
+                if attr_dict is None:
+                    return
+            if path != pattern_path:
+                frame = path.frame
+                frames = attr_dict['frames']
+                index = bisect.bisect_left(frames, frame)
+                if index == len(frames) or frames[index] != frame:
+                    frames.insert(index, frame)
+            self.generation += 1
+
+    def remove_file(self, path):
+        """
+        从索引里删除一个文件，序列里所有帧都删除后整个序列也会删除
+        :param path: 文件完整路径
+        :return:
+        """
+        path = DiskPath(path)
+        pattern_path = path.to_pattern()
+        with self.lock:
+            attr_dict = self.sequences.get(pattern_path)
+            if attr_dict is None:
+                return
+            if path != pattern_path:
+                frames = attr_dict['frames']
+                index = bisect.bisect_left(frames, path.frame)
+                if index < len(frames) and frames[index] == path.frame:
+                    del frames[index]
+                if frames:
+                    self.generation += 1
+                    return
+            self._remove_sequence(pattern_path)
+            self.generation += 1
+
+    def remove_dir(self, path):
+        """
+        删除一个文件夹（包括子文件夹）下的所有序列
+        :param path: 文件夹路径
+        :return:
+        """
+        prefix = DiskPath(path).rstrip('/') + '/'
+        with self.lock:
+            for pattern_path in [p for p in self.sequences if p.startswith(prefix)]:
+                self._remove_sequence(pattern_path)
+            self.generation += 1
+
+    def add_dir(self, path):
+        """
+        扫描一个新增的文件夹（包括子文件夹），把里面的序列加入索引
+        :param path: 文件夹路径
+        :return:
+        """
+        sequences = list(DiskPath(path).scan(recursive=True))
+        with self.lock:
+            for sequence in sequences:
+                self._remove_sequence(sequence)
+                self._add_sequence(sequence, sequence.frames)
+            self.generation += 1
+
+    def versions(self, name):
+        """
+        同一个资产（去掉版本号以后名字一样）在索引里的所有版本，不需要重新扫描
+        :param name: 任意一个版本的name，例如 'tex_v003.'
+        :return: 按版本号排好序的 [(版本号, name), ...]，name没有版本号时返回空列表
+        """
+        split = split_version(name)
+        if split is None:
+            return []
+        with self.lock:
+            return list(self.versions_dict.get(split[0], ()))
+
+    def view(self, path=None, exts=None):
+        """
+        得到一个可以代替get_path_all_file结果使用的只读视图
+        :param path: 只查询这个文件夹下的序列，默认是整个索引
+        :param exts: 只查询这些文件格式，例如['.exr', '.jpg']
+        :return: IndexView
+        """
+        return IndexView(self, path, exts)
+
+    def covers(self, path):
+        """
+        判断一个文件夹是否在索引的根目录下，和IndexView一样不区分大小写
+        """
+        path, root = norm_key(DiskPath(path).rstrip('/')), norm_key(self.root.rstrip('/'))
+        return path == root or path.startswith(root + '/')
+
+    def save(self, filename):
+        """
+        把索引保存成JSON文件
+        :param filename: JSON文件路径
+        :return:
+        """
+        with self.lock:
+            data = {
+                'root': self.root,
+                'sequences': [[p, attr_dict['frames']] for p, attr_dict in self.sequences.items()],
+            }
+        with open(filename, 'w') as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        读取save保存的索引，不会访问磁盘上的素材
+        :param filename: JSON文件路径
+        :return: SequenceIndex
+        """
+        with open(filename) as f:
+            data = json.load(f)
+        index = cls(data['root'])
+        for pattern_path, frames in data['sequences']:
+            index._add_sequence(DiskPath(pattern_path), frames)
+        return index
+
+
+class _Inotify(object):
+    """
+    用ctypes调用linux的inotify，不依赖第三方模块
+    """
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init failed')
+        self.wd_dict = {}
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, path.encode('utf-8'), self.WATCH_MASK)
+        if wd < 0:
+            # ENOSPC（超过max_user_watches）、EACCES等，这个文件夹的变化收不到，不能当作监听成功
+            import ctypes
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed', path)
+        self.wd_dict[wd] = path
+
+    def read(self, timeout):
+        """
+        读取事件
+        :param timeout: 等待事件的秒数
+        :return: [(文件夹路径, mask, 文件名), ...]
+        """
+        import select
+        import struct
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset + 16 <= len(data):
+            wd, mask, _, length = struct.unpack_from('iIII', data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += 16 + length
+            if mask & self.IN_IGNORED:
+                self.wd_dict.pop(wd, None)
+                continue
+            events.append((self.wd_dict.get(wd), mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class IndexWatcher(threading.Thread):
+    """
+    后台线程，监听素材库的变化并更新SequenceIndex。linux下用inotify，其他系统或者inotify不可用（例如NFS上的变化不会通知到本机）时
+    可以用轮询模式，每隔interval秒检查所有文件夹的修改时间，只重新读取有变化的文件夹。
+    use_inotify为None时，本地linux文件系统用inotify，网络盘用轮询；有文件夹添加不了inotify监听时也会改用轮询
+    """
+    def __init__(self, index, interval=5.0, use_inotify=None):
+        super(IndexWatcher, self).__init__()
+        self.daemon = True
+        self.index = index
+        self.interval = interval
+        if use_inotify is None:
+            # 网络盘上其他机器的修改不会产生inotify事件
+            use_inotify = hasattr(os, 'uname') and os.uname()[0] == 'Linux' and not DiskPath(index.root).is_network
+        self.use_inotify = use_inotify
+        self._stop_event = threading.Event()
+        self._inotify = None
+        # 和建立索引时的scan使用同样的文件夹规则（隐藏文件夹、根目录下的.scanignore），跳过的文件夹不监听
+        self._pruner = DirectoryPruner(index.root)
+        # 轮询模式下每个文件夹的修改时间和文件名集合
+        self._dir_state = None
+
+    def setup(self):
+        """
+        在调用线程里开始监听（添加inotify监听或者记录文件夹状态），在建立索引之前调用可以保证扫描期间的变化不会丢失
+        :return:
+        """
+        if self._inotify is not None or self._dir_state is not None:
+            return
+        if self.use_inotify:
+            try:
+                self._inotify = _Inotify()
+                self._watch_tree(self._inotify, self.index.root)
+                return
+            except (OSError, AttributeError):
+                if self._inotify is not None:
+                    self._inotify.close()
+                self._inotify = None
+        self._start_polling()
+
+    def _start_polling(self):
+        self.use_inotify = False
+        self._dir_state = dict((d, (mtime, set(self._listfiles(d)))) for d, (mtime, _) in self._snapshot().items())
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        self.setup()
+        if self._inotify is not None:
+            try:
+                self._run_inotify(self._inotify)
+                return
+            except OSError:
+                # 新建的文件夹添加不了监听，改用轮询；失败时的变化可能已经丢失，和队列溢出一样重新扫描
+                self._start_polling()
+                self.index.build()
+            finally:
+                self._inotify.close()
+                self._inotify = None
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+    def _watch_tree(self, inotify, path):
+        for root, sub_folders, _ in os.walk(path):
+            self._pruner.prune(root, sub_folders)
+            inotify.add_watch(DiskPath(root))
+
+    def _run_inotify(self, inotify):
+        while not self._stop_event.is_set():
+            for directory, mask, name in inotify.read(self.interval):
+                if mask & _Inotify.IN_Q_OVERFLOW:
+                    # 事件队列溢出，丢失了变化，只能重新扫描
+                    self.index.build()
+                    continue
+                if directory is None or not name:
+                    continue
+                path = DiskPath(directory).child(name)
+                if mask & _Inotify.IN_ISDIR:
+                    if self._pruner.is_excluded(directory, name):
+                        continue
+                    if mask & (_Inotify.IN_CREATE | _Inotify.IN_MOVED_TO):
+                        self._watch_tree(inotify, path)
+                        self.index.add_dir(path)
+                    elif mask & (_Inotify.IN_DELETE | _Inotify.IN_MOVED_FROM):
+                        self.index.remove_dir(path)
+                elif mask & (_Inotify.IN_CLOSE_WRITE | _Inotify.IN_MOVED_TO | _Inotify.IN_CREATE):
+                    self.index.add_file(path)
+                elif mask & (_Inotify.IN_DELETE | _Inotify.IN_MOVED_FROM):
+                    self.index.remove_file(path)
+
+    def _snapshot(self):
+        state = {}
+        # 轮询时每次都要读取所有文件夹的mtime，网络盘上同一层的文件夹并行读取
+        for root, sub_folders, sub_files in walk_tree(self.index.root, self._pruner,
+                                                      DiskPath(self.index.root).io_profile.walk_workers):
+            try:
+                mtime = os.stat(root).st_mtime
+            except OSError:
+                continue
+            state[DiskPath(root)] = (mtime, None)
+        return state
+
+    @staticmethod
+    def _listfiles(directory):
+        try:
+            return [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
+        except OSError:
+            return []
+
+    def poll(self):
+        """
+        轮询一次，只有修改时间变化的文件夹会重新读取
+        :return:
+        """
+        current = self._snapshot()
+        for directory in set(self._dir_state) - set(current):
+            for name in self._dir_state.pop(directory)[1]:
+                self.index.remove_file(directory.child(name))
+        for directory, (mtime, _) in current.items():
+            old_mtime, old_files = self._dir_state.get(directory, (None, set()))
+            if old_mtime == mtime:
+                continue
+            files = set(self._listfiles(directory))
+            for name in files - old_files:
+                self.index.add_file(directory.child(name))
+            for name in old_files - files:
+                self.index.remove_file(directory.child(name))
+            self._dir_state[directory] = (mtime, files)
+
+
+def start_index(root, watch=True, cache_file=None):
+    """
+    建立一个索引，并且可选地启动后台监听线程，监听在扫描之前开始，扫描期间的变化不会丢失
+    :param root: 素材库根目录
+    :param watch: 是否启动后台监听线程
+    :param cache_file: 可选的JSON索引文件，存在时直接读取而不扫描
+    :return: (SequenceIndex, IndexWatcher或None)
+    """
+    index = SequenceIndex.load(cache_file) if cache_file and os.path.exists(cache_file) else SequenceIndex(root)
+    watcher = None
+    if watch:
+        watcher = IndexWatcher(index)
+        watcher.setup()
+    if not index.sequences:
+        index.build()
+    if watcher is not None:
+        watcher.start()
+    return index, watcher
+
+
+# 当前进程里常驻的索引，{根目录: (SequenceIndex, IndexWatcher)}，按最近使用的顺序排列，
+# 超过MAX_LIVE_INDEXES个时最久没有使用的索引会停止监听并删除
+_LIVE_INDEXES = OrderedDict()
+_LIVE_INDEXES_LOCK = threading.Lock()
+MAX_LIVE_INDEXES = 4
+
+
+def get_live_index(root, watch=True, cache_file=None):
+    """
+    得到一个常驻的素材库索引，同一个根目录在一个DCC进程里只会扫描一次，之后由后台线程保持更新。
+    多个线程同时请求同一个根目录时只会建立一个索引
+    :param root: 素材库根目录
+    :param watch: 是否启动后台监听线程
+    :param cache_file: 可选的JSON索引文件，存在时直接读取而不扫描
+    :return: SequenceIndex
+    """
+    root = DiskPath(root)
+    with _LIVE_INDEXES_LOCK:
+        for key, entry in _LIVE_INDEXES.items():
+            if entry[0].covers(root):
+                # 移到最后，表示最近使用过
+                _LIVE_INDEXES.pop(key)
+                _LIVE_INDEXES[key] = entry
+                return entry[0]
+        index, watcher = start_index(root, watch, cache_file)
+        _LIVE_INDEXES[index.root] = (index, watcher)
+        while len(_LIVE_INDEXES) > MAX_LIVE_INDEXES:
+            _, (_, evicted_watcher) = _LIVE_INDEXES.popitem(last=False)
+            if evicted_watcher is not None:
+                evicted_watcher.stop()
+        return index
+
+
+def release_live_indexes():
+    """
+    停止所有常驻索引的监听线程并删除索引
+    """
+    with _LIVE_INDEXES_LOCK:
+        for _, watcher in _LIVE_INDEXES.values():
+            if watcher is not None:
+                watcher.stop()
+        _LIVE_INDEXES.clear()
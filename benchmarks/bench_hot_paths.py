@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+扫描、文件名解析和路径匹配热点函数的基准测试。
+会在临时文件夹里生成一个合成的素材目录树（文件数量、序列长度、目录深度、重名数量都可以配置），
+以及模拟的DCC parm字典，测量每个函数的总耗时、单次调用耗时和峰值内存，结果保存成JSON，方便不同版本之间对比：
+    python benchmarks/bench_hot_paths.py --sequences 500 --length 50 --output new.json --compare old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from dayu_path import DayuPath
+from utils import get_pattern_sequence
+from utils import name_format
+from utils import recursive_file
+from utils import validate_sequences
+from repath_core import get_new_file_knob_dict
+from repath_core import get_path_all_file
+from dcc_adapters import MockAdapter
+from dcc_adapters import MockKnob
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+timer = getattr(time, 'perf_counter', time.time)
+
+EXTS = ('exr', 'jpg', 'dpx', 'tif')
+NAMES = ('albedo', 'roughness', 'plate', 'bg', 'fg', 'matte', 'normal', 'spec')
+
+
+def generate_tree(root, sequences=200, length=24, depth=3, collisions=4, seed=0):
+    """
+    在root下生成合成的素材目录树
+    :param root: 生成目录树的文件夹
+    :param sequences: 序列的数量
+    :param length: 每个序列的帧数，1表示单帧文件
+    :param depth: 序列所在文件夹的层级深度
+    :param collisions: 同一个序列名字在不同文件夹里出现的次数
+    :return: 所有序列的pattern路径列表
+    """
+    rnd = random.Random(seed)
+    pattern_paths = []
+    unique = max(1, sequences // max(1, collisions))
+    for index in range(sequences):
+        name = '{}_{:04d}'.format(NAMES[index % len(NAMES)], index % unique)
+        ext = EXTS[index % len(EXTS)]
+        folders = ['d{}_{}'.format(level, rnd.randint(0, 9)) for level in range(depth)]
+        folders.append('s{:05d}'.format(index))
+        folder = os.path.join(root, *folders)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        if length <= 1:
+            filenames = ['{}.{}'.format(name, ext)]
+            pattern_paths.append('/'.join((folder, filenames[0])).replace('\\', '/'))
+        else:
+            filenames = ['{}.{:04d}.{}'.format(name, frame, ext) for frame in range(1001, 1001 + length)]
+            pattern_paths.append('/'.join((folder, '{}.%04d.{}'.format(name, ext))).replace('\\', '/'))
+        for filename in filenames:
+            with open(os.path.join(folder, filename), 'w') as f:
+                f.write('1')
+    return pattern_paths
+
+
+def mock_parm_dict(pattern_paths, old_root='d:/old_project', knobs_per_file=2):
+    """
+    根据生成的序列路径模拟一个DCC工程里不存在的素材路径和knob的字典
+    :param pattern_paths: generate_tree返回的序列路径
+    :param old_root: 模拟的旧路径根目录
+    :param knobs_per_file: 每个路径对应的knob数量
+    :return: {旧路径: [MockKnob, ...]}
+    """
+    parm_dict = {}
+    for index, path in enumerate(pattern_paths):
+        parts = path.split('/')
+        old_path = '/'.join([old_root] + parts[-3:])
+        parm_dict[old_path] = [MockKnob('node{}_{}'.format(index, i), old_path) for i in range(knobs_per_file)]
+    return parm_dict
+
+
+def measure(func, calls=1, repeat=3, memory=True):
+    """
+    测量一个函数的耗时和峰值内存
+    :param func: 不带参数的函数
+    :param calls: func一次执行内部包含的调用次数，用来计算单次调用的耗时
+    :param repeat: 重复执行的次数，取最快的一次
+    :param memory: 是否再额外执行一次测量峰值内存
+    :return: 结果字典
+    """
+    times = []
+    for _ in range(repeat):
+        start = timer()
+        func()
+        times.append(timer() - start)
+    result = {
+        'wall_min': min(times),
+        'wall_mean': sum(times) / len(times),
+        'calls': calls,
+        'per_call': min(times) / max(1, calls),
+        'peak_memory': None,
+    }
+    if memory and tracemalloc is not None:
+        tracemalloc.start()
+        func()
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def run(options):
+    root = tempfile.mkdtemp(prefix='bench_repath_')
+    try:
+        pattern_paths = generate_tree(root, options.sequences, options.length, options.depth,
+                                      options.collisions, options.seed)
+        parm_dict = mock_parm_dict(pattern_paths)
+        frame_paths = [DayuPath(p).restore_pattern(1001) for p in pattern_paths]
+        candidates = [p.lower() for p in pattern_paths]
+        repeat = options.repeat
+        results = {}
+
+        results['scan'] = measure(lambda: list(DayuPath(root).scan(recursive=True)), 1, repeat)
+        exts = sorted(set('.' + p.rsplit('.', 1)[-1] for p in pattern_paths))
+        results['get_path_all_file'] = measure(lambda: get_path_all_file(root, exts), 1, repeat)
+        results['restore_pattern'] = measure(
+            lambda: [DayuPath(p).restore_pattern(f) for p in pattern_paths[:50] for f in range(1001, 1101)],
+            min(50, len(pattern_paths)) * 100, repeat)
+        results['template_paths'] = measure(
+            lambda: [list(DayuPath(p).template().paths(range(1001, 1101))) for p in pattern_paths[:50]],
+            min(50, len(pattern_paths)) * 100, repeat)
+        results['to_pattern'] = measure(lambda: [p.to_pattern() for p in frame_paths], len(frame_paths), repeat)
+        results['name_format'] = measure(lambda: [name_format(p) for p in pattern_paths], len(pattern_paths), repeat)
+        results['get_pattern_sequence_flag'] = measure(
+            lambda: [get_pattern_sequence(p, True) for p in pattern_paths], len(pattern_paths), repeat)
+        results['get_pattern_sequence'] = measure(
+            lambda: [get_pattern_sequence(p) for p in pattern_paths], len(pattern_paths), repeat)
+        results['recursive_file'] = measure(
+            lambda: [recursive_file(p.replace(root.lower(), 'd:/x'), candidates) for p in candidates[:200]],
+            min(200, len(candidates)), repeat)
+        results['validate_sequences'] = measure(lambda: validate_sequences(pattern_paths), len(pattern_paths), repeat)
+        results['get_new_file_knob_dict'] = measure(lambda: get_new_file_knob_dict(root, parm_dict),
+                                                    len(parm_dict), repeat)
+        adapter = MockAdapter(parm_dict)
+        results['adapter_collect'] = measure(adapter.collect, len(parm_dict), repeat)
+        new_file_knob_dict = get_new_file_knob_dict(root, parm_dict)[0]
+        results['adapter_apply'] = measure(lambda: adapter.apply(new_file_knob_dict), len(new_file_knob_dict), repeat)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'options': vars(options),
+            'files': options.sequences * max(1, options.length),
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    """
+    打印当前结果和之前保存的结果的对比，比值大于1表示变慢
+    """
+    lines = []
+    for name, result in sorted(report['results'].items()):
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            continue
+        ratio = result['wall_min'] / old['wall_min'] if old['wall_min'] else float('inf')
+        lines.append('{:<28}{:>12.6f}s{:>12.6f}s{:>9.2f}x'.format(name, old['wall_min'], result['wall_min'], ratio))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sequences', type=int, default=200, help='number of sequences to generate')
+    parser.add_argument('--length', type=int, default=24, help='frames per sequence, 1 for single files')
+    parser.add_argument('--depth', type=int, default=3, help='folder depth of each sequence')
+    parser.add_argument('--collisions', type=int, default=4, help='how many folders share the same sequence name')
+    parser.add_argument('--repeat', type=int, default=3, help='repeat each measurement and keep the fastest')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare against a previously saved JSON file')
+    options = parser.parse_args(argv)
+
+    report = run(options)
+    for name, result in sorted(report['results'].items()):
+        print('{:<28}{:>12.6f}s  per call {:>12.9f}s  peak {}'.format(
+            name, result['wall_min'], result['per_call'], result['peak_memory']))
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        print('\n{:<28}{:>13}{:>13}{:>10}'.format('benchmark', 'baseline', 'current', 'ratio'))
+        for line in compare(report, baseline):
+            print(line)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+模块导入耗时的基准测试。每个模块在一个新的python进程里导入，取多次里最快的一次，
+同时检查导入后有没有加载Qt，shelf工具在DCC启动时导入replace_file_path不应该加载任何界面模块：
+    python benchmarks/bench_import.py --output import.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ('replace_file_path', 'repath_core', 'utils', 'dayu_path')
+GUI_MODULES = ('PySide', 'PySide2', 'repath_gui', 'FolderWidget', 'ProgressBar')
+
+SNIPPET = '''
+import json, sys, time
+timer = getattr(time, 'perf_counter', time.time)
+start = timer()
+import {module}
+seconds = timer() - start
+gui = sorted(m for m in sys.modules if m.split('.')[0] in {gui_modules!r})
+sys.stdout.write(json.dumps({{'seconds': seconds, 'gui_modules': gui, 'modules': len(sys.modules)}}))
+'''
+
+
+def measure_import(module, repeat=5, python=sys.executable):
+    """
+    在新的进程里导入模块并计时
+    :param module: 模块名字
+    :param repeat: 重复次数，取最快的一次
+    :param python: python解释器路径
+    :return: 结果字典
+    """
+    results = []
+    for _ in range(repeat):
+        output = subprocess.check_output([python, '-c', SNIPPET.format(module=module, gui_modules=GUI_MODULES)],
+                                         cwd=ROOT)
+        results.append(json.loads(output.decode('utf-8')))
+    best = min(results, key=lambda r: r['seconds'])
+    return {
+        'seconds': best['seconds'],
+        'modules_loaded': best['modules'],
+        'gui_modules': best['gui_modules'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    options = parser.parse_args(argv)
+
+    results = dict((module, measure_import(module, options.repeat)) for module in MODULES)
+    for module, result in sorted(results.items()):
+        print('{:<20}{:>10.2f}ms  modules {:>5}  gui {}'.format(
+            module, result['seconds'] * 1000, result['modules_loaded'], result['gui_modules'] or '-'))
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return results
+
+
+if __name__ == '__main__':
+    main()
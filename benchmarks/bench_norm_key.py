@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+Windows风格路径的比较基准测试：模拟匹配时每个DCC路径和同名的候选路径反复比较的循环，
+对比每次都重新拆分文件名、调用norm_key和按候选路径缓存文件名key（repath_core._name_key的做法）的耗时和峰值内存，
+两边的循环完全一样，只有生成候选文件名key的函数不同，用bench_hot_paths.measure以同样的方式测量。
+    python benchmarks/bench_norm_key.py --files 5000 --candidates 20
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench_hot_paths import measure
+from utils import norm_key
+
+
+def windows_paths(count, seed=0):
+    """
+    生成Windows风格的路径，盘符大小写、正反斜杠混用
+    """
+    rnd = random.Random(seed)
+    paths = []
+    for index in range(count):
+        drive = rnd.choice('DdPp')
+        folders = ['Show', 'SEQ_{:03d}'.format(rnd.randint(0, 40)), 'Shot_{:04d}'.format(rnd.randint(0, 400)),
+                   rnd.choice(['Comp', 'Light', 'LookDev']), 'v{:03d}'.format(rnd.randint(1, 30))]
+        separator = rnd.choice(['\\', '/'])
+        paths.append(drive + ':' + separator + separator.join(folders) + separator +
+                     'Plate_{:04d}.%04d.EXR'.format(index % 500))
+    return paths
+
+
+def compare(dcc_paths, candidates, root, candidate_key):
+    """
+    模拟匹配的比较循环：跳过已经在新文件夹里的路径，再和每个候选的文件名比较
+    :param candidate_key: 参数是候选路径，返回候选文件名的key
+    :return: 文件名相同的次数
+    """
+    matched = 0
+    root_key = norm_key(root)
+    for path in dcc_paths:
+        if root_key in norm_key(path):
+            continue
+        name_key = norm_key(os.path.basename(path.replace('\\', '/')))
+        for candidate in candidates:
+            if name_key == candidate_key(candidate):
+                matched += 1
+    return matched
+
+
+def naive(dcc_paths, candidates, root):
+    """
+    原来的写法：每次比较都重新拆分候选的文件名并标准化
+    """
+    return compare(dcc_paths, candidates, root, lambda candidate: norm_key(os.path.basename(candidate)))
+
+
+def cached(dcc_paths, candidates, root):
+    """
+    一次匹配共用一个按候选路径缓存的字典，每个候选只拆分和标准化一次
+    """
+    cache = {}
+
+    def candidate_key(candidate):
+        key = cache.get(candidate)
+        if key is None:
+            key = cache[candidate] = norm_key(os.path.basename(candidate))
+        return key
+
+    return compare(dcc_paths, candidates, root, candidate_key)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=5000, help='number of DCC file references')
+    parser.add_argument('--candidates', type=int, default=20, help='same-named candidates compared per reference')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    options = parser.parse_args(argv)
+
+    dcc_paths = windows_paths(options.files)
+    candidates = windows_paths(options.candidates, seed=1)
+    root = 'X:\\New_Library'
+    results = {}
+    for name, func in (('naive', naive), ('cached', cached)):
+        results[name] = measure(lambda: func(dcc_paths, candidates, root))
+        print('{:<10}{:>10.4f}s  peak memory {:>12}'.format(name, results[name]['wall_min'],
+                                                             results[name]['peak_memory']))
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return results
+
+
+if __name__ == '__main__':
+    main()
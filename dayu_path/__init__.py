@@ -5,5 +5,6 @@ __author__ = 'andyguo'
 __version__ = '0.5.2'
 
 from dayu_path.base import DayuPath
+from dayu_path.base import SequenceTemplate
 
-__all__ = ['DayuPath']
+__all__ = ['DayuPath', 'SequenceTemplate']
@@ -9,6 +9,16 @@ import shutil
 import stat
 import subprocess
 import sys
+from multiprocessing.pool import ThreadPool
+
+# Import third-party modules
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 # Import local modules
 from dayu_path.constants import EXT_PATTERN
@@ -16,10 +26,21 @@ from dayu_path.constants import EXT_SINGLE_MEDIA
 from dayu_path.constants import FRAME_REGEX
 from dayu_path.constants import PATTERN_REGEX
 from dayu_path.constants import SCAN_IGNORE
+from dayu_path.constants import SCAN_IGNORE_FILE
 from dayu_path.constants import UNC_REGEX
 from dayu_path.constants import VERSION_REGEX
 from dayu_path.constants import WIN32_DRIVE_REGEX
 from dayu_path.errors import DayuPathBaseError
+from dayu_path.localize import DEFAULT_STRATEGIES
+from dayu_path.localize import localize_file
+from dayu_path.localize import localize_files
+from dayu_path.localize import reflink
+from dayu_path.mounts import count_io
+from dayu_path.mounts import fs_type
+from dayu_path.mounts import io_profile
+from dayu_path.mounts import is_network_fs_type
+from dayu_path.prune import DirectoryPruner
+from dayu_path.prune import walk_tree
 
 BASE_STRING_TYPE = str  # Python 3 str (=unicode), or Python 2 bytes.
 
@@ -98,6 +119,22 @@ class DayuPath(BASE_STRING_TYPE):
         new_path = self.pathlib.normpath(new_path)
         return DayuPath(new_path)
 
+    @property
+    def fs_type(self):
+        return fs_type(self)
+
+    @property
+    def is_network(self):
+        return is_network_fs_type(self.fs_type)
+
+    @property
+    def is_local(self):
+        return self.fs_type is not None and not self.is_network
+
+    @property
+    def io_profile(self):
+        return io_profile(self)
+
     @property
     def parent(self):
         return DayuPath(self.pathlib.dirname(self))
@@ -177,6 +214,77 @@ class DayuPath(BASE_STRING_TYPE):
 
         return sorted(result)
 
+    @classmethod
+    def stat_many(cls, paths, workers=None, scandir_threshold=None, only_exists=False):
+        """
+        批量获取很多路径的stat 信息。路径先按父文件夹分组，同一个文件夹里要查询的路径达到scandir_threshold 个时，
+        只读取一次文件夹，不存在的路径不需要再单独stat；不同的文件夹在线程池里并行处理。
+        :param paths: 路径列表，可以是字符串或者DayuPath
+        :param workers: 同时处理文件夹的线程数，None时按第一个文件夹所在的文件系统选择，见dayu_path.mounts.io_profile
+        :param scandir_threshold: 同一个文件夹里的路径数量达到这个值时使用scandir，否则每个路径单独stat，None时按文件系统选择
+        :param only_exists: True 时只判断是否存在，返回bool，不会对存在的文件stat
+        :return: dict，key 是传入的路径，value 是os.stat_result（only_exists 时是bool），不存在的是None（False）
+        """
+        groups = {}
+        for path in paths:
+            normalize_path = cls(path)
+            if normalize_path:
+                groups.setdefault(normalize_path.parent, []).append((path, normalize_path.name))
+        if not groups:
+            return {}
+        if workers is None or scandir_threshold is None:
+            profile = io_profile(next(iter(groups)) or '.')
+            workers = profile.stat_workers if workers is None else workers
+            scandir_threshold = profile.scandir_threshold if scandir_threshold is None else scandir_threshold
+        tasks = [(folder, items, scandir_threshold, only_exists) for folder, items in groups.items()]
+        if workers > 1 and len(tasks) > 1:
+            pool = ThreadPool(min(workers, len(tasks)))
+            try:
+                results = pool.map(cls._stat_folder, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [cls._stat_folder(task) for task in tasks]
+        result = {}
+        for folder_result in results:
+            result.update(folder_result)
+        return result
+
+    @staticmethod
+    def _stat_folder(task):
+        folder, items, scandir_threshold, only_exists = task
+        folder = folder or '.'
+        result = {}
+        if scandir is not None and len(items) >= scandir_threshold:
+            count_io('dirs_listed')
+            try:
+                entries = dict((e.name.lower() if os.name == 'nt' else e.name, e) for e in scandir(folder))
+            except OSError:
+                entries = {}
+            for path, name in items:
+                entry = entries.get(name.lower() if os.name == 'nt' else name)
+                if only_exists:
+                    result[path] = entry is not None
+                    continue
+                if entry is None:
+                    result[path] = None
+                    continue
+                count_io('stats_issued')
+                try:
+                    result[path] = entry.stat()
+                except OSError:
+                    result[path] = None
+            return result
+        count_io('stats_issued', len(items))
+        for path, name in items:
+            try:
+                st = os.stat(os.path.join(folder, name))
+            except OSError:
+                st = None
+            result[path] = (st is not None) if only_exists else st
+        return result
+
     def walk(self, topdown=True, onerror=None, followlinks=False):
         for root, sub_folders, sub_files in os.walk(self, topdown=topdown,
                                                     onerror=onerror,
@@ -265,6 +373,22 @@ class DayuPath(BASE_STRING_TYPE):
         if times or permission:
             self.copy_stat(dst, times, permission)
 
+    def reflink(self, newpath):
+        '''
+        创建写时复制的克隆（linux上的XFS、Btrfs），不支持时抛出OSError
+        '''
+        reflink(self, newpath)
+
+    def localize(self, dst, strategies=DEFAULT_STRATEGIES, times=False, permission=False, overwrite=False):
+        '''
+        把文件放到dst，按strategies的顺序尝试reflink、hardlink、symlink，最后退回到字节拷贝
+        :param dst: 目标文件
+        :param strategies: 可以使用的方式，见dayu_path.localize
+        :return: 实际使用的方式
+        '''
+        return localize_file(self, dst, strategies=strategies, times=times, permission=permission,
+                             overwrite=overwrite)
+
     def copy_stat(self, dst, times=True, permission=True):
         st = os.stat(self)
         if hasattr(os, 'utime') and times:
@@ -399,30 +523,18 @@ class DayuPath(BASE_STRING_TYPE):
         :param frame: int，可以是任意的正整数
         :return: DayuPath 对象
         """
-        if frame is None:
-            return self
-
-        if int(frame) < 0:
-            return self
+        return self.template().restore(frame)
 
-        match = PATTERN_REGEX.match(self.name)
-        if match:
-            if match.group(1):
-                return DayuPath(self.replace(match.group(1),
-                                             '{{:0{frame_padding}d}}'.format(
-                                                     frame_padding=int(match.group(2) if match.group(2) else 1)).format(
-                                                     frame)))
-            elif match.group(3):
-                return DayuPath(self.replace(match.group(3),
-                                             '{{:0{frame_padding}d}}'.format(
-                                                     frame_padding=len(match.group(3))).format(frame)))
-            elif match.group(4):
-                return DayuPath(self.replace(match.group(4),
-                                             '{{:0{frame_padding}d}}'.format(
-                                                     frame_padding=(match.group(5) if match.group(5) else 1)).format(
-                                                     frame)))
-        else:
-            return self
+    def template(self):
+        """
+        得到当前路径预先解析好的SequenceTemplate，结果缓存在对象上，大量帧的展开只解析一次pattern
+        :return: SequenceTemplate 对象
+        """
+        template = getattr(self, '_template', None)
+        if template is None:
+            template = SequenceTemplate(self)
+            self._template = template
+        return template
 
     def rename_sequence(self, dst_path, start=None, step=1, parents=False,
                         keep_missing=False):
@@ -433,15 +545,16 @@ class DayuPath(BASE_STRING_TYPE):
         if self.pattern and self.frames and dst_path.pattern:
             start = start if start else self.frames[0]
             prev_frame = self.frames[0]
+            src_template, dst_template = self.template(), dst_path.template()
             for i in self.frames:
                 if keep_missing:
                     start += (i - prev_frame)
-                    start_ = dst_path.restore_pattern(start)
-                    self.restore_pattern(i).rename(start_, parents=parents)
+                    start_ = dst_template.restore(start)
+                    src_template.restore(i).rename(start_, parents=parents)
                     prev_frame = i
                 else:
-                    start_ = dst_path.restore_pattern(start)
-                    self.restore_pattern(i).rename(start_, parents=parents)
+                    start_ = dst_template.restore(start)
+                    src_template.restore(i).rename(start_, parents=parents)
                     start += step
             return
 
@@ -452,10 +565,19 @@ class DayuPath(BASE_STRING_TYPE):
 
     def copy_sequence(self, dst_path, start=None, step=1,
                       times=False, permission=False, parents=False,
-                      keep_missing=False):
+                      keep_missing=False, strategies=None, workers=None):
+        '''
+        拷贝单个文件或者整个序列
+        :param strategies: 可选的放置方式列表，例如 ('reflink', 'copy')，见dayu_path.localize。
+                           给出时同一个设备上用克隆或者链接代替字节拷贝，需要字节拷贝的帧在线程池里并行拷贝
+        :param workers: 使用strategies时的并行线程数，None时按目标文件夹所在的文件系统选择
+        :return: 使用strategies时返回 {目标文件: 使用的方式}
+        '''
         if (not self.pattern) and (not dst_path.pattern):
             if parents:
                 dst_path.parent.mkdir(parents=True)
+            if strategies:
+                return {dst_path: self.localize(dst_path, strategies=strategies, times=times, permission=permission)}
             self.copy(dst_path, times=times, permission=permission)
             return
 
@@ -464,42 +586,83 @@ class DayuPath(BASE_STRING_TYPE):
                 dst_path.parent.mkdir(parents=True)
             start = start if start else self.frames[0]
             prev_frame = self.frames[0]
+            src_template, dst_template = self.template(), dst_path.template()
+            pairs = []
             for i in self.frames:
                 if keep_missing:
                     start += (i - prev_frame)
-                    self.restore_pattern(i).copy(dst_path.restore_pattern(start),
-                                                 times=times,
-                                                 permission=permission)
+                    pairs.append((src_template.restore(i), dst_template.restore(start)))
                     prev_frame = i
                 else:
-                    self.restore_pattern(i).copy(dst_path.restore_pattern(start),
-                                                 times=times,
-                                                 permission=permission)
+                    pairs.append((src_template.restore(i), dst_template.restore(start)))
                     start += step
+            if strategies:
+                workers = workers or dst_path.parent.io_profile.copy_workers
+                results = localize_files(pairs, strategies=strategies, workers=workers, parents=False,
+                                         times=times, permission=permission)
+                for result in results.values():
+                    if isinstance(result, Exception):
+                        raise result
+                return results
+            for src, dst in pairs:
+                src.copy(dst, times=times, permission=permission)
             return
 
     def scan(self, recursive=False, regex_pattern=None, ext_filters=None,
-             function_filter=None, ignore_invisible=True):
-
+             function_filter=None, ignore_invisible=True, prefix=None, exclude=None, max_depth=None,
+             ignore_file=SCAN_IGNORE_FILE, workers=None):
+        '''
+        扫描文件夹（或者一个文件所在的文件夹）下的所有序列和单个文件，所有过滤条件依次串联：
+        隐藏文件、ext_filters和prefix只比较文件名字符串，在生成DayuPath之前执行；
+        regex_pattern和function_filter作用在完整路径上，只对通过前面过滤的文件生成DayuPath。
+        :param recursive: 是否递归扫描子文件夹
+        :param regex_pattern: 完整路径需要匹配的正则表达式
+        :param ext_filters: 文件后缀，字符串或者字符串的列表/集合，不区分大小写，例如 {'.exr', '.jpg'}
+        :param function_filter: 参数为DayuPath，返回False的文件会被过滤掉
+        :param ignore_invisible: 是否忽略隐藏文件
+        :param prefix: 文件名开头，不区分大小写
+        :param exclude: 不进入的文件夹规则列表，见DirectoryPruner；ignore_invisible时隐藏文件夹也不进入
+        :param max_depth: 递归扫描时最多进入几层子文件夹，None表示不限制
+        :param ignore_file: 扫描根目录下的忽略文件名字，里面的规则和exclude一起使用，None表示不读取
+        :param workers: 递归扫描时同时读取文件夹的线程数，None时按文件系统选择，网络盘上同一层的文件夹并行读取
+        :return: 带frames和missing属性的DayuPath的生成器
+        '''
         scan_path, file_flag = (self, False) if self.isdir() else (self.parent, True)
         compiled_regex = re.compile(regex_pattern) if regex_pattern else None
-        for root, sub_folders, sub_files in os.walk(scan_path):
+        if ext_filters:
+            if isinstance(ext_filters, (BASE_STRING_TYPE, str)):
+                ext_filters = (ext_filters,)
+            ext_filters = tuple(set(ext.lower() for ext in ext_filters))
+        prefix = prefix.lower() if prefix else None
+        if recursive and not file_flag:
+            pruner = DirectoryPruner(scan_path, exclude=exclude, max_depth=max_depth,
+                                     ignore_hidden=ignore_invisible, ignore_file=ignore_file)
+            walker = walk_tree(scan_path, pruner, workers or scan_path.io_profile.walk_workers)
+        else:
+            # 不递归时一个子文件夹都不进入
+            walker = walk_tree(scan_path, DirectoryPruner(scan_path, max_depth=0, ignore_file=None))
+        for root, sub_folders, sub_files in walker:
             seq_list = {}
+            names = sub_files
             if ignore_invisible:
-                all_files = (DayuPath(root).child(f) for f in sub_files if not f.startswith(SCAN_IGNORE['start']))
-            else:
-                all_files = (DayuPath(root).child(f) for f in sub_files)
-
-            avaliable_files = all_files
-            if regex_pattern:
-                avaliable_files = (f for f in all_files if (compiled_regex.match(f)))
+                names = (f for f in names
+                         if not f.startswith(SCAN_IGNORE['start']) and not f.endswith(SCAN_IGNORE['end']))
             if ext_filters:
-                avaliable_files = (f for f in all_files if f.lower().endswith(ext_filters))
+                names = (f for f in names if f.lower().endswith(ext_filters))
+            if prefix:
+                names = (f for f in names if f.lower().startswith(prefix))
+
+            root_path = DayuPath(root)
+            # 文件夹已经是规范的绝对路径时，不需要对每个文件再调用absolute()
+            root_absolute = root_path.absolute() == root_path
+            avaliable_files = (root_path.child(f) for f in names)
+            if compiled_regex:
+                avaliable_files = (f for f in avaliable_files if compiled_regex.match(f))
             if function_filter:
-                avaliable_files = (f for f in all_files if function_filter(f))
+                avaliable_files = (f for f in avaliable_files if function_filter(f))
 
             for single_file in avaliable_files:
-                pattern_path = single_file.absolute().to_pattern()
+                pattern_path = (single_file if root_absolute else single_file.absolute()).to_pattern()
                 frames_list = seq_list.setdefault(pattern_path, [])
                 if single_file != pattern_path:
                     bisect.insort(frames_list, single_file.frame)
@@ -511,7 +674,7 @@ class DayuPath(BASE_STRING_TYPE):
                     k.frames = v
                     k.missing = (sorted(set(range(v[0], v[-1] + 1)) - set(v))) if v else []
                     yield k
-                raise StopIteration
+                return
 
             if seq_list:
                 for k, v in seq_list.items():
@@ -520,7 +683,7 @@ class DayuPath(BASE_STRING_TYPE):
                     yield k
 
             if not recursive:
-                raise StopIteration
+                return
 
     def _show_in_win32(self, show_file=False):
         if show_file:
@@ -548,3 +711,87 @@ class DayuPath(BASE_STRING_TYPE):
         sub_func = getattr(self, '_show_in_{}'.format(sys.platform), None)
         if sub_func:
             sub_func(show_file=show_file)
+
+
+class SequenceTemplate(object):
+    '''
+    预先解析好的序列路径模板。pattern（%04d、####、$F4）只解析一次，之后每一帧只是一次字符串格式化：
+        template = DayuPath('/a/b.%04d.exr').template()
+        template.restore(1001)  ——>  DayuPath('/a/b.1001.exr')
+        list(template.paths(range(1001, 1101)))
+        template.names(frames)  ——>  只有文件名的字符串列表，用于和目录读取的结果比较
+    和restore_pattern的结果一样：路径里所有和pattern相同的部分都会被替换，没有pattern或者帧号小于0时返回原路径。
+    '''
+    __slots__ = ('path', 'token', 'padding', '_format', '_name_format')
+
+    def __init__(self, path):
+        # DayuPath(DayuPath对象)会重新调用__init__，清空原对象的frames，所以已经是DayuPath时直接使用
+        self.path = path if isinstance(path, DayuPath) else DayuPath(path)
+        self.token = None
+        self.padding = 0
+        self._format = None
+        self._name_format = None
+        match = PATTERN_REGEX.match(self.path.name)
+        if not match:
+            return
+        if match.group(1):
+            self.token, self.padding = match.group(1), int(match.group(2) if match.group(2) else 1)
+        elif match.group(3):
+            self.token, self.padding = match.group(3), len(match.group(3))
+        elif match.group(4):
+            self.token, self.padding = match.group(4), int(match.group(5) if match.group(5) else 1)
+        else:
+            return
+        # 转成一个%格式化字符串，路径里其他的%需要转义，同一个pattern出现多次时都替换成同一帧
+        frame_format = '%(frame)0{}d'.format(self.padding)
+        escaped_token = self.token.replace('%', '%%')
+        self._format = self.path.replace('%', '%%').replace(escaped_token, frame_format)
+        self._name_format = self.path.name.replace('%', '%%').replace(escaped_token, frame_format)
+
+    def __bool__(self):
+        return self._format is not None
+
+    __nonzero__ = __bool__
+
+    @staticmethod
+    def _new_path(string):
+        # 模板来自已经规范化的路径，不需要再走一遍DayuPath.__new__里的正则替换
+        path = BASE_STRING_TYPE.__new__(DayuPath, string)
+        path.frames = []
+        path.missing = []
+        return path
+
+    def restore(self, frame):
+        '''
+        一帧的路径，和DayuPath.restore_pattern一样
+        :param frame: int
+        :return: DayuPath 对象
+        '''
+        if frame is None or self._format is None or int(frame) < 0:
+            return self.path
+        return self._new_path(self._format % {'frame': frame})
+
+    def paths(self, frames):
+        '''
+        按需生成多帧路径的生成器
+        :param frames: 帧号的可迭代对象
+        :return: DayuPath 对象的生成器
+        '''
+        for frame in frames:
+            yield self.restore(frame)
+
+    def strings(self, frames):
+        '''
+        多帧的完整路径字符串列表，不生成DayuPath对象，适合大批量的校验
+        '''
+        if self._format is None:
+            return [BASE_STRING_TYPE(self.path) for _ in frames]
+        return [self._format % {'frame': frame} for frame in frames]
+
+    def names(self, frames):
+        '''
+        多帧的文件名字符串列表
+        '''
+        if self._name_format is None:
+            return [self.path.name for _ in frames]
+        return [self._name_format % {'frame': frame} for frame in frames]
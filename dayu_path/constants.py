@@ -39,9 +39,16 @@ EXT_SEQUENCE_MEDIA = {'.exr': {},
                       '.ari': {},
                       }
 
+# 扫描时跳过的隐藏文件和系统文件，递归扫描默认也跳过这样开头的文件夹，所以只能放真正的隐藏或者系统文件的名字，
+# 像'Thumb'这样的前缀会把Thumbnails文件夹也跳过
 SCAN_IGNORE = {
-    'start': ('.', '..', 'Thumb'),
-    'end': ('.tmp')
+    'start': ('.', 'Thumbs.db', 'desktop.ini', '$RECYCLE.BIN', 'System Volume Information', '@eaDir'),
+    'end': ('.tmp',)
 }
 
-NETWORK_FILE_SYSTEM = ('nfs', 'smbfs', 'remote', 'afp', 'ftp', 'snfs')
+# 扫描根目录下的忽略文件，每行一个要跳过的文件夹规则，glob写法，'re:'开头的是正则表达式，'#'开头的是注释
+SCAN_IGNORE_FILE = '.scanignore'
+
+# 网络文件系统类型的开头，nfs也包括nfs4，fuse挂载的类型（fuse.sshfs）比较最后一段
+NETWORK_FILE_SYSTEM = ('nfs', 'smbfs', 'remote', 'afp', 'ftp', 'snfs', 'cifs', 'smb2', 'smb3', 'sshfs',
+                       'ceph', 'glusterfs', 'lustre', 'gpfs', 'beegfs', 'panfs', 'webdav')
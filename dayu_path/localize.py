@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import built-in modules
+import errno
+import os
+import shutil
+import sys
+from multiprocessing.pool import ThreadPool
+
+# Import local modules
+from dayu_path.mounts import io_profile
+
+# 把素材"拷贝"到镜头文件夹时可以使用的方式，按顺序尝试：
+# reflink   写时复制的克隆（XFS、Btrfs的FICLONE），瞬间完成，之后修改任何一边都不会影响另一边
+# hardlink  硬链接，瞬间完成，两个路径指向同一份数据，在镜头里修改文件会改掉素材库里的原文件，需要明确允许
+# symlink   软链接，可以跨设备，但是源文件移动或删除以后会失效，需要明确允许
+# copy      普通的字节拷贝，总是可用，作为最后的后备
+REFLINK = 'reflink'
+HARDLINK = 'hardlink'
+SYMLINK = 'symlink'
+COPY = 'copy'
+DEFAULT_STRATEGIES = (REFLINK, COPY)
+
+# linux/fs.h: #define FICLONE _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+def reflink(src, dst):
+    '''
+    用FICLONE创建写时复制的克隆，只支持linux上同一个支持reflink的文件系统
+    :param src: 源文件
+    :param dst: 目标文件，不能已经存在
+    :return: None，不支持时抛出OSError
+    '''
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, 'reflink is only supported on linux', dst)
+    import fcntl
+    with open(src, 'rb') as src_file:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_file.fileno())
+        except (IOError, OSError):
+            os.close(dst_fd)
+            os.remove(dst)
+            raise
+        os.close(dst_fd)
+
+
+def _existing_parent(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def same_device(src, dst):
+    '''
+    源文件和目标路径（或者它最近的已存在的上层文件夹）是否在同一个设备上
+    '''
+    try:
+        return os.stat(src).st_dev == os.stat(_existing_parent(dst)).st_dev
+    except OSError:
+        return False
+
+
+def localize_file(src, dst, strategies=DEFAULT_STRATEGIES, times=False, permission=False, overwrite=False,
+                  copyfile=shutil.copyfile):
+    '''
+    按strategies的顺序尝试把src放到dst，reflink和hardlink只在同一个设备上尝试，最后总是可以退回到字节拷贝
+    :param src: 源文件
+    :param dst: 目标文件
+    :param strategies: 可以使用的方式，见REFLINK、HARDLINK、SYMLINK、COPY
+    :param times: 字节拷贝时是否保留修改时间
+    :param permission: 字节拷贝时是否保留权限
+    :param overwrite: 目标文件已经存在时是否先删除
+    :param copyfile: 字节拷贝使用的函数，例如dayu_path.throttle.CopyScheduler.copyfile
+    :return: 实际使用的方式
+    '''
+    if os.path.lexists(dst):
+        if not overwrite:
+            raise OSError(errno.EEXIST, 'destination already exists', dst)
+        os.remove(dst)
+    on_same_device = None
+    for strategy in strategies:
+        if strategy in (REFLINK, HARDLINK):
+            if on_same_device is None:
+                on_same_device = same_device(src, dst)
+            if not on_same_device:
+                continue
+        try:
+            if strategy == REFLINK:
+                reflink(src, dst)
+            elif strategy == HARDLINK:
+                os.link(src, dst)
+            elif strategy == SYMLINK:
+                os.symlink(os.path.abspath(src), dst)
+            elif strategy == COPY:
+                copyfile(src, dst)
+                if times or permission:
+                    st = os.stat(src)
+                    if times:
+                        os.utime(dst, (st.st_atime, st.st_mtime))
+                    if permission:
+                        os.chmod(dst, st.st_mode & 0o7777)
+            else:
+                raise ValueError('unknown localize strategy: {}'.format(strategy))
+            return strategy
+        except (AttributeError, NotImplementedError, IOError, OSError):
+            # 这种方式在当前的系统或者文件系统上不可用，尝试下一种；字节拷贝失败时直接抛出
+            if strategy == COPY:
+                raise
+    raise OSError(errno.EXDEV, 'no localize strategy in {} is possible'.format(strategies), dst)
+
+
+def _localize_task(args):
+    src, dst, kwargs, stop_event = args
+    if stop_event is not None and stop_event.is_set():
+        return dst, None
+    try:
+        return dst, localize_file(src, dst, **kwargs)
+    except (IOError, OSError) as e:
+        return dst, e
+
+
+def localize_files(pairs, strategies=DEFAULT_STRATEGIES, workers=None, parents=True, callback=None, stop_event=None,
+                   **kwargs):
+    '''
+    批量放置文件，链接瞬间完成，需要字节拷贝的文件（跨设备）在线程池里并行拷贝
+    :param pairs: [(源文件, 目标文件), ...]
+    :param strategies: 见localize_file
+    :param workers: 并行的线程数，None时按第一个目标文件所在的文件系统选择
+    :param parents: 是否自动创建目标文件夹
+    :param callback: 可选的回调函数，每完成一个文件在调用localize_files的线程里调用一次 callback(目标文件, 使用的方式或者异常)
+    :param stop_event: 可选的threading.Event，set以后还没有开始的文件不再放置（例如在callback里检查到取消时set），
+                       这些文件不在返回的字典里
+    :param kwargs: 传给localize_file的times、permission、overwrite
+    :return: {目标文件: 使用的方式或者异常}
+    '''
+    pairs = list(pairs)
+    if parents:
+        for directory in set(os.path.dirname(dst) for _, dst in pairs):
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+    tasks = [(src, dst, dict(kwargs, strategies=strategies), stop_event) for src, dst in pairs]
+    results = {}
+    if not tasks:
+        return results
+    if workers is None:
+        workers = io_profile(os.path.dirname(pairs[0][1]) or '.').copy_workers
+    pool = ThreadPool(max(1, min(workers, len(tasks))))
+    try:
+        for dst, result in pool.imap_unordered(_localize_task, tasks):
+            if result is None:
+                continue
+            results[dst] = result
+            if callback is not None:
+                callback(dst, result)
+    finally:
+        pool.close()
+        pool.join()
+    return results
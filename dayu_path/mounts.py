@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import built-in modules
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+# Import local modules
+from dayu_path.constants import NETWORK_FILE_SYSTEM
+
+# 每种文件系统的IO参数：
+# walk_workers       递归扫描时同时读取同一层文件夹的线程数，1表示直接用os.walk
+# stat_workers       批量stat（stat_many、validate_sequences）时同时处理文件夹的线程数
+# scandir_threshold  同一个文件夹里要查询的路径达到这个数量时读取整个文件夹，网络盘上一次目录读取比多次stat便宜得多
+# copy_workers       并行字节拷贝的线程数
+IOProfile = namedtuple('IOProfile', 'walk_workers stat_workers scandir_threshold copy_workers')
+
+IO_PROFILES = {
+    # 网络盘的延迟高，需要很多同时进行的请求才能跑满带宽
+    'network': IOProfile(walk_workers=16, stat_workers=32, scandir_threshold=2, copy_workers=16),
+    # 本地盘的目录读取很快，太多线程反而会让机械硬盘来回寻道
+    'local': IOProfile(walk_workers=1, stat_workers=8, scandir_threshold=4, copy_workers=4),
+}
+
+# mountinfo里的挂载点会把空格等字符转义成\040这样的八进制
+_OCTAL_ESCAPE = re.compile(r'\\([0-7]{3})')
+# macOS mount命令的输出：/dev/disk1s1 on / (apfs, local, journaled)
+_MAC_MOUNT_LINE = re.compile(r'^(.*?) on (.*) \(([^,)]+)')
+
+# 挂载表的缓存时间（秒），挂载点很少变化，不需要每次都重新读取
+MOUNT_TABLE_TTL = 60.0
+_MOUNT_CACHE = {'time': 0.0, 'table': None}
+_MOUNT_LOCK = threading.Lock()
+
+# 可选的IO计数回调 callback(名字, 数量)，例如替换流程的性能统计，None时不计数
+_IO_COUNTER = [None]
+
+
+def set_io_counter(callback):
+    '''
+    设置IO计数回调，扫描每读取一个文件夹计数一次'dirs_listed'，批量stat每调用一次stat计数一次'stats_issued'
+    :param callback: callback(名字, 数量)，None表示不再计数
+    '''
+    _IO_COUNTER[0] = callback
+
+
+def count_io(name, value=1):
+    callback = _IO_COUNTER[0]
+    if callback is not None:
+        callback(name, value)
+
+
+def _unescape(value):
+    return _OCTAL_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), value)
+
+
+def parse_mountinfo(text):
+    '''
+    解析/proc/self/mountinfo
+    :param text: 文件内容
+    :return: [(挂载点, 文件系统类型, 设备), ...]
+    '''
+    mounts = []
+    for line in text.splitlines():
+        fields = line.split()
+        if '-' not in fields:
+            continue
+        separator = fields.index('-')
+        if separator < 5 or len(fields) < separator + 3:
+            continue
+        mounts.append((_unescape(fields[4]), fields[separator + 1], _unescape(fields[separator + 2])))
+    return mounts
+
+
+def _read_mount_table():
+    if sys.platform.startswith('linux'):
+        try:
+            with open('/proc/self/mountinfo') as f:
+                return parse_mountinfo(f.read())
+        except (IOError, OSError):
+            return []
+    if sys.platform == 'darwin':
+        try:
+            output = subprocess.check_output(['mount']).decode('utf-8', 'replace')
+        except (OSError, subprocess.CalledProcessError):
+            return []
+        mounts = []
+        for line in output.splitlines():
+            match = _MAC_MOUNT_LINE.match(line)
+            if match:
+                mounts.append((match.group(2), match.group(3).strip(), match.group(1)))
+        return mounts
+    return []
+
+
+def mount_table(refresh=False):
+    '''
+    当前系统的挂载表，按挂载点长度从长到短排序，缓存MOUNT_TABLE_TTL秒
+    :param refresh: 是否强制重新读取
+    :return: [(挂载点, 文件系统类型, 设备), ...]
+    '''
+    with _MOUNT_LOCK:
+        now = time.time()
+        if refresh or _MOUNT_CACHE['table'] is None or now - _MOUNT_CACHE['time'] > MOUNT_TABLE_TTL:
+            table = _read_mount_table()
+            table.sort(key=lambda mount: len(mount[0]), reverse=True)
+            _MOUNT_CACHE['table'] = table
+            _MOUNT_CACHE['time'] = now
+        return _MOUNT_CACHE['table']
+
+
+def _windows_fs_type(path):
+    if path.startswith(('\\\\', '//')):
+        return 'smbfs'
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if not drive:
+        return None
+    try:
+        import ctypes
+        # DRIVE_REMOTE = 4
+        if ctypes.windll.kernel32.GetDriveTypeW(u'{}\\'.format(drive)) == 4:
+            return 'remote'
+        name = ctypes.create_unicode_buffer(64)
+        if ctypes.windll.kernel32.GetVolumeInformationW(u'{}\\'.format(drive), None, 0, None, None, None, name, 64):
+            return name.value.lower()
+    except (AttributeError, OSError, ValueError):
+        pass
+    return None
+
+
+def fs_type(path):
+    '''
+    路径所在的文件系统类型，例如 'ext4'、'xfs'、'nfs4'、'cifs'，无法判断时返回None
+    :param path: 文件或者文件夹路径，不需要存在
+    :return: 文件系统类型字符串
+    '''
+    if os.name == 'nt':
+        return _windows_fs_type(path)
+    path = os.path.realpath(os.path.abspath(path))
+    for mount_point, mount_type, _ in mount_table():
+        if path == mount_point or path.startswith(mount_point.rstrip('/') + '/'):
+            return mount_type
+    return None
+
+
+def is_network_fs_type(mount_type):
+    '''
+    文件系统类型是不是网络文件系统
+    '''
+    if not mount_type:
+        return False
+    mount_type = mount_type.lower()
+    return mount_type.startswith(NETWORK_FILE_SYSTEM) or mount_type.split('.')[-1] in NETWORK_FILE_SYSTEM
+
+
+def io_profile(path):
+    '''
+    根据路径所在的文件系统选择IO参数
+    :param path: 文件或者文件夹路径
+    :return: IOProfile
+    '''
+    return IO_PROFILES['network' if is_network_fs_type(fs_type(path)) else 'local']
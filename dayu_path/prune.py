@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import built-in modules
+import fnmatch
+import os
+import re
+from multiprocessing.pool import ThreadPool
+
+# Import third-party modules
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# Import local modules
+from dayu_path.constants import SCAN_IGNORE
+from dayu_path.constants import SCAN_IGNORE_FILE
+from dayu_path.mounts import count_io
+
+
+class DirectoryPruner(object):
+    '''
+    扫描时在进入子文件夹之前跳过不需要的文件夹，配合os.walk(topdown=True)使用：
+        pruner = DirectoryPruner(root, exclude=['backup', 'cache/*', 're:^tmp_\\d+$'], max_depth=3)
+        for dirpath, dirnames, filenames in os.walk(root):
+            pruner.prune(dirpath, dirnames)
+
+    规则不区分大小写，不包含'/'的glob规则和文件夹名字比较，包含'/'的和相对于根目录的路径比较，
+    're:'开头的规则是正则表达式，和文件夹名字或者相对路径比较。根目录下的忽略文件（默认是.scanignore）里的规则会自动加上。
+    '''
+
+    def __init__(self, root, exclude=None, max_depth=None, ignore_hidden=True, ignore_file=SCAN_IGNORE_FILE):
+        '''
+        :param root: 扫描的根目录
+        :param exclude: 要跳过的文件夹规则列表，glob写法或者're:'开头的正则表达式，也可以是编译好的正则表达式
+        :param max_depth: 最多进入几层子文件夹，0表示只扫描根目录，None表示不限制
+        :param ignore_hidden: 是否跳过隐藏文件夹（SCAN_IGNORE['start']开头的文件夹）
+        :param ignore_file: 根目录下忽略文件的名字，None表示不读取
+        '''
+        self.root = os.path.normpath(root)
+        self.max_depth = max_depth
+        self.ignore_hidden = ignore_hidden
+        self.name_patterns = []
+        self.path_patterns = []
+        self.regexes = []
+        rules = list(exclude or [])
+        if ignore_file:
+            rules.extend(self.read_ignore_file(os.path.join(self.root, ignore_file)))
+        for rule in rules:
+            self.add_rule(rule)
+
+    @staticmethod
+    def read_ignore_file(filename):
+        '''
+        读取忽略文件，文件不存在时返回空列表
+        :param filename: 忽略文件的路径
+        :return: 规则列表
+        '''
+        try:
+            with open(filename) as f:
+                lines = f.read().splitlines()
+        except (IOError, OSError):
+            return []
+        return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+    def add_rule(self, rule):
+        if hasattr(rule, 'match'):
+            self.regexes.append(rule)
+        elif rule.startswith('re:'):
+            self.regexes.append(re.compile(rule[3:], re.IGNORECASE))
+        elif '/' in rule.strip('/'):
+            self.path_patterns.append(rule.strip('/').lower())
+        else:
+            self.name_patterns.append(rule.strip('/').lower())
+
+    @property
+    def active(self):
+        '''
+        是否有任何规则，没有规则时调用者可以跳过prune
+        '''
+        return bool(self.ignore_hidden or self.max_depth is not None or
+                    self.name_patterns or self.path_patterns or self.regexes)
+
+    def relative(self, dirpath):
+        relative = os.path.relpath(dirpath, self.root).replace('\\', '/')
+        return '' if relative == '.' else relative
+
+    def depth(self, dirpath):
+        relative = self.relative(dirpath)
+        return relative.count('/') + 1 if relative else 0
+
+    def is_excluded(self, dirpath, name=None):
+        '''
+        判断一个文件夹是否需要跳过
+        :param dirpath: 文件夹路径，给出name时是上层文件夹的路径
+        :param name: 文件夹名字
+        :return: bool
+        '''
+        if name is None:
+            dirpath, name = os.path.split(os.path.normpath(dirpath))
+        if self.ignore_hidden and name.startswith(SCAN_IGNORE['start']):
+            return True
+        lower_name = name.lower()
+        if any(fnmatch.fnmatchcase(lower_name, pattern) for pattern in self.name_patterns):
+            return True
+        if any(regex.search(name) for regex in self.regexes):
+            return True
+        if self.path_patterns or self.regexes:
+            parent = self.relative(dirpath)
+            relative = '/'.join((parent, name)) if parent else name
+            if any(fnmatch.fnmatchcase(relative.lower(), pattern) for pattern in self.path_patterns):
+                return True
+            if any(regex.search(relative) for regex in self.regexes):
+                return True
+        return False
+
+    def prune(self, dirpath, dirnames):
+        '''
+        原地修改os.walk得到的dirnames，跳过不需要进入的子文件夹
+        :param dirpath: os.walk当前的文件夹
+        :param dirnames: os.walk当前的子文件夹列表
+        :return: dirnames
+        '''
+        if self.max_depth is not None and self.depth(dirpath) >= self.max_depth:
+            dirnames[:] = []
+        else:
+            dirnames[:] = [name for name in dirnames if not self.is_excluded(dirpath, name)]
+        return dirnames
+
+
+def _list_directory(dirpath):
+    # 和os.walk一样，指向文件夹的软链接放在dirnames里，但是不进入
+    dirnames, filenames, links = [], [], set()
+    count_io('dirs_listed')
+    try:
+        if scandir is not None:
+            for entry in scandir(dirpath):
+                try:
+                    is_dir = entry.is_dir()
+                    if is_dir and entry.is_symlink():
+                        links.add(entry.name)
+                except OSError:
+                    is_dir = False
+                (dirnames if is_dir else filenames).append(entry.name)
+        else:
+            for name in os.listdir(dirpath):
+                path = os.path.join(dirpath, name)
+                if os.path.isdir(path):
+                    dirnames.append(name)
+                    if os.path.islink(path):
+                        links.add(name)
+                else:
+                    filenames.append(name)
+    except OSError:
+        pass
+    return dirpath, dirnames, filenames, links
+
+
+def walk_tree(top, pruner=None, workers=1):
+    '''
+    和os.walk(topdown=True)一样的文件夹遍历，workers大于1时同一层的文件夹在线程池里同时读取，
+    适合延迟高的网络盘；返回的顺序在同一层内不固定。调用者可以像os.walk一样原地修改dirnames。
+    :param top: 根目录
+    :param pruner: 可选的DirectoryPruner，在返回之前裁剪dirnames
+    :param workers: 同时读取文件夹的线程数，1表示直接使用os.walk
+    :return: (dirpath, dirnames, filenames)的生成器
+    '''
+    if workers <= 1:
+        for dirpath, dirnames, filenames in os.walk(top):
+            count_io('dirs_listed')
+            if pruner is not None and pruner.active:
+                pruner.prune(dirpath, dirnames)
+            yield dirpath, dirnames, filenames
+        return
+    level = [top]
+    pool = ThreadPool(workers)
+    try:
+        while level:
+            next_level = []
+            for dirpath, dirnames, filenames, links in pool.imap_unordered(_list_directory, level):
+                if pruner is not None and pruner.active:
+                    pruner.prune(dirpath, dirnames)
+                yield dirpath, dirnames, filenames
+                next_level.extend(os.path.join(dirpath, name) for name in dirnames if name not in links)
+            level = next_level
+    finally:
+        pool.close()
+        pool.join()
@@ -473,6 +473,17 @@ def test_scan(mock_path):
     assert mock_path.child('ignore_test', 'temp.tmp') not in files
 
 
+def test_scan_filters(mock_path):
+    # 所有过滤条件串联生效，不是只有最后一个
+    files = list(mock_path.scan(recursive=True, ext_filters={'.EXR'}, regex_pattern=r'.*/vfx_test/'))
+    assert files == [mock_path.child('vfx_test', 'pl_0010_plt_v0001.%04d.exr')]
+    files = list(mock_path.scan(recursive=True, ext_filters='.exr', function_filter=lambda f: 'inside' not in f))
+    assert mock_path.child('recursive_test', 'inside', 'b_%03d.exr') not in files
+    assert mock_path.child('recursive_test', 'a_%03d.exr') in files
+    files = list(mock_path.scan(recursive=True, ext_filters=['.mp4', '.mov'], prefix='mvi'))
+    assert files == [mock_path.child('single_media_test', 'MVI1022.MP4')]
+
+
 @pytest.mark.parametrize(
     'test_data', [
         {
@@ -543,3 +554,215 @@ def test_is_network():
 def test_is_local():
     assert not DayuPath('/Volumes/filedata/td/finder.lnk').is_local
     assert not DayuPath('/Users/andyguo/Desktop/log.txt').is_local
+
+
+def test_stat_many(mock_path):
+    paths = [mock_path.child('cam_test', 'A001C001_180212_RG8C.{}.exr'.format(frame))
+             for frame in range(9876520, 9876525)]
+    paths.append(mock_path.child('not_a_sequence', 'abc.exr'))
+    paths.append(mock_path.child('not_exist_folder', 'abc.exr'))
+    for threshold in (1, 100):
+        result = DayuPath.stat_many(paths, scandir_threshold=threshold)
+        assert sorted(result.keys()) == sorted(paths)
+        assert [result[p] is not None for p in paths] == [False, True, True, True, False, True, False]
+        assert result[paths[1]].st_size == 1
+
+    result = DayuPath.stat_many(paths, workers=1, only_exists=True)
+    assert [result[p] for p in paths] == [False, True, True, True, False, True, False]
+    assert DayuPath.stat_many([]) == {}
+
+
+def test_scan_prune(tmpdir):
+    root = DayuPath(str(tmpdir))
+    for x in ['a_001.exr', 'shot/b_001.exr', 'shot/deep/c_001.exr', 'backup/d_001.exr', 'Cache/e_001.exr',
+              '.snapshot/f_001.exr', 'shot/tmp_12/g_001.exr', 'temp.tmp']:
+        file_path = root.child(*x.split('/'))
+        file_path.parent.mkdir(parents=True)
+        with open(file_path, 'w') as f:
+            f.write('1')
+    names = lambda files: sorted(f.name for f in files)
+    assert names(root.scan(recursive=True, ignore_file=None)) == \
+        ['a_%03d.exr', 'b_%03d.exr', 'c_%03d.exr', 'd_%03d.exr', 'e_%03d.exr', 'g_%03d.exr']
+    assert names(root.scan(recursive=True, max_depth=1)) == \
+        ['a_%03d.exr', 'b_%03d.exr', 'd_%03d.exr', 'e_%03d.exr']
+    assert names(root.scan(recursive=True, exclude=['backup', 'cache', r're:^tmp_\d+$'])) == \
+        ['a_%03d.exr', 'b_%03d.exr', 'c_%03d.exr']
+    with open(root.child('.scanignore'), 'w') as f:
+        f.write('# comment\nshot/deep\nbackup\n')
+    assert names(root.scan(recursive=True)) == ['a_%03d.exr', 'b_%03d.exr', 'e_%03d.exr', 'g_%03d.exr']
+    assert names(root.scan(recursive=True, workers=4)) == ['a_%03d.exr', 'b_%03d.exr', 'e_%03d.exr', 'g_%03d.exr']
+
+
+def test_scan_hidden(tmpdir):
+    root = DayuPath(str(tmpdir))
+    for x in ['Thumbnails/a_001.jpg', 'ThumbCache/b_001.jpg', '.hidden/c_001.jpg', '@eaDir/d_001.jpg',
+              'shot/Thumbs.db', 'shot/e_001.jpg']:
+        file_path = root.child(*x.split('/'))
+        file_path.parent.mkdir(parents=True)
+        with open(file_path, 'w') as f:
+            f.write('1')
+    # 只跳过真正的隐藏文件夹和系统文件，Thumbnails这样的普通文件夹还是会扫描
+    assert sorted(f.name for f in root.scan(recursive=True)) == ['a_%03d.jpg', 'b_%03d.jpg', 'e_%03d.jpg']
+    assert sorted(f.name for f in root.child('shot').scan()) == ['e_%03d.jpg']
+
+
+def test_mountinfo():
+    from dayu_path.mounts import is_network_fs_type
+    from dayu_path.mounts import parse_mountinfo
+    text = '''22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw
+35 22 0:40 / /mnt/show\\040data rw,relatime shared:20 - nfs4 filer:/show rw,vers=4.1
+36 22 0:41 / /mnt/smb rw - cifs //nas/share rw
+37 22 0:42 / /mnt/ssh rw - fuse.sshfs user@host:/ rw
+'''
+    mounts = parse_mountinfo(text)
+    assert [m[0] for m in mounts] == ['/', '/mnt/show data', '/mnt/smb', '/mnt/ssh']
+    assert [is_network_fs_type(m[1]) for m in mounts] == [False, True, True, True]
+    assert not is_network_fs_type(None)
+
+
+@pytest.mark.parametrize('path', [
+    '/Users/andyguo/Desktop/pl_0010_plt_v0023.%04d.jpg',
+    '/Users/andyguo/Desktop/pl_0010_plt_v0023.####.jpg',
+    '/Users/andyguo/Desktop/pl_0010_plt_v0023.$F4.jpg',
+    '/Users/andyguo/Desktop/%03d/pl_0010.%03d.jpg',
+    '/Users/andyguo/Desktop/100%/pl_0010.%d.jpg',
+    '/Users/andyguo/Desktop/abc.mov',
+])
+def test_template(path):
+    template = DayuPath(path).template()
+    frames = [0, 12, 1001]
+    assert list(template.paths(frames)) == [DayuPath(path).restore_pattern(f) for f in frames]
+    assert template.strings(frames) == [DayuPath(path).restore_pattern(f) for f in frames]
+    assert template.names(frames) == [DayuPath(path).restore_pattern(f).name for f in frames]
+    assert template.restore(-1) == path
+    assert bool(template) == (DayuPath(path).pattern is not None)
+    if path == '/Users/andyguo/Desktop/%03d/pl_0010.%03d.jpg':
+        assert template.restore(12) == '/Users/andyguo/Desktop/012/pl_0010.012.jpg'
+
+
+def test_template_keeps_frames():
+    path = DayuPath('/Users/andyguo/Desktop/pl_0010.%04d.jpg', frames=[1001, 1002])
+    path.template()
+    path.restore_pattern(1001)
+    assert path.frames == [1001, 1002]
+
+
+def test_localize_files(tmpdir):
+    import os
+    import threading
+    from dayu_path.localize import DEFAULT_STRATEGIES
+    from dayu_path.localize import HARDLINK
+    from dayu_path.localize import localize_files
+    # 硬链接会让镜头里的修改改掉素材库里的原文件，只在明确给出时使用
+    assert HARDLINK not in DEFAULT_STRATEGIES
+    root = DayuPath(str(tmpdir))
+    pairs = []
+    for frame in range(1, 5):
+        src = root.child('src', 'a.{}.exr'.format(frame))
+        src.parent.mkdir(parents=True)
+        with open(src, 'w') as f:
+            f.write('1')
+        pairs.append((src, root.child('dst', src.name)))
+    results = localize_files(pairs, workers=1)
+    assert sorted(results) == [dst for _, dst in pairs]
+    assert os.stat(pairs[0][1]).st_nlink == 1
+    assert isinstance(localize_files(pairs[:1], workers=1)[pairs[0][1]], OSError)
+    stop_event = threading.Event()
+    stop_event.set()
+    assert localize_files(pairs, workers=1, stop_event=stop_event, overwrite=True) == {}
+
+
+def test_copy_scheduler(tmpdir):
+    from dayu_path.throttle import CopyScheduler
+    from dayu_path.throttle import TokenBucket
+    from dayu_path.throttle import parse_rate
+    assert parse_rate('200M') == 200 * 1024 ** 2
+    assert parse_rate('1.5G/s') == 1.5 * 1024 ** 3
+    assert parse_rate(0) is None
+
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(100, clock=lambda: now[0], sleep=sleep)
+    assert bucket.consume(250) == 0
+    assert bucket.consume(10) == 2.5
+    assert sleeps == [2.5]
+
+    root = DayuPath(str(tmpdir))
+    pairs = {}
+    for name in ('a', 'b'):
+        for frame in range(1, 5):
+            src = root.child('src', '{}.{}.exr'.format(name, frame))
+            src.parent.mkdir(parents=True)
+            with open(src, 'w') as f:
+                f.write('x' * frame)
+            pairs.setdefault(name, []).append((src, root.child('dst', src.name)))
+    order = []
+    scheduler = CopyScheduler(bytes_per_second='1M', workers=1, strategies=('copy',))
+    scheduler.add_sequence(pairs['a'], [1, 2, 3, 4], (3, 4), sequence='a')
+    scheduler.add_sequence(pairs['b'], [1, 2, 3, 4], None, sequence='b')
+    assert len(scheduler) == 8
+    results = scheduler.run(callback=lambda dst, result: order.append(dst.name))
+    assert order == ['a.3.exr', 'a.4.exr', 'a.1.exr', 'b.1.exr', 'a.2.exr', 'b.2.exr', 'b.3.exr', 'b.4.exr']
+    assert set(results.values()) == {'copy'}
+    assert root.child('dst', 'b.4.exr').size() == 4
+
+    # cancel丢掉还没开始的文件，之后同一个调度器还可以继续使用
+    scheduler = CopyScheduler(workers=1, strategies=('copy',))
+    scheduler.add(pairs['a'], sequence='a')
+    scheduler.cancel()
+    assert len(scheduler) == 0
+    assert scheduler.run() == {}
+    scheduler.add(pairs['b'], sequence='b')
+    assert len(scheduler.run(overwrite=True)) == 4
+
+
+def test_variable_resolver():
+    from dayu_path.variables import VariableResolver
+    from dayu_path.variables import is_absolute_path
+    from dayu_path.variables import is_file_value
+    lookups = []
+
+    def lookup(name):
+        lookups.append(name)
+        return {'JOB': '/mnt/proj', 'HIP': '${JOB}/shots/sh010'}.get(name)
+
+    resolver = VariableResolver({'OS': 'Windows_NT'}, lookup=lookup, use_environ=False)
+    assert resolver.expand('$HIP/tex/wood.$F4.exr') == '/mnt/proj/shots/sh010/tex/wood.$F4.exr'
+    assert resolver.expand('$JOB/$OS/$UNKNOWN.exr') == '/mnt/proj/$OS/$UNKNOWN.exr'
+    assert resolver.expand('\\\\nas\\lib\\a.exr') == '//nas/lib/a.exr'
+    count = len(lookups)
+    assert resolver.expand('$HIP/tex/wood.$F4.exr') == '/mnt/proj/shots/sh010/tex/wood.$F4.exr'
+    assert len(lookups) - count == 2
+    resolver.variables['JOB'] = '/mnt/other'
+    assert resolver.expand('$HIP/tex/wood.$F4.exr') == '/mnt/other/shots/sh010/tex/wood.$F4.exr'
+
+    assert resolver.unexpand('/mnt/other/lib/wood.$F4.exr', '$JOB/tex/wood.$F4.exr') == '$JOB/lib/wood.$F4.exr'
+    assert resolver.unexpand('/mnt/otherlib/wood.exr', '${JOB}/tex/wood.exr') == '/mnt/otherlib/wood.exr'
+    assert resolver.unexpand('d:/lib/wood.exr', 'd:/tex/wood.exr') == 'd:/lib/wood.exr'
+    assert [is_absolute_path(p) for p in ('d:/a', '//nas/a', '/mnt/a', '$JOB/a', 'a.exr')] == \
+        [True, True, True, False, False]
+    assert [is_file_value(p) for p in ('d:/a/b.exr', '/mnt/job/geo', '//nas/lib', '/mnt/a.v2/render', 'a.exr')] == \
+        [True, False, False, False, False]
+
+
+def test_variable_resolver_memo(monkeypatch):
+    from dayu_path import variables
+    monkeypatch.setattr(variables, 'MAX_MEMO_SIZE', 3)
+    resolver = variables.VariableResolver({'JOB': '/mnt/proj'}, use_environ=False)
+    for index in range(10):
+        assert resolver.expand('$JOB/{}.exr'.format(index)) == '/mnt/proj/{}.exr'.format(index)
+        assert len(resolver._memo) <= 3
+
+
+def test_expand_var(monkeypatch):
+    # expand_var和os.path.expandvars一样展开所有环境变量，包括$OS和$F4这样的名字
+    monkeypatch.setenv('OS', 'Windows_NT')
+    monkeypatch.setenv('F4', '1001')
+    monkeypatch.setenv('REPATH_TEST_JOB', '/mnt/proj')
+    assert DayuPath('$REPATH_TEST_JOB/$OS/a.$F4.exr').expand_var() == '/mnt/proj/Windows_NT/a.1001.exr'
+    assert DayuPath('$REPATH_TEST_JOB/sh010/../a.exr').expand() == '/mnt/proj/a.exr'
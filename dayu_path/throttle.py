@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import built-in modules
+import collections
+import datetime
+import os
+import re
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Import local modules
+from dayu_path.localize import DEFAULT_STRATEGIES
+from dayu_path.localize import localize_file
+from dayu_path.mounts import io_profile
+
+# 优先级，数字越小越先拷贝；例如当前镜头帧范围内的帧放在HIGH，其他的帧放在NORMAL
+HIGH = 0
+NORMAL = 1
+LOW = 2
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+_RATE_REGEX = re.compile(r'^\s*([0-9.]+)\s*([kmgt]?)i?b?\s*(?:/s)?\s*$', re.IGNORECASE)
+_RATE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_rate(value):
+    '''
+    把 '200M'、'1.5G/s'、'500' 这样的限速写法转成每秒的数量，None、0、空字符串表示不限速
+    :param value: 字符串或者数字
+    :return: float或者None
+    '''
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) or None
+    match = _RATE_REGEX.match(value)
+    if not match:
+        raise ValueError('invalid rate: {}'.format(value))
+    return float(match.group(1)) * _RATE_UNITS[match.group(2).lower()] or None
+
+
+class TokenBucket(object):
+    '''
+    线程安全的令牌桶，每秒补充rate个令牌，最多积攒burst个。
+    consume可以一次取走比burst更多的令牌，这时桶变成负数，之后的调用等到补回来为止，所以大块请求不会永远等待。
+    '''
+
+    def __init__(self, rate=None, burst=None, clock=time.time, sleep=time.sleep):
+        '''
+        :param rate: 每秒的令牌数，None表示不限制
+        :param burst: 桶的容量，默认是一秒的量
+        '''
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._last = clock()
+        self.rate = None
+        self.burst = None
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        '''
+        修改速率，已经积攒的令牌不超过新的容量
+        '''
+        with self._lock:
+            self._refill()
+            self.rate = rate or None
+            self.burst = burst or rate or None
+            if self.burst is not None:
+                self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self):
+        now = self.clock()
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def consume(self, amount=1):
+        '''
+        取走amount个令牌，不够时阻塞等待
+        :return: 等待的秒数
+        '''
+        waited = 0.0
+        while True:
+            with self._lock:
+                if self.rate is None:
+                    return waited
+                self._refill()
+                if self._tokens >= 0:
+                    self._tokens -= amount
+                    return waited
+                delay = -self._tokens / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+class CopyScheduler(object):
+    '''
+    带限速的拷贝调度器，多个序列共用同样的字节速率和操作速率（打开、创建文件的次数）：
+        scheduler = CopyScheduler(bytes_per_second='200M', ops_per_second=500,
+                                  schedule=[(20, 8, None, None)])   # 晚上8点到早上8点不限速
+        scheduler.add(pairs_in_shot_range, sequence='a.%04d.exr', priority=HIGH)
+        scheduler.add(other_pairs, sequence='a.%04d.exr')
+        results = scheduler.run(callback=on_done)
+
+    先拷贝优先级高的任务；同一个优先级里在序列之间轮流取帧，一个很长的序列不会让其他序列一直等待。
+    克隆和硬链接不读写数据，只占用操作速率；字节拷贝按块读写，每一块都占用字节速率。
+    限速只在当前进程内有效，多个用户同时拷贝时每个人各自限制自己的份额。
+    '''
+
+    def __init__(self, bytes_per_second=None, ops_per_second=None, workers=None, schedule=None,
+                 strategies=DEFAULT_STRATEGIES, chunk_size=COPY_CHUNK_SIZE, clock=time.time, sleep=time.sleep):
+        '''
+        :param bytes_per_second: 字节速率上限，可以是 '200M' 这样的字符串，None表示不限速
+        :param ops_per_second: 每秒最多处理的文件数，None表示不限速
+        :param workers: 并行的线程数，None时按第一个目标文件所在的文件系统选择
+        :param schedule: 可选的时间段列表 [(开始小时, 结束小时, 字节速率, 操作速率), ...]，
+                         当前时间落在某个时间段里时使用这个时间段的限速，结束小时小于开始小时表示跨过午夜
+        :param strategies: 见dayu_path.localize
+        :param chunk_size: 字节拷贝时每次读写的大小
+        '''
+        self.limits = (parse_rate(bytes_per_second), parse_rate(ops_per_second))
+        self.schedule = [(start, end, parse_rate(rate), parse_rate(ops)) for start, end, rate, ops in schedule or []]
+        self.workers = workers
+        self.strategies = strategies
+        self.chunk_size = chunk_size
+        self.clock = clock
+        self.byte_bucket = TokenBucket(self.limits[0], clock=clock, sleep=sleep)
+        self.op_bucket = TokenBucket(self.limits[1], clock=clock, sleep=sleep)
+        self._lock = threading.Lock()
+        # {优先级: OrderedDict({序列: deque([(源文件, 目标文件), ...])})}，同一个优先级里的序列轮流出队
+        self._lanes = {}
+        self._pending = 0
+
+    def __len__(self):
+        return self._pending
+
+    def add(self, pairs, sequence=None, priority=NORMAL):
+        '''
+        添加拷贝任务
+        :param pairs: [(源文件, 目标文件), ...]
+        :param sequence: 任务所属的序列，同一个优先级里不同的序列公平地轮流拷贝，None时每个目标文件夹算一个序列
+        :param priority: HIGH、NORMAL、LOW或者任意整数，越小越先拷贝
+        '''
+        with self._lock:
+            lane = self._lanes.setdefault(priority, collections.OrderedDict())
+            for src, dst in pairs:
+                key = sequence if sequence is not None else os.path.dirname(dst)
+                lane.setdefault(key, collections.deque()).append((src, dst))
+                self._pending += 1
+
+    def add_sequence(self, pairs, frames, frame_range, sequence=None):
+        '''
+        把一个序列按帧范围分到两个优先级：frame_range里的帧是HIGH，其他帧是NORMAL
+        :param pairs: [(源文件, 目标文件), ...]
+        :param frames: 和pairs一一对应的帧号，单个文件是None
+        :param frame_range: (开始帧, 结束帧)，None时全部是NORMAL
+        '''
+        high, normal = [], []
+        for pair, frame in zip(pairs, frames):
+            in_range = frame_range is not None and frame is not None and frame_range[0] <= frame <= frame_range[1]
+            (high if in_range else normal).append(pair)
+        if high:
+            self.add(high, sequence, HIGH)
+        if normal:
+            self.add(normal, sequence, NORMAL)
+
+    def cancel(self):
+        '''
+        丢掉所有还没开始的文件，正在拷贝的文件会完成；之后还可以继续add和run
+        '''
+        with self._lock:
+            self._lanes.clear()
+            self._pending = 0
+
+    def current_limits(self, now=None):
+        '''
+        当前时间对应的 (字节速率, 操作速率)
+        '''
+        hour = datetime.datetime.fromtimestamp(self.clock() if now is None else now).hour
+        for start, end, rate, ops in self.schedule:
+            if (start <= hour < end) if start <= end else (hour >= start or hour < end):
+                return rate, ops
+        return self.limits
+
+    def _update_limits(self):
+        rate, ops = self.current_limits()
+        if rate != self.byte_bucket.rate:
+            self.byte_bucket.set_rate(rate)
+        if ops != self.op_bucket.rate:
+            self.op_bucket.set_rate(ops)
+
+    def _next(self):
+        with self._lock:
+            for priority in sorted(self._lanes):
+                lane = self._lanes[priority]
+                if not lane:
+                    continue
+                sequence, frames = next(iter(lane.items()))
+                task = frames.popleft()
+                # 取完一帧以后把这个序列移到最后，下一次轮到其他序列
+                del lane[sequence]
+                if frames:
+                    lane[sequence] = frames
+                self._pending -= 1
+                return task
+            return None
+
+    def copyfile(self, src, dst):
+        '''
+        限速的字节拷贝，可以代替shutil.copyfile
+        '''
+        with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+            while True:
+                chunk = src_file.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.byte_bucket.consume(len(chunk))
+                dst_file.write(chunk)
+
+    def _worker(self, done, kwargs):
+        try:
+            while True:
+                task = self._next()
+                if task is None:
+                    return
+                src, dst = task
+                self._update_limits()
+                self.op_bucket.consume(1)
+                try:
+                    result = localize_file(src, dst, strategies=self.strategies, copyfile=self.copyfile, **kwargs)
+                except (IOError, OSError) as e:
+                    result = e
+                done.put((dst, result))
+        finally:
+            done.put(None)
+
+    def run(self, callback=None, parents=True, **kwargs):
+        '''
+        拷贝所有已经添加的任务，直到完成或者cancel
+        :param callback: 可选的回调函数，每完成一个文件在调用run的线程里调用一次 callback(目标文件, 使用的方式或者异常)，
+                         可以在回调里更新界面或者cancel
+        :param parents: 是否自动创建目标文件夹
+        :param kwargs: 传给localize_file的times、permission、overwrite
+        :return: {目标文件: 使用的方式或者异常}
+        '''
+        results = {}
+        with self._lock:
+            tasks = [task for lane in self._lanes.values() for queue in lane.values() for task in queue]
+        if not tasks:
+            return results
+        if parents:
+            for directory in set(os.path.dirname(dst) for _, dst in tasks):
+                if directory and not os.path.isdir(directory):
+                    os.makedirs(directory)
+        workers = self.workers or io_profile(os.path.dirname(tasks[0][1]) or '.').copy_workers
+        done = queue.Queue()
+        threads = [threading.Thread(target=self._worker, args=(done, kwargs))
+                   for _ in range(max(1, min(workers, len(tasks))))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        running = len(threads)
+        while running:
+            item = done.get()
+            if item is None:
+                running -= 1
+                continue
+            results[item[0]] = item[1]
+            if callback is not None:
+                callback(*item)
+        return results
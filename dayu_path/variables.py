@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import built-in modules
+import os
+import re
+import threading
+
+# $JOB、${JOB}，windows上还有%JOB%
+if os.name == 'nt':
+    VARIABLE_REGEX = re.compile(r'\$\{(\w+)\}|\$(\w+)|%(\w+)%')
+else:
+    VARIABLE_REGEX = re.compile(r'\$\{(\w+)\}|\$(\w+)')
+# 帧号、节点名字之类的变量由DCC在计算时替换，不能当成环境变量展开，例如$F4、$OS（windows的环境变量里也有OS）
+DCC_LOCAL_VARIABLES = re.compile(r'^(F\d*|FF|SF|T|N|NFRAMES|FPS|FSTART|FEND|RFSTART|RFEND|OS|OPNAME|CH|ACTIVETAKE)$')
+# 盘符（d:/）、UNC（//server、\\server）和POSIX（/mnt）开头的路径
+ABSOLUTE_PATH_REGEX = re.compile(r'^([a-zA-Z]:[/\\]|//|\\\\|/)')
+# 展开时变量的值里还有变量时最多再展开几次
+MAX_EXPAND_DEPTH = 4
+# 一个VariableResolver最多缓存多少个原始字符串，超过时清空重新缓存，一直使用同一个实例时内存不会无限增长
+MAX_MEMO_SIZE = 65536
+
+
+def is_absolute_path(value):
+    '''
+    是不是盘符、UNC或者POSIX根目录开头的绝对路径
+    '''
+    return bool(ABSOLUTE_PATH_REGEX.match(value))
+
+
+def is_file_value(value):
+    '''
+    展开变量以后的parm值是不是需要检查的素材路径：盘符、UNC或者POSIX绝对路径，并且有文件后缀，
+    $HIP/render、/mnt/job/geo这样的文件夹不算
+    '''
+    return is_absolute_path(value) and bool(os.path.splitext(value)[1])
+
+
+class VariableResolver(object):
+    '''
+    展开DCC里parm（knob）原始值里的环境变量和DCC变量（$HIP、$JOB），帧号之类的DCC变量保持原样，每个不同的原始字符串只展开一次。
+    只在读取DCC工程（hou_file_parm_dict、hip_reader）时使用，DayuPath.expand_var还是os.path.expandvars：
+        resolver = VariableResolver(lookup=hou.getenv)
+        resolver.expand('$JOB/tex/wood.$F4.exr')                     # '/mnt/proj/tex/wood.$F4.exr'
+        resolver.unexpand('/mnt/proj/lib/wood.$F4.exr', '$JOB/tex/wood.$F4.exr')  # '$JOB/lib/wood.$F4.exr'
+
+    缓存里同时记录了用到的变量的值，变量的值改变以后会重新展开，所以可以一直使用同一个实例。
+    '''
+
+    def __init__(self, variables=None, lookup=None, use_environ=True):
+        '''
+        :param variables: 可选的{变量名: 值}，优先级最高，例如离线读取hip文件时的HIP
+        :param lookup: 可选的函数，参数是变量名，返回值或者None，例如hou.getenv
+        :param use_environ: 前面都找不到时是否使用os.environ
+        '''
+        self.variables = dict(variables or {})
+        self.lookup = lookup
+        self.use_environ = use_environ
+        # {原始字符串: (展开的结果, ((变量名, 值), ...))}
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def value(self, name):
+        '''
+        一个变量的值，找不到或者是DCC_LOCAL_VARIABLES时返回None
+        '''
+        if DCC_LOCAL_VARIABLES.match(name):
+            return None
+        if name in self.variables:
+            return self.variables[name]
+        if self.lookup is not None:
+            value = self.lookup(name)
+            if value is not None:
+                return value
+        if self.use_environ:
+            return os.environ.get(name)
+        return None
+
+    def _expand(self, raw):
+        used = {}
+
+        def replace(match):
+            name = match.group(match.lastindex)
+            value = self.value(name)
+            used[name] = value
+            return match.group(0) if value is None else value.replace('\\', '/')
+
+        expanded = raw
+        for _ in range(MAX_EXPAND_DEPTH):
+            result = VARIABLE_REGEX.sub(replace, expanded)
+            if result == expanded:
+                break
+            expanded = result
+        return expanded, tuple(sorted(used.items()))
+
+    def expand(self, raw):
+        '''
+        展开一个原始字符串，找不到的变量保持原样
+        :param raw: 原始字符串
+        :return: 展开的字符串，反斜杠换成了正斜杠
+        '''
+        cached = self._memo.get(raw)
+        if cached is not None and all(self.value(name) == value for name, value in cached[1]):
+            return cached[0]
+        if '$' not in raw and '%' not in raw:
+            expanded, used = raw.replace('\\', '/'), ()
+        else:
+            expanded, used = self._expand(raw.replace('\\', '/'))
+        with self._lock:
+            if len(self._memo) >= MAX_MEMO_SIZE:
+                self._memo.clear()
+            self._memo[raw] = (expanded, used)
+        return expanded
+
+    def unexpand(self, value, raw):
+        '''
+        把新路径写回去时保留原始字符串开头的变量：原始字符串以变量开头，并且新路径在这个变量的值下面时，
+        把新路径开头的这一段换回变量，否则返回新路径
+        :param value: 新路径
+        :param raw: 原来的原始字符串
+        :return: 要写回去的字符串
+        '''
+        match = VARIABLE_REGEX.match(raw.replace('\\', '/'))
+        if not match:
+            return value
+        root = self.value(match.group(match.lastindex))
+        if not root:
+            return value
+        root = self.expand(root).rstrip('/')
+        compare_value, compare_root = value.replace('\\', '/'), root
+        if os.name == 'nt' or re.match(r'^[a-zA-Z]:', root):
+            compare_value, compare_root = compare_value.lower(), compare_root.lower()
+        if compare_value == compare_root or compare_value.startswith(compare_root + '/'):
+            return match.group(0) + value.replace('\\', '/')[len(root):]
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memo.clear()
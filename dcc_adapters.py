@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+DCC软件的适配器。每个DCC软件一个适配器类，负责批量收集素材路径、批量写入新路径和节点名字的显示，
+界面和匹配函数只通过适配器和DCC软件打交道，不再到处判断dcc_name。
+新的DCC软件（maya、katana、blender）只需要继承DCCAdapter，实现collect和set_value，再用register_adapter注册：
+    @register_adapter
+    class MayaAdapter(DCCAdapter):
+        name = 'maya'
+        def collect(self, nonExist=True): ...
+        def set_value(self, ref, value): ...
+MockAdapter是纯python的适配器，不需要任何DCC软件，用于基准测试和农场任务的测试。
+"""
+
+from repath_core import dcc_name
+from repath_core import hou_file_parm_dict
+from repath_core import nuke_file_parm_dict
+from utils import validate_sequences
+from dayu_path.variables import VariableResolver
+from instrument import INSTRUMENT
+
+# 注册的适配器类，按注册顺序用可执行文件名字的前缀检测
+ADAPTERS = []
+
+
+def register_adapter(cls):
+    """
+    注册一个适配器类，可以当作装饰器使用
+    :param cls: DCCAdapter的子类，name是可执行文件名字的前缀
+    :return: cls
+    """
+    if cls not in ADAPTERS:
+        ADAPTERS.append(cls)
+    return cls
+
+
+def get_adapter(executable=None):
+    """
+    根据当前的可执行文件名字返回对应的适配器
+    :param executable: 可执行文件的名字，默认是当前进程的dcc_name
+    :return: DCCAdapter，没有对应的适配器时返回None
+    """
+    executable = (executable or dcc_name).lower()
+    for cls in ADAPTERS:
+        if cls.name and executable.startswith(cls.name):
+            return cls()
+    return None
+
+
+class DCCAdapter(object):
+    """
+    适配器基类。ref是DCC里保存路径的对象，例如houdini的parm或者nuke的knob
+    """
+    name = None
+
+    def collect(self, nonExist=True):
+        """
+        批量收集工程里使用的素材路径
+        :param nonExist: 是否只收集不存在的路径
+        :return: {路径: [ref, ...]}
+        """
+        raise NotImplementedError
+
+    def set_value(self, ref, value):
+        """
+        给一个ref写入新路径
+        """
+        raise NotImplementedError
+
+    def ref_label(self, ref):
+        """
+        ref的显示名字，用于进度条
+        """
+        return ''
+
+    def ref_id(self, ref):
+        """
+        ref在工程里唯一的字符串标识，保存在替换计划（repath_plan）里
+        """
+        raise NotImplementedError
+
+    def resolve_ref(self, ref_id):
+        """
+        ref_id的逆操作，找不到时返回None
+        """
+        raise NotImplementedError
+
+    def node_name(self, ref):
+        """
+        ref所在节点的显示名字，结果列表展开时才调用
+        """
+        return ''
+
+    def select_node(self, node_name):
+        """
+        在DCC里选中（或打开参数面板）结果列表上双击的节点
+        """
+        pass
+
+    def main_window(self):
+        """
+        界面的父窗口
+        """
+        return None
+
+    def frame_range(self):
+        """
+        当前工程的帧范围，校验替换后的序列时用来找出缺少的帧
+        :return: (开始帧, 结束帧)，没有帧范围时返回None
+        """
+        return None
+
+    def begin_apply(self):
+        """
+        批量写入开始前调用，例如打开一个undo组
+        """
+        pass
+
+    def end_apply(self):
+        """
+        批量写入结束后调用
+        """
+        pass
+
+    def apply(self, new_file_knob_dict, progress=None):
+        """
+        批量写入新路径
+        :param new_file_knob_dict: {新路径: [ref, ...]}，get_new_file_knob_dict的结果
+        :param progress: 可选的回调函数，每写入一个ref调用一次
+                         progress(file_num, file_count, filename, ref_num, ref_count, ref)
+        :return: 写入的ref数量
+        """
+        file_count = len(new_file_knob_dict)
+        ref_total = 0
+        self.begin_apply()
+        try:
+            for file_num, (filename, refs) in enumerate(new_file_knob_dict.items(), 1):
+                ref_count = len(refs)
+                for ref_num, ref in enumerate(refs, 1):
+                    self.set_value(ref, filename)
+                    if progress is not None:
+                        progress(file_num, file_count, filename, ref_num, ref_count, ref)
+                ref_total += ref_count
+        finally:
+            self.end_apply()
+        INSTRUMENT.count('knobs_set', ref_total)
+        return ref_total
+
+
+@register_adapter
+class HoudiniAdapter(DCCAdapter):
+    name = 'houdini'
+
+    def __init__(self):
+        self._resolver = None
+
+    @property
+    def resolver(self):
+        # collect和set_value共用一个展开缓存
+        if self._resolver is None:
+            import hou
+            self._resolver = VariableResolver(lookup=hou.getenv)
+        return self._resolver
+
+    def collect(self, nonExist=True):
+        return hou_file_parm_dict(nonExist, self.resolver)
+
+    def set_value(self, ref, value):
+        # 原来的值是$JOB/...这样的写法时，新路径还在$JOB下面就保留变量
+        ref.set(self.resolver.unexpand(value, ref.rawValue()))
+
+    def ref_label(self, ref):
+        return ref.description()
+
+    def ref_id(self, ref):
+        return ref.path()
+
+    def resolve_ref(self, ref_id):
+        import hou
+        return hou.parm(ref_id)
+
+    def node_name(self, ref):
+        return ref.node().path()
+
+    def select_node(self, node_name):
+        import hou
+        if not node_name.startswith('/'):
+            return
+        node = hou.node(node_name)
+        if node is not None:
+            node.setSelected(True)
+
+    def main_window(self):
+        import hou
+        return hou.qt.mainWindow()
+
+    def frame_range(self):
+        import hou
+        start, end = hou.playbar.frameRange()
+        return int(start), int(end)
+
+    def begin_apply(self):
+        # 所有写入放在一个undo组里，一次ctrl+z就能撤销整个替换
+        import hou
+        self._undo_group = hou.undos.group('Repath files')
+        self._undo_group.__enter__()
+
+    def end_apply(self):
+        self._undo_group.__exit__(None, None, None)
+
+
+@register_adapter
+class NukeAdapter(DCCAdapter):
+    name = 'nuke'
+
+    def collect(self, nonExist=True):
+        return nuke_file_parm_dict(nonExist)
+
+    def set_value(self, ref, value):
+        ref.setValue(value)
+
+    def ref_label(self, ref):
+        return ref.label()
+
+    def ref_id(self, ref):
+        return ref.fullyQualifiedName()
+
+    def resolve_ref(self, ref_id):
+        import nuke
+        node_name, knob_name = ref_id.rsplit('.', 1)
+        node = nuke.toNode(node_name)
+        return node.knob(knob_name) if node is not None else None
+
+    def node_name(self, ref):
+        return ref.node().name()
+
+    def select_node(self, node_name):
+        import nuke
+        import nukescripts
+        node = nuke.toNode(node_name)
+        if node is None:
+            return
+        nukescripts.clear_selection_recursive()
+        node.showControlPanel(True)
+
+    def main_window(self):
+        from repath_gui import QApplication
+        return QApplication.activeWindow()
+
+    def frame_range(self):
+        import nuke
+        root = nuke.root()
+        return int(root.firstFrame()), int(root.lastFrame())
+
+    def begin_apply(self):
+        import nuke
+        nuke.Undo.begin('Repath files')
+
+    def end_apply(self):
+        import nuke
+        nuke.Undo.end()
+
+
+class MockNode(object):
+    def __init__(self, name):
+        self._name = name
+
+    def path(self):
+        return '/obj/' + self._name
+
+    def name(self):
+        return self._name
+
+
+class MockKnob(object):
+    """
+    模拟houdini的parm或nuke的knob，只实现替换流程里用到的方法
+    """
+    def __init__(self, node_name, value):
+        self._node = MockNode(node_name)
+        self._value = value
+
+    def node(self):
+        return self._node
+
+    def path(self):
+        return self._node.path() + '/file'
+
+    def value(self):
+        return self._value
+
+    def set(self, value):
+        self._value = value
+
+    setValue = set
+
+    def description(self):
+        return 'file'
+
+    label = description
+
+
+class MockAdapter(DCCAdapter):
+    """
+    纯python的适配器，file_knob_dict是{路径: [MockKnob, ...]}，不会被get_adapter自动检测到
+    """
+    name = None
+
+    def __init__(self, file_knob_dict=None, frame_range=None):
+        self.file_knob_dict = file_knob_dict or {}
+        self._frame_range = frame_range
+        self._refs = None
+
+    def collect(self, nonExist=True):
+        file_knob_dict = dict((filename, list(knobs)) for filename, knobs in self.file_knob_dict.items())
+        if nonExist:
+            report_dict = validate_sequences(list(file_knob_dict.keys()), check_empty=False)
+            for filename, report in report_dict.items():
+                if report.exists:
+                    del file_knob_dict[filename]
+        return file_knob_dict
+
+    def set_value(self, ref, value):
+        ref.set(value)
+
+    def frame_range(self):
+        return self._frame_range
+
+    def ref_label(self, ref):
+        return ref.description()
+
+    def node_name(self, ref):
+        return ref.node().name()
+
+    def ref_id(self, ref):
+        return ref.path()
+
+    def resolve_ref(self, ref_id):
+        if self._refs is None:
+            self._refs = dict((ref.path(), ref) for refs in self.file_knob_dict.values() for ref in refs)
+        return self._refs.get(ref_id)
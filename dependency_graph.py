@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+场景文件的依赖图。nuke的Precomp、LiveGroup，houdini里引用的.usda、.nk都指向其他的场景文件，这些文件又有自己的素材路径，
+nuke_file_parm_dict和hou_file_parm_dict只能看到当前打开的一层。这里直接读取文本格式的场景文件（.nk、.usda）和.hip，
+沿着引用一层一层地并行读取，已经读过的文件按路径和修改时间缓存；最后整个图里不存在的路径只做一次匹配：
+    graph = DependencyGraph(['d:/shots/sh010/comp.nk']).build()
+    plans = graph.resolve('//nas/library')      # {场景文件: RepathPlan}
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from dayu_path import DayuPath as DiskPath
+from repath_core import NUKE_FILE_NODE
+from repath_core import get_new_file_knob_dict
+from repath_plan import RepathPlan
+from repath_plan import plan_entries
+from repath_plan import validate_entries
+from utils import validate_sequences
+
+# 读取失败（文件不存在、格式不对）的场景文件也会放进图里，error是异常
+SceneFile = namedtuple('SceneFile', 'path mtime references error')
+
+_NUKE_NODE_START = re.compile(r'^(\w+) \{\s*$')
+_NUKE_KNOB = re.compile(r'^\s+(file|name)\s+(.*?)\s*$')
+_NUKE_GROUP_CLASSES = ('Group',)
+_USDA_ASSET = re.compile(r'@@@(.*?)@@@|@([^@\n]+)@')
+
+# {场景文件: ((修改时间, 大小), {路径: [ref_id, ...]})}，按最近使用的顺序排列，
+# 超过MAX_CACHED_SCENES个时删除最久没有使用的场景文件
+_SCENE_CACHE = OrderedDict()
+_SCENE_CACHE_LOCK = threading.Lock()
+MAX_CACHED_SCENES = 1024
+
+
+def _nuke_value(value):
+    if len(value) > 1 and value[0] == '"' and value[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    if len(value) > 1 and value[0] == '{' and value[-1] == '}':
+        return value[1:-1].strip()
+    return value
+
+
+def parse_nuke_script(filename):
+    """
+    读取.nk文件里NUKE_FILE_NODE节点的file，ref_id和NukeAdapter.ref_id一样是 'Group1.Read1.file'
+    :return: {路径: [ref_id, ...]}
+    """
+    references = {}
+    groups = []
+    node_class, knobs = None, {}
+    with open(filename) as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if node_class is None:
+                match = _NUKE_NODE_START.match(line)
+                if match:
+                    node_class, knobs = match.group(1), {}
+                elif line.strip() == 'end_group' and groups:
+                    groups.pop()
+                continue
+            if line == '}':
+                name = knobs.get('name', node_class)
+                value = knobs.get('file')
+                if node_class in NUKE_FILE_NODE and value and '[' not in value:
+                    ref_id = '.'.join(groups + [name, 'file'])
+                    references.setdefault(value.replace('\\', '/'), []).append(ref_id)
+                if node_class in _NUKE_GROUP_CLASSES:
+                    groups.append(name)
+                node_class = None
+                continue
+            match = _NUKE_KNOB.match(line)
+            if match and match.group(1) not in knobs:
+                knobs[match.group(1)] = _nuke_value(match.group(2))
+    return references
+
+
+def parse_usda(filename):
+    """
+    读取.usda文件里所有的资产路径（@path@），相对路径按这个文件所在的文件夹展开，ref_id是 'line:行号'
+    :return: {路径: [ref_id, ...]}
+    """
+    references = {}
+    directory = os.path.dirname(os.path.abspath(filename))
+    with open(filename) as f:
+        for number, line in enumerate(f, 1):
+            for match in _USDA_ASSET.finditer(line):
+                value = (match.group(1) if match.group(1) is not None else match.group(2)).replace('\\', '/')
+                if not value:
+                    continue
+                if value.startswith(('./', '../')):
+                    value = os.path.normpath(os.path.join(directory, value)).replace('\\', '/')
+                references.setdefault(value, []).append('line:{}'.format(number))
+    return references
+
+
+def parse_hip(filename):
+    """
+    读取.hip文件里的素材路径，见hip_reader.hip_references
+    """
+    from hip_reader import hip_references
+    return hip_references(filename, nonExist=False)
+
+
+SCENE_PARSERS = {
+    '.nk': parse_nuke_script,
+    '.usda': parse_usda,
+    '.hip': parse_hip,
+    '.hipnc': parse_hip,
+    '.hiplc': parse_hip,
+}
+
+SCENE_DCC = {'.nk': 'nuke', '.usda': 'usd', '.hip': 'houdini', '.hipnc': 'houdini', '.hiplc': 'houdini'}
+
+
+def is_scene_file(path):
+    return os.path.splitext(path)[1].lower() in SCENE_PARSERS
+
+
+def read_scene(path):
+    """
+    读取一个场景文件的素材路径，同一个路径在修改时间和大小不变时直接返回缓存
+    :param path: 场景文件
+    :return: SceneFile
+    """
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        return SceneFile(path, None, {}, e)
+    key = (st.st_mtime, st.st_size)
+    with _SCENE_CACHE_LOCK:
+        cached = _SCENE_CACHE.pop(path, None)
+        if cached is not None:
+            # 移到最后，表示最近使用过
+            _SCENE_CACHE[path] = cached
+    if cached is not None and cached[0] == key:
+        return SceneFile(path, st.st_mtime, cached[1], None)
+    try:
+        references = SCENE_PARSERS[os.path.splitext(path)[1].lower()](path)
+    except (IOError, OSError, ValueError) as e:
+        return SceneFile(path, st.st_mtime, {}, e)
+    with _SCENE_CACHE_LOCK:
+        _SCENE_CACHE.pop(path, None)
+        _SCENE_CACHE[path] = (key, references)
+        while len(_SCENE_CACHE) > MAX_CACHED_SCENES:
+            _SCENE_CACHE.popitem(last=False)
+    return SceneFile(path, st.st_mtime, references, None)
+
+
+def clear_scene_cache():
+    with _SCENE_CACHE_LOCK:
+        _SCENE_CACHE.clear()
+
+
+class DependencyGraph(object):
+    """
+    从一个或多个场景文件开始，沿着引用的场景文件建立依赖图：
+    scenes是 {场景文件: SceneFile}，edges是 {场景文件: [引用的场景文件, ...]}
+    """
+    def __init__(self, roots, workers=None, max_depth=None):
+        """
+        :param roots: 开始的场景文件列表
+        :param workers: 同时读取的线程数，None时按第一个场景文件所在的文件系统选择
+        :param max_depth: 最多跟随几层引用，None表示不限制
+        """
+        self.roots = [root.replace('\\', '/') for root in roots]
+        self.workers = workers
+        self.max_depth = max_depth
+        self.scenes = {}
+        self.edges = {}
+
+    def build(self):
+        """
+        一层一层地并行读取场景文件，已经在图里的文件不会重复读取
+        :return: self
+        """
+        self.scenes, self.edges = {}, {}
+        level = [root for root in self.roots if is_scene_file(root)]
+        if not level:
+            return self
+        workers = self.workers or DiskPath(level[0]).parent.io_profile.stat_workers
+        pool = ThreadPool(workers)
+        depth = 0
+        try:
+            while level:
+                next_level = []
+                for scene in pool.imap_unordered(read_scene, level):
+                    self.scenes[scene.path] = scene
+                    children = sorted(path for path in scene.references if is_scene_file(path))
+                    self.edges[scene.path] = children
+                    next_level.extend(children)
+                depth += 1
+                if self.max_depth is not None and depth > self.max_depth:
+                    break
+                level = sorted(set(path for path in next_level if path not in self.scenes))
+        finally:
+            pool.close()
+            pool.join()
+        return self
+
+    def dependencies(self, scene):
+        """
+        一个场景文件直接和间接引用的所有场景文件
+        """
+        result, stack = [], list(self.edges.get(scene, []))
+        seen = set([scene])
+        while stack:
+            path = stack.pop()
+            if path in seen:
+                continue
+            seen.add(path)
+            result.append(path)
+            stack.extend(self.edges.get(path, []))
+        return result
+
+    def references(self):
+        """
+        整个图里所有的素材路径
+        :return: {路径: [(场景文件, ref_id), ...]}
+        """
+        references = {}
+        for scene in self.scenes.values():
+            for path, ref_ids in scene.references.items():
+                references.setdefault(path, []).extend((scene.path, ref_id) for ref_id in ref_ids)
+        return references
+
+    def missing(self):
+        """
+        整个图里不存在的素材路径，所有路径一起校验一次
+        :return: {路径: [(场景文件, ref_id), ...]}
+        """
+        references = self.references()
+        report_dict = validate_sequences(list(references.keys()), check_empty=False)
+        return dict((path, refs) for path, refs in references.items() if not report_dict[path].exists)
+
+    def resolve(self, path, index=None, validate=True):
+        """
+        整个图里不存在的路径只做一次匹配，再按场景文件分成替换计划
+        :param path: 要查找的路径
+        :param index: 可选的asset_index.SequenceIndex
+        :param validate: 是否校验新路径，所有计划一起校验一次
+        :return: {场景文件: RepathPlan}，没有不存在路径的场景文件不在结果里
+        """
+        missing = self.missing()
+        matches = {}
+        get_new_file_knob_dict(path, missing, index=index, matches=matches)
+        scene_references = {}
+        for filename, refs in missing.items():
+            for scene, ref_id in refs:
+                scene_references.setdefault(scene, {}).setdefault(filename, []).append(ref_id)
+        plans = {}
+        for scene, references in scene_references.items():
+            dcc = SCENE_DCC.get(os.path.splitext(scene)[1].lower())
+            plans[scene] = RepathPlan(path, plan_entries(references, matches), dcc)
+        if validate and plans:
+            entries = [entry for plan in plans.values() for entry in plan.entries]
+            validate_entries(entries, validate_sequences([entry['new'] or entry['old'] for entry in entries]))
+        return plans
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='follow referenced scene files and plan repaths for all of them')
+    parser.add_argument('scenes', nargs='+')
+    parser.add_argument('--path', required=True, help='folder to search for the new files')
+    parser.add_argument('--output-dir', help='write one plan per scene file, <scene name>.plan.json')
+    parser.add_argument('--max-depth', type=int)
+    options = parser.parse_args(argv)
+    graph = DependencyGraph(options.scenes, max_depth=options.max_depth).build()
+    plans = graph.resolve(options.path)
+    for scene in sorted(graph.scenes):
+        error = graph.scenes[scene].error
+        plan = plans.get(scene)
+        print('{}: {}'.format(scene, error if error else '{} missing, {} matched'.format(
+            len(plan) if plan else 0, len(plan.matched()) if plan else 0)))
+        if plan and options.output_dir:
+            if not os.path.isdir(options.output_dir):
+                os.makedirs(options.output_dir)
+            plan.save(os.path.join(options.output_dir, os.path.basename(scene) + '.plan.json'))
+    return graph, plans
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+不启动houdini直接读取.hip文件里的素材路径。.hip是一个cpio归档，每个节点的parm保存在'<节点路径>.parm'文本条目里，
+这里流式读取归档，只解码.parm和.variables条目，其他条目直接跳过，不会把整个文件读进内存。
+读出的结果和hou_file_parm_dict一样是 {路径: [parm路径]}，可以直接交给repath_plan.build_plan生成替换计划，
+所以可以在没有houdini授权的农场机器上并行检查大量的hip文件：
+    python hip_reader.py --path //nas/library --output-dir d:/plans shots/*/*.hip
+"""
+
+import os
+import re
+import struct
+
+from dayu_path.variables import VariableResolver
+from dayu_path.variables import is_file_value
+from repath_plan import build_plan
+from utils import validate_sequences
+
+# cpio的两种头：odc（070707，八进制，houdini使用的格式）和newc（070701/070702，十六进制，4字节对齐）
+CPIO_ODC = b'070707'
+CPIO_NEWC = (b'070701', b'070702')
+CPIO_TRAILER = 'TRAILER!!!'
+_ODC_HEADER = struct.Struct('6s6s6s6s6s6s6s6s11s6s11s')
+_NEWC_HEADER = struct.Struct('6s8s8s8s8s8s8s8s8s8s8s8s8s8s')
+_SKIP_CHUNK = 1024 * 1024
+
+# .parm条目里的一行：file	[ 0	locks=0 ]	(	"d:/a/b.$F4.exr"	)
+_PARM_LINE = re.compile(r'^\s*(\w+)\s*\[[^\]]*\]\s*\(\s*(.*?)\s*\)\s*$')
+_PARM_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_PARM_ESCAPE = re.compile(r'\\(.)')
+# .variables条目里保存的全局变量：set -g JOB = '/mnt/proj'
+_VARIABLE_LINE = re.compile(r"^\s*set\s+(?:-g\s+)?(\w+)\s*=\s*'?(.*?)'?\s*$")
+
+
+class HipFormatError(ValueError):
+    pass
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise HipFormatError('unexpected end of cpio archive')
+    return data
+
+
+def _skip(stream, size):
+    try:
+        stream.seek(size, os.SEEK_CUR)
+        return
+    except (AttributeError, IOError, OSError):
+        pass
+    while size > 0:
+        chunk = stream.read(min(size, _SKIP_CHUNK))
+        if not chunk:
+            raise HipFormatError('unexpected end of cpio archive')
+        size -= len(chunk)
+
+
+def iter_cpio(stream, wanted=None):
+    """
+    流式读取cpio归档
+    :param stream: 二进制文件对象
+    :param wanted: 可选的函数，参数是条目名字，返回False的条目不读取内容
+    :return: (条目名字, 内容bytes)的生成器，跳过的条目不会返回
+    """
+    while True:
+        magic = stream.read(6)
+        if not magic:
+            return
+        if magic == CPIO_ODC:
+            fields = _ODC_HEADER.unpack(magic + _read_exact(stream, _ODC_HEADER.size - 6))
+            name_size, file_size, align = int(fields[9], 8), int(fields[10], 8), 1
+            header_size = _ODC_HEADER.size
+        elif magic in CPIO_NEWC:
+            fields = _NEWC_HEADER.unpack(magic + _read_exact(stream, _NEWC_HEADER.size - 6))
+            name_size, file_size, align = int(fields[12], 16), int(fields[7], 16), 4
+            header_size = _NEWC_HEADER.size
+        else:
+            raise HipFormatError('not a cpio archive (magic {!r})'.format(magic))
+        name = _read_exact(stream, name_size).rstrip(b'\0').decode('utf-8', 'replace')
+        _skip(stream, -(header_size + name_size) % align)
+        if name == CPIO_TRAILER:
+            return
+        if wanted is None or wanted(name):
+            yield name, _read_exact(stream, file_size)
+        else:
+            _skip(stream, file_size)
+        _skip(stream, -file_size % align)
+
+
+def parse_parm_file(text):
+    """
+    解析.parm条目，只返回只有一个字符串值的parm
+    :param text: 条目内容
+    :return: [(parm名字, 值), ...]
+    """
+    parms = []
+    for line in text.splitlines():
+        match = _PARM_LINE.match(line)
+        if not match:
+            continue
+        strings = _PARM_STRING.findall(match.group(2))
+        if len(strings) != 1 or _PARM_STRING.sub('', match.group(2)).strip():
+            continue
+        parms.append((match.group(1), _PARM_ESCAPE.sub(r'\1', strings[0])))
+    return parms
+
+
+def parse_variables(text):
+    """
+    解析.variables条目
+    :return: {变量名: 值}
+    """
+    variables = {}
+    for line in text.splitlines():
+        match = _VARIABLE_LINE.match(line)
+        if match:
+            variables[match.group(1)] = match.group(2)
+    return variables
+
+
+def hip_variables(filename):
+    """
+    离线读取时可以确定的变量：HIP、HIPFILE、HIPNAME由.hip文件的位置决定
+    """
+    path = os.path.abspath(filename).replace('\\', '/')
+    return {'HIP': os.path.dirname(path), 'HIPFILE': path, 'HIPNAME': os.path.splitext(os.path.basename(path))[0]}
+
+
+def hip_references(filename, nonExist=True, file_filter=is_file_value, resolver=None):
+    """
+    读取一个.hip文件里的素材路径，例如：
+    {'d:/a/b/c.$F4.exr': ['/mat/principledshader1/basecolor_texture']}
+    parm值里的变量按这个顺序查找：HIP、HIPFILE、HIPNAME，.variables条目里保存的变量（例如JOB），环境变量
+    :param filename: .hip、.hipnc或者.hiplc文件
+    :param nonExist: 是否只收集不存在的路径，和hou_file_parm_dict一样
+    :param file_filter: 参数是展开以后的parm值，返回True的才收集
+    :param resolver: 可选的VariableResolver，给出时不读取.variables条目
+    :return: {展开以后的路径: [parm路径, ...]}
+    """
+    raw_values = []
+    variables = {}
+    with open(filename, 'rb') as stream:
+        for name, data in iter_cpio(stream, lambda entry: entry.endswith(('.parm', '.variables'))):
+            if name.endswith('.variables'):
+                variables.update(parse_variables(data.decode('utf-8', 'replace')))
+                continue
+            node_path = '/' + name[:-len('.parm')].lstrip('/')
+            for parm_name, value in parse_parm_file(data.decode('utf-8', 'replace')):
+                if value:
+                    raw_values.append((value, '/'.join((node_path, parm_name))))
+    if resolver is None:
+        variables.update(hip_variables(filename))
+        resolver = VariableResolver(variables)
+    references = {}
+    for value, parm_path in raw_values:
+        value = resolver.expand(value)
+        if file_filter(value):
+            references.setdefault(value, []).append(parm_path)
+    if nonExist and references:
+        for path, report in validate_sequences(list(references.keys()), check_empty=False).items():
+            if report.exists:
+                del references[path]
+    return references
+
+
+def _read_task(args):
+    filename, nonExist = args
+    try:
+        return filename, hip_references(filename, nonExist)
+    except (IOError, OSError, HipFormatError) as e:
+        return filename, e
+
+
+def audit_hip_files(hip_files, path, index=None, processes=None, nonExist=True, validate=True):
+    """
+    并行读取很多.hip文件，每个文件生成一个替换计划。读取和解析在进程池里进行，
+    所有文件共用一个素材库索引，素材库只扫描一次
+    :param hip_files: .hip文件列表
+    :param path: 要查找的路径
+    :param index: 可选的asset_index.SequenceIndex，没有给出时扫描path建立一个
+    :param processes: 读取.hip文件的进程数，None时使用cpu数量，1表示在当前进程里读取
+    :param nonExist: 是否只处理不存在的路径
+    :param validate: 是否校验计划里的新路径
+    :return: (.hip文件, RepathPlan或者读取时的异常)的生成器
+    """
+    if index is None:
+        from asset_index import SequenceIndex
+        index = SequenceIndex(path).build()
+    tasks = [(filename, nonExist) for filename in hip_files]
+    if processes == 1 or len(tasks) < 2:
+        results = (_read_task(task) for task in tasks)
+        pool = None
+    else:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        results = pool.imap_unordered(_read_task, tasks)
+    try:
+        for filename, references in results:
+            if isinstance(references, Exception):
+                yield filename, references
+                continue
+            yield filename, build_plan(path, references, index=index, validate=validate, dcc='houdini')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='read file references from .hip files without houdini')
+    parser.add_argument('hip_files', nargs='+')
+    parser.add_argument('--path', required=True, help='folder to search for the new files')
+    parser.add_argument('--output-dir', help='write one plan per hip file, <hip name>.plan.json')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--all', action='store_true', help='also plan references that already exist')
+    parser.add_argument('--no-validate', action='store_true')
+    options = parser.parse_args(argv)
+    if options.output_dir and not os.path.isdir(options.output_dir):
+        os.makedirs(options.output_dir)
+    failed = []
+    for filename, plan in audit_hip_files(options.hip_files, options.path, processes=options.processes,
+                                          nonExist=not options.all, validate=not options.no_validate):
+        if isinstance(plan, Exception):
+            failed.append(filename)
+            print('{}: {}'.format(filename, plan))
+            continue
+        print('{}: {} references, {} matched, {} unmatched'.format(
+            filename, len(plan), len(plan.matched()), len(plan.unmatched())))
+        if options.output_dir:
+            plan.save(os.path.join(options.output_dir, os.path.basename(filename) + '.plan.json'))
+    return failed
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+本机的素材库索引服务。服务进程常驻并持有asset_index里的序列索引，所有houdini和nuke进程通过localhost的HTTP接口批量查询，
+查询结果和get_new_file_knob_dict一样，这样一天里每台机器只扫描一次素材库。
+启动服务：
+    python index_server.py --port 8765 --root //nas/library
+服务只为启动时用--root指定的根目录建立索引，客户端发来的其他路径会返回错误，不会在服务里建立新的索引和监听线程。
+DCC里ReassignFilePath勾选Keep live index时会自动检测服务（也可以用环境变量REPATH_INDEX_SERVER指定地址），
+服务不可用或者路径不在服务的根目录下时在本进程里扫描。
+接口：
+    GET  /status    已经建立索引的根目录和序列数量
+    POST /index     {"root": "//nas/library"}，返回这个根目录的索引信息
+    POST /resolve   {"path": "//nas/library/show", "filenames": ["d:/a/b.%04d.exr", ...], "version_mode": "latest"}
+                    version_mode可以不给，见repath_core.VERSION_MODES，
+                    返回 {"new": {"新路径": ["旧路径", ...]}, "missing": ["旧路径", ...]}
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.request import Request
+    from urllib.request import urlopen
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib2 import Request
+    from urllib2 import urlopen
+
+DEFAULT_ADDRESS = 'http://127.0.0.1:8765'
+
+
+def resolve_filenames(path, filenames, index, version_mode=None):
+    """
+    用服务里的索引为一批不存在的路径查找新路径，语义和get_new_file_knob_dict一样
+    :param path: 要查找的路径
+    :param filenames: 旧路径列表
+    :param index: 包含path的asset_index.SequenceIndex
+    :param version_mode: 文件名带版本号时的匹配方式，见get_new_file_knob_dict
+    :return: ({新路径: [旧路径, ...]}, [没有找到的旧路径])
+    """
+    from repath_core import VERSION_MODES
+    from repath_core import get_new_file_knob_dict
+    if version_mode is not None and version_mode not in VERSION_MODES:
+        raise ValueError('unknown version mode: {}'.format(version_mode))
+    new_file_dict, missing_dict = get_new_file_knob_dict(path, dict((f, [f]) for f in filenames), index=index,
+                                                         version_mode=version_mode)
+    return new_file_dict, list(missing_dict.keys())
+
+
+class IndexRequestHandler(BaseHTTPRequestHandler):
+    def _send_json(self, data, code=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length).decode('utf-8')) if length else {}
+
+    def do_GET(self):
+        if self.path != '/status':
+            return self._send_json({'error': 'unknown path {}'.format(self.path)}, 404)
+        roots = dict((root, len(index.sequences)) for root, (index, _) in self.server.indexes.items())
+        self._send_json({'roots': roots, 'pid': os.getpid()})
+
+    def do_POST(self):
+        try:
+            data = self._read_json()
+            if self.path not in ('/index', '/resolve'):
+                return self._send_json({'error': 'unknown path {}'.format(self.path)}, 404)
+            path = data['root'] if self.path == '/index' else data['path']
+            index = self.server.find_index(path)
+            if index is None:
+                return self._send_json({'error': 'not under an indexed root: {}'.format(path)}, 403)
+            if self.path == '/index':
+                return self._send_json({'root': index.root, 'sequences': len(index.sequences)})
+            new_file_dict, missing = resolve_filenames(path, data['filenames'], index, data.get('version_mode'))
+            self._send_json({'new': new_file_dict, 'missing': missing})
+        except Exception as e:
+            self._send_json({'error': '{}: {}'.format(type(e).__name__, e)}, 500)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class IndexServer(ThreadingMixIn, HTTPServer):
+    """
+    只为启动时指定的根目录提供查询。先绑定端口再建立索引，端口被占用时不会留下监听线程；
+    索引在serve_forever开始处理请求之前建立
+    """
+    daemon_threads = True
+
+    def __init__(self, address, handler_class, roots=(), watch=True):
+        from asset_index import start_index
+        # {根目录: (SequenceIndex, IndexWatcher)}
+        self.indexes = OrderedDict()
+        HTTPServer.__init__(self, address, handler_class)
+        try:
+            for root in roots:
+                index, watcher = start_index(root, watch)
+                self.indexes[index.root] = (index, watcher)
+        except BaseException:
+            # 某个根目录建立索引失败时，关闭端口并停止已经启动的监听线程
+            self.server_close()
+            raise
+
+    def find_index(self, path):
+        """
+        包含path的索引，path不在任何根目录下时返回None
+        """
+        for index, _ in self.indexes.values():
+            if index.covers(path):
+                return index
+        return None
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        for _, watcher in self.indexes.values():
+            if watcher is not None:
+                watcher.stop()
+
+
+class IndexClient(object):
+    """
+    DCC进程里使用的客户端
+    """
+    def __init__(self, address=None, timeout=30):
+        self.address = (address or os.environ.get('REPATH_INDEX_SERVER') or DEFAULT_ADDRESS).rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, url, data=None, timeout=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        request = Request(self.address + url, data=body, headers={'Content-Type': 'application/json'})
+        response = urlopen(request, timeout=timeout or self.timeout)
+        return json.loads(response.read().decode('utf-8'))
+
+    def available(self, timeout=0.2):
+        """
+        检查服务是否在运行
+        :return: bool
+        """
+        try:
+            return 'roots' in self._request('/status', timeout=timeout)
+        except Exception:
+            return False
+
+    def status(self):
+        return self._request('/status')
+
+    def build_index(self, root):
+        return self._request('/index', {'root': root})
+
+    def get_new_file_knob_dict(self, path, dcc_file_knob_dict, version_mode=None):
+        """
+        和repath_core.get_new_file_knob_dict一样的接口，查找在服务里完成
+        :param path: 要查找的路径
+        :param dcc_file_knob_dict: houdini或nuke工程内使用的素材路径和使用者parm（knob）的字典
+        :param version_mode: 文件名带版本号时的匹配方式，见repath_core.get_new_file_knob_dict
+        :return: 新路径和parm（knob）的字典，以及没有从path匹配到新路径的按钮字典
+        """
+        result = self._request('/resolve', {'path': path, 'filenames': list(dcc_file_knob_dict.keys()),
+                                            'version_mode': version_mode})
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        new_file_knob_dict = dict((new_filename, [knob for old_filename in old_filenames
+                                                  for knob in dcc_file_knob_dict[old_filename]])
+                                  for new_filename, old_filenames in result['new'].items())
+        missing_dict = dict((filename, dcc_file_knob_dict[filename]) for filename in result['missing'])
+        return new_file_knob_dict, missing_dict
+
+
+def find_server(address=None):
+    """
+    返回可用的索引服务客户端，没有运行的服务时返回None
+    :param address: 服务地址，默认是REPATH_INDEX_SERVER环境变量或者DEFAULT_ADDRESS
+    :return: IndexClient或None
+    """
+    client = IndexClient(address)
+    return client if client.available() else None
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='local sequence index server for repath')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--root', action='append', required=True, help='library root to index and serve')
+    options = parser.parse_args(argv)
+    server = IndexServer((options.host, options.port), IndexRequestHandler, options.root)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+替换流程的性能统计：各个阶段的耗时、计数器（列出的文件夹、扫描到的文件、stat次数、正则解析次数、设置的knob数量），
+可以输出成JSON报告，也可以同时保存一份cProfile的结果。没有开启时所有调用都是直接返回，几乎没有额外开销。
+通过环境变量开启：
+    REPATH_INSTRUMENT=1                     替换完成后把报告打印出来
+    REPATH_INSTRUMENT=d:/report.json        替换完成后把报告保存成JSON文件
+    REPATH_PROFILE=d:/repath.prof           同时保存cProfile的结果，可以用pstats或snakeviz查看
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+from dayu_path.mounts import set_io_counter
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class _NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase(object):
+    def __init__(self, instrument, name):
+        self.instrument = instrument
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.instrument.add_time(self.name, timer() - self.start)
+        return False
+
+
+class Instrument(object):
+    """
+    阶段耗时和计数器的收集器，模块里的INSTRUMENT是替换流程共用的实例
+    """
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.phases = {}
+        self.profile_path = None
+        self._profiler = None
+        self._start = 0
+        self._lock = threading.Lock()
+
+    def start(self, profile_path=None):
+        """
+        清空之前的数据并开始统计
+        :param profile_path: 如果给出路径，会同时开启cProfile，stop的时候保存到这个路径
+        :return:
+        """
+        self.counters = {}
+        self.phases = {}
+        self.profile_path = profile_path
+        self._start = timer()
+        self.enabled = True
+        # dayu_path在真正读取文件夹和stat的地方计数
+        set_io_counter(self.count)
+        if profile_path:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        """
+        停止统计，返回报告字典
+        :return: report()的结果
+        """
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+            self._profiler = None
+        report = self.report()
+        self.enabled = False
+        set_io_counter(None)
+        return report
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            phase = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            phase['seconds'] += seconds
+            phase['calls'] += 1
+
+    def phase(self, name):
+        """
+        统计一个阶段的耗时，用法：
+        with INSTRUMENT.phase('scan'):
+            ...
+        :param name: 阶段名字
+        :return: context manager
+        """
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def timed(self, name):
+        """
+        统计整个函数耗时的装饰器，没有开启时只多一次属性判断
+        :param name: 阶段名字
+        :return: 装饰器
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Phase(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def report(self):
+        return {
+            'total_seconds': timer() - self._start if self.enabled else 0.0,
+            'phases': dict((name, dict(value)) for name, value in self.phases.items()),
+            'counters': dict(self.counters),
+            'profile': self.profile_path,
+        }
+
+
+INSTRUMENT = Instrument()
+
+
+def start_from_env():
+    """
+    根据环境变量REPATH_INSTRUMENT和REPATH_PROFILE决定是否开启统计
+    :return: 是否开启
+    """
+    if os.environ.get('REPATH_INSTRUMENT') or os.environ.get('REPATH_PROFILE'):
+        INSTRUMENT.start(os.environ.get('REPATH_PROFILE') or None)
+        return True
+    return False
+
+
+def stop_and_emit():
+    """
+    停止统计，并按照REPATH_INSTRUMENT的设置打印或保存报告
+    :return: 报告字典，没有开启统计时返回None
+    """
+    if not INSTRUMENT.enabled:
+        return None
+    report = INSTRUMENT.stop()
+    output = os.environ.get('REPATH_INSTRUMENT', '')
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output and output not in ('1', 'true', 'True'):
+        with open(output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return report
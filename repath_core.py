@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+替换素材路径的核心功能：收集DCC工程里的素材路径、扫描新文件夹、匹配新路径。
+这个模块不依赖Qt，可以在没有界面的农场任务里直接使用。
+"""
+
+import os
+import sys
+from utils import name_format
+from utils import norm_key
+from utils import is_udim_pattern
+from utils import is_udim_tiles
+from utils import recursive_file
+from utils import validate_sequences
+from utils import replace_version
+from utils import split_version
+from instrument import INSTRUMENT
+from scan_store import ScanStore
+from dayu_path import DayuPath as DiskPath
+from dayu_path.variables import VariableResolver
+from dayu_path.variables import is_file_value
+
+# 这些是nuke里会用到导入素材的节点类型列表
+NUKE_FILE_NODE = ['OCIOCDLTransform', 'ReadGeo2', 'ParticleCache', 'Read', 'DeepRead', 'ReadGeo', 'Precomp',
+                  'LiveGroup', 'AudioRead', 'Light2', 'OCIOFileTransform', 'Axis2', 'LiveInput', 'Camera2',
+                  'ScannedGrain', 'Vectorfield']
+Maya_FILE_NODE = []
+dcc_name = os.path.basename(sys.executable).lower()
+# get_new_file_knob_dict记录的匹配原因，多个同名候选时后面会加上':parent'（按父级文件夹选出），
+# 按版本匹配（VERSION_LATEST、VERSION_FALLBACK）到了另一个版本时最后再加上':latest'
+MATCH_REASONS = {
+    'inside': u'旧路径已经在查找的路径里，不需要替换',
+    'name': u'文件名完全相同',
+    'frame': u'单帧路径的帧号在候选序列里',
+    'padding': u'序列的位数相同',
+    'unpadded': u'旧路径是%d或$F，候选序列有位数',
+}
+# 文件名带版本号时的匹配方式，见get_new_file_knob_dict
+VERSION_EXACT = 'exact'
+VERSION_LATEST = 'latest'
+VERSION_FALLBACK = 'fallback'
+VERSION_MODES = (VERSION_EXACT, VERSION_LATEST, VERSION_FALLBACK)
+
+
+@INSTRUMENT.timed('collect')
+def hou_file_parm_dict(nonExist=True, resolver=None):
+    """
+    得到houdini工程内使用的素材资产路径和使用者parm的字典，例如：
+    {'d:/a/b/c.$F4.exr': [<hou.Parm basecolor_texture in /mat/principledshader1>]，
+     '/mnt/job/tex/d.$F4.exr': [parm对象1， parm对象2]，
+    }
+    parm的原始值里的$HIP、$JOB等变量会先展开（帧号变量保持原样），展开以后是盘符、UNC或者POSIX绝对路径并且有文件后缀的才收集。
+    :param nonExist: 是否只收集不存在路径的对应字典，大部分时候是只对不存在的错误路径做查找替换，所以默认是True。
+    :param resolver: 可选的dayu_path.variables.VariableResolver，默认用hou.getenv查找变量，同一个原始值只展开一次
+    :return: 路径（展开以后的）和parm对象列表的对应字典
+    """
+    import hou
+    file_parm_dict = {}
+    root_node = hou.node('/')
+    resolver = resolver or VariableResolver(lookup=hou.getenv)
+    all_parms = root_node.allParms()
+    INSTRUMENT.count('parms_seen', len(all_parms))
+    for parm in all_parms:
+        parm_temp_late = parm.parmTemplate()
+        if parm_temp_late.type().name() != 'String':
+            continue
+        if parm_temp_late.stringType().name() == 'FileReference':
+            raw_value = parm.rawValue()
+            if not raw_value:
+                continue
+            old_filename = resolver.expand(raw_value)
+            if is_file_value(old_filename):
+                parm_list = file_parm_dict.setdefault(old_filename, [])
+                parm_list.append(parm)
+                parm.lock(False)
+    if nonExist:
+        # 所有路径一起批量检查是否存在，同一个文件夹只读取一次
+        report_dict = validate_sequences(list(file_parm_dict.keys()), check_empty=False)
+        for filename, report in report_dict.items():
+            if report.exists:
+                del file_parm_dict[filename]
+    INSTRUMENT.count('file_references', len(file_parm_dict))
+    return file_parm_dict
+
+
+@INSTRUMENT.timed('collect')
+def nuke_file_parm_dict(nonExist=True):
+    """
+    得到nuke工程内使用的素材路径和使用者knob的字典，例如：
+    {'d:/a/b/c.%04d.exr': [<File_Knob object at 0x000001F52AF5EA38>]，
+     'd:/a/b/d.%04d.exr': [knob对象1， knob对象2]，
+    }
+    :param nonExist: 是否只收集不存在路径的对应字典，大部分时候是只对不存在的错误路径做查找替换，所以默认是True。
+    :return: 路径和knob对象列表的对应字典
+    """
+    import nuke
+    file_parm_dict = {}
+    nodes = nuke.allNodes(recurseGroups=True)
+    INSTRUMENT.count('nodes_seen', len(nodes))
+    # 只查找报错不存在的路径
+    if nonExist:
+        nuke_file_node = [node for node in nodes if node.error() and node.Class() in NUKE_FILE_NODE]
+    else:
+        nuke_file_node = [node for node in nodes if node.Class() in NUKE_FILE_NODE]
+    for node in nuke_file_node:
+        if node.Class() == 'ScannedGrain':
+            knob = node.knob('fullGrain')
+            filename = os.path.dirname(knob.evaluate()) + '/' + os.path.basename(knob.value())
+            knob_list = file_parm_dict.setdefault(filename, [])
+            knob_list.append(knob)
+        elif node.Class() == 'Vectorfield':
+            knob = node.knob('vfield_file')
+            filename = os.path.dirname(knob.evaluate()) + '/' + os.path.basename(knob.value())
+            knob_list = file_parm_dict.setdefault(filename, [])
+            knob_list.append(knob)
+        else:
+            knob = node.knob('file')
+            filename = nuke.filename(node)
+            if filename:
+                knob_list = file_parm_dict.setdefault(filename, [])
+                knob_list.append(knob)
+    INSTRUMENT.count('file_references', len(file_parm_dict))
+    return file_parm_dict
+
+
+@INSTRUMENT.timed('scan')
+def get_path_all_file(path, exts):
+    """
+    从给与的path路径里，循环查找列出指定的类型的文件，按name_format得到的名字分组保存到一个ScanStore里，
+    get(name)返回这个名字下所有序列的属性字典列表。例如：
+    store.get('c.') ——>
+    [{'ext': 'exr', 'filename': 'd:/a/b/c.%04d.exr', 'pattern': '%04d', 'pattern_num': 4, 'frames': [1001,1002,1003],},
+     {'ext': 'jpg', 'filename': 'd:/a/b/c.%03d.jpg', 'pattern': '%03d', 'pattern_num': 3, 'frames': [1,2,3,4,5],}
+    ]
+    文件夹路径只保存一次，帧列表压缩成帧段，属性字典只在查询时生成，几百万个文件的素材库也不会占用太多内存。
+    :param path: 要查找的路径
+    :param exts: 指定类型列表
+    :return: scan_store.ScanStore
+    """
+    store = ScanStore()
+    # 后缀在scan里直接和文件名比较，不需要为每个文件生成DayuPath再调用过滤函数
+    ext_filters = set(ext for ext in exts if ext)
+    if not ext_filters:
+        return store
+    file_list = DiskPath(path).scan(recursive=True, ext_filters=ext_filters)
+    for file_name in file_list:
+        store.add(file_name, name_format(file_name), file_name.frames)
+    if INSTRUMENT.enabled:
+        INSTRUMENT.count('sequences_seen', len(store))
+        INSTRUMENT.count('files_seen', sum(store.frame_count(row) or 1 for row in range(len(store))))
+    return store
+
+
+def _name_key(check_filename, name_key_cache=None):
+    """
+    候选路径文件名的norm_key。同名的候选会和很多旧路径反复比较，按候选路径缓存以后不需要每次都拆分文件名
+    :param name_key_cache: 可选的字典，只在一次get_new_file_knob_dict里使用
+    """
+    if name_key_cache is None:
+        return norm_key(check_filename.name)
+    key = name_key_cache.get(check_filename)
+    if key is None:
+        key = name_key_cache[check_filename] = norm_key(check_filename.name)
+    return key
+
+
+def _match_reason(old_name_key, check_filename, attr_dict, ext, pattern, pattern_num, udim, name_key_cache=None):
+    """
+    判断一个候选序列能不能匹配旧路径
+    :param name_key_cache: 见_name_key
+    :return: 匹配原因（MATCH_REASONS里的一个），不能匹配时返回None
+    """
+    if old_name_key == _name_key(check_filename, name_key_cache):
+        return 'name'
+    if ext != attr_dict.get('ext'):
+        return None
+    # UDIM路径（由<UDIM>标记判断）不能匹配编号不在1001到1999之间的序列
+    if not pattern or (udim and not is_udim_tiles(attr_dict.get('frames'))):
+        return None
+    if pattern.isdigit() and int(pattern) in attr_dict.get('frames'):
+        return 'frame'
+    if pattern_num == attr_dict.get('pattern_num'):
+        return 'padding'
+    if pattern in ['%d', '$F'] and attr_dict.get('pattern_num'):
+        return 'unpadded'
+    return None
+
+
+def _version_candidates(all_file_dict, name, basename, version_mode):
+    """
+    按版本匹配时要尝试的候选名字
+    :return: (候选的name, 新的文件名, 匹配原因的后缀)的生成器
+    """
+    if version_mode == VERSION_FALLBACK:
+        yield name, basename, ''
+    versions = all_file_dict.versions(name) if hasattr(all_file_dict, 'versions') else []
+    for _, other in reversed(versions):
+        if other == name:
+            if version_mode == VERSION_LATEST:
+                yield name, basename, ''
+            continue
+        yield other, replace_version(basename, split_version(other)[2]), ':latest'
+    if version_mode == VERSION_LATEST and not versions:
+        yield name, basename, ''
+
+
+def _match_candidates(old_filename, basename, nf, attr_dict_list, suffix_key_cache, name_key_cache=None):
+    """
+    在同名的候选序列里选出新路径
+    :param old_filename: 旧路径
+    :param basename: 新路径的文件名，按版本匹配时版本号已经换成了候选的版本
+    :param nf: name_format(旧路径)
+    :param attr_dict_list: 候选序列的属性字典列表
+    :return: (新路径, 匹配原因)，没有匹配到时返回None
+    """
+    pattern, ext, pattern_num = nf.pattern, nf.ext, nf.pattern_num
+    udim = is_udim_pattern(pattern)
+    old_name_key = norm_key(basename)
+    if len(attr_dict_list) == 1:
+        attr_dict = attr_dict_list[0]
+        check_filename = DiskPath(attr_dict.get('filename'))
+        reason = _match_reason(old_name_key, check_filename, attr_dict, ext, pattern, pattern_num, udim,
+                               name_key_cache)
+        if not reason:
+            return None
+    else:
+        check_filenames = []
+        check_reasons = {}
+        for attr_dict in attr_dict_list:
+            check_filename = DiskPath(attr_dict.get('filename'))
+            reason = _match_reason(old_name_key, check_filename, attr_dict, ext, pattern, pattern_num, udim,
+                                   name_key_cache)
+            if reason:
+                check_filenames.append(check_filename)
+                check_reasons.setdefault(check_filename, reason)
+        if not check_filenames:
+            return None
+        # slice_是默认的-2时recursive_file总会选出一个文件，没有相同的父级文件夹时选第一个
+        filterfile_name = recursive_file(norm_key(old_filename), check_filenames, key_cache=suffix_key_cache)
+        check_filename = DiskPath(filterfile_name)
+        reason = check_reasons.get(filterfile_name, 'name') + ':parent'
+    return check_filename.parent.child(basename).__str__(), reason
+
+
+def _match_filename(filename, all_file_dict, path_key, suffix_key_cache, version_mode=None, name_key_cache=None):
+    """
+    为一个旧路径查找新路径
+    :param filename: 旧路径
+    :param all_file_dict: get_path_all_file的结果或者索引视图
+    :param path_key: norm_key(要查找的路径)
+    :param suffix_key_cache: 重名文件比较父级文件夹时用的缓存
+    :param version_mode: 见get_new_file_knob_dict
+    :param name_key_cache: 候选文件名norm_key的缓存，见_match_reason
+    :return: (新路径, 匹配原因)，没有匹配到时返回None
+    """
+    if path_key in norm_key(filename):
+        return filename, 'inside'
+    nf = name_format(filename)
+    if not nf:
+        # 文件夹之类解析不出文件名的值不能匹配，不影响其他路径
+        return None
+    old_filename = DiskPath(filename)
+    if version_mode in (VERSION_LATEST, VERSION_FALLBACK) and split_version(nf.name) is not None:
+        for name, basename, suffix in _version_candidates(all_file_dict, nf.name, old_filename.name, version_mode):
+            attr_dict_list = all_file_dict.get(name)
+            if not attr_dict_list:
+                continue
+            result = _match_candidates(old_filename, basename, nf, attr_dict_list, suffix_key_cache, name_key_cache)
+            if result is not None:
+                return result[0], result[1] + suffix
+        return None
+    attr_dict_list = all_file_dict.get(nf.name)
+    if not attr_dict_list:
+        return None
+    return _match_candidates(old_filename, old_filename.name, nf, attr_dict_list, suffix_key_cache, name_key_cache)
+
+
+# 多进程匹配时fork出来的子进程直接继承的只读状态：(all_file_dict, path_key, version_mode)
+_POOL_STATE = None
+
+
+def _match_chunk(filenames):
+    all_file_dict, path_key, version_mode = _POOL_STATE
+    suffix_key_cache, name_key_cache = {}, {}
+    # 子进程里的计数器是fork时复制的，只把这一块增加的计数带回父进程
+    before = dict(INSTRUMENT.counters) if INSTRUMENT.enabled else None
+    results = [_match_filename(filename, all_file_dict, path_key, suffix_key_cache, version_mode, name_key_cache)
+               for filename in filenames]
+    counters = {}
+    if before is not None:
+        counters = dict((name, value - before.get(name, 0)) for name, value in INSTRUMENT.counters.items()
+                        if value != before.get(name, 0))
+    return results, counters
+
+
+def _match_in_pool(filenames, all_file_dict, path_key, processes, lock=None, version_mode=None):
+    """
+    用fork出来的进程池并行匹配，候选序列不需要序列化，子进程直接继承父进程的内存
+    :return: 和filenames一一对应的匹配结果列表
+    """
+    import multiprocessing
+    global _POOL_STATE
+    context = multiprocessing.get_context('fork')
+    chunk_size = max(1, len(filenames) // (processes * 4) + 1)
+    chunks = [filenames[i:i + chunk_size] for i in range(0, len(filenames), chunk_size)]
+    _POOL_STATE = (all_file_dict, path_key, version_mode)
+    try:
+        # fork的时候拿着索引的锁，保证子进程继承的是完整的索引，不会继承一个被监听线程拿着的锁
+        if lock is not None:
+            with lock:
+                pool = context.Pool(processes)
+        else:
+            pool = context.Pool(processes)
+        try:
+            results = []
+            for chunk_results, counters in pool.imap(_match_chunk, chunks):
+                results.extend(chunk_results)
+                for name, value in counters.items():
+                    INSTRUMENT.count(name, value)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        _POOL_STATE = None
+    return results
+
+
+def can_fork():
+    """
+    是否可以使用多进程匹配，只支持fork（linux和mac），windows上DCC的可执行文件不能用来spawn子进程。
+    DCC软件（包括hython）是多线程的，在里面fork出来的子进程可能继承别的线程拿着的锁，所以只在命令行或者农场上的python里使用
+    """
+    import multiprocessing
+    if not dcc_name.startswith('python'):
+        return False
+    return hasattr(multiprocessing, 'get_context') and 'fork' in multiprocessing.get_all_start_methods()
+
+
+@INSTRUMENT.timed('match')
+def get_new_file_knob_dict(path, dcc_file_knob_dict, index=None, matches=None, processes=None, version_mode=None):
+    """
+    根据查找的路径和DCC软件工程内使用的素材路径和使用者parm（knob）的字典，生成从path里查找到的新路径和parm（knob）的字典。例如：
+    原始dcc_file_knob_dict：
+    {'d:/a/b/c.%04d.exr': [<File_Knob object at 0x000001F52AF5EA38>]，
+     'd:/a/b/d.%04d.exr': [knob对象1， knob对象2]，
+    }
+    得到新的dcc_file_knob_dict：
+    {'d:/NEW/c.%04d.exr': [<File_Knob object at 0x000001F52AF5EA38>]，
+     'd:/NEW/d.%04d.exr': [knob对象1， knob对象2]，
+    }
+    :param path: 要查找的路径
+    :param dcc_file_knob_dict: houdini或nuke工程内使用的素材路径和使用者parm（knob）的字典
+    :param index: 可选的asset_index.SequenceIndex，给出时直接查询索引，不再扫描path
+    :param matches: 可选的字典，给出时记录每个旧路径的匹配结果 {旧路径: (新路径, 匹配原因)}，匹配原因见MATCH_REASONS
+    :param processes: 大于1时用多进程并行匹配，结果和单进程完全一样。只在支持fork的系统上的命令行python里生效（见can_fork），
+                      DCC里调用时忽略这个参数
+    :param version_mode: 文件名带版本号（v003）时的匹配方式：None或VERSION_EXACT只匹配同一个版本；
+                         VERSION_LATEST匹配这个资产最新的版本；VERSION_FALLBACK先找同一个版本，找不到时用最新的版本。
+                         版本列表来自索引（或者扫描结果）里按资产名字分组的版本表，不需要重新扫描
+    :return: 新路径和parm（knob）的字典，以及没有从path匹配到新路径的按钮字典
+    """
+    exts = set([os.path.splitext(file_)[-1] for file_ in dcc_file_knob_dict.keys()])
+    if index is not None and index.covers(path):
+        all_file_dict = index.view(path, exts)
+    else:
+        all_file_dict = get_path_all_file(path, exts)
+    path_key = norm_key(path)
+    filenames = list(dcc_file_knob_dict.keys())
+    if processes and processes > 1 and len(filenames) > processes and can_fork():
+        results = _match_in_pool(filenames, all_file_dict, path_key, processes,
+                                 lock=getattr(index, 'lock', None), version_mode=version_mode)
+    else:
+        # 重名文件比较父级文件夹时用的缓存，同一个候选文件只拆分一次路径；候选文件名的缓存见_name_key，
+        # 两个缓存都只在这一次匹配里使用，匹配结束后释放
+        suffix_key_cache, name_key_cache = {}, {}
+        results = [_match_filename(filename, all_file_dict, path_key, suffix_key_cache, version_mode, name_key_cache)
+                   for filename in filenames]
+
+    new_file_knob_dict = {}
+    # 这个复制出来的字典是为了得到没有找到新路径的parm和knob，利用字典的del，删除已经找到的，最后就剩下没有找到的键值对。
+    copy_file_knob_dict = dcc_file_knob_dict.copy()
+    for filename, result in zip(filenames, results):
+        if result is None:
+            continue
+        new_filename, reason = result
+        del copy_file_knob_dict[filename]
+        if matches is not None:
+            matches[filename] = result
+        if reason != 'inside':
+            # 按版本匹配时几个旧版本可能都匹配到同一个最新的文件，它们的parm（knob）要合并在一起
+            new_file_knob_dict.setdefault(new_filename, []).extend(dcc_file_knob_dict[filename])
+    return new_file_knob_dict, copy_file_knob_dict
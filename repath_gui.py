@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+替换素材路径的界面，只在replace_file_path.do()被调用时才导入，DCC启动时不会加载Qt。
+"""
+
+import os
+from repath_core import VERSION_MODES
+from repath_core import get_new_file_knob_dict
+from dcc_adapters import get_adapter
+from utils import shot_frame_ranges
+from utils import validate_sequences
+from asset_index import get_live_index
+from index_server import find_server
+from FolderWidget import FolderWidget
+from instrument import INSTRUMENT
+from instrument import start_from_env
+from instrument import stop_and_emit
+from ProgressBar import ProgressTask
+
+try:
+    from PySide2.QtCore import Qt
+    from PySide2.QtWidgets import QApplication
+    from PySide2.QtWidgets import QCheckBox
+    from PySide2.QtWidgets import QComboBox
+    from PySide2.QtWidgets import QDialog
+    from PySide2.QtWidgets import QFormLayout
+    from PySide2.QtWidgets import QHBoxLayout
+    from PySide2.QtWidgets import QHeaderView
+    from PySide2.QtWidgets import QLabel
+    from PySide2.QtWidgets import QMessageBox
+    from PySide2.QtWidgets import QPushButton
+    from PySide2.QtWidgets import QTreeWidget
+    from PySide2.QtWidgets import QTreeWidgetItem
+    from PySide2.QtWidgets import QVBoxLayout
+except ImportError:
+    from PySide.QtCore import Qt
+    from PySide.QtGui import QApplication
+    from PySide.QtGui import QCheckBox
+    from PySide.QtGui import QComboBox
+    from PySide.QtGui import QDialog
+    from PySide.QtGui import QFormLayout
+    from PySide.QtGui import QHBoxLayout
+    from PySide.QtGui import QHeaderView
+    from PySide.QtGui import QLabel
+    from PySide.QtGui import QMessageBox
+    from PySide.QtGui import QPushButton
+    from PySide.QtGui import QTreeWidget
+    from PySide.QtGui import QTreeWidgetItem
+    from PySide.QtGui import QVBoxLayout
+
+
+class ReplaceList(QDialog):
+    """
+    最后替换完成要列出来新的路径和按钮对照表GUI
+    """
+    def __init__(self, parent=None, adapter=None):
+        super(ReplaceList, self).__init__(parent)
+        self.adapter = adapter
+        # {路径: [parm或knob]}，节点名字在展开路径时才向DCC查询
+        self._pending_knobs = {}
+        self.resize(1080, 600)
+        self.setWindowTitle('Replace List')
+
+        formLayout = QFormLayout()
+        formLayout.setLabelAlignment(Qt.AlignRight)
+        formLayout.addRow(QLabel(u'<font color=green>绿色表示已经替换完成的新素材或资产路径'),)
+        formLayout.addRow(QLabel(u'<font color=yellow>黄色表示原始的路径是存在的，但是新文件夹里没有发现同名文件，所以没有替换'), )
+        formLayout.addRow(QLabel(u'<font color=red>红色表示原始路径和新文件夹里都不存在这个素材或资产'),)
+        formLayout.addRow(QLabel(u'路径后面的missing和empty表示序列中缺失的帧数和0字节的帧数，鼠标悬停可以看到具体帧号'),)
+
+        self.tree = QTreeWidget(self)
+        self.tree.setSortingEnabled(True)
+        # 设置列数
+        self.tree.setColumnCount(1)
+        # 设置头的标题
+        self.tree.setHeaderLabels(['File Name'])
+        # 设置控件大小随着内容长短自动变化
+        head = self.tree.header()
+        # 设置自适应的模式为QHeaderView.ResizeToContents，意思是自动填充为最大，不可更改
+        # 只有pyside2或者PyQt5有
+        head.setSectionResizeMode(QHeaderView.ResizeToContents)
+        # 下面这句话是标题栏宽度自适应以后最后一项的长度一定要弹到最大
+        head.setStretchLastSection(True)
+        # 设置渐变色
+        self.tree.setAlternatingRowColors(True)
+
+        self.tree.itemDoubleClicked.connect(self.selecte_node)
+        self.tree.itemExpanded.connect(self.expand_item)
+
+        mainLayout = QVBoxLayout(self)
+        mainLayout.addLayout(formLayout)
+        mainLayout.addWidget(self.tree)
+        self.setLayout(mainLayout)
+
+    def clear_all_widget(self):
+        """
+        清除所有镜头列表
+        :return:
+        """
+        self.tree.clear()
+        self._pending_knobs = {}
+
+    @INSTRUMENT.timed('results_dialog')
+    def addItem(self, texture_dict):
+        self.clear_all_widget()
+        if not texture_dict:
+            return
+        for file_name, value_dict in texture_dict.items():
+            root = QTreeWidgetItem(self.tree)
+            color = value_dict.get('color')
+            root.setText(0, file_name)
+            root.setData(0, Qt.UserRole, file_name)
+            root.setForeground(0, color)
+            missing, empty = value_dict.get('missing'), value_dict.get('empty')
+            if missing or empty:
+                root.setText(0, u'{}    (missing: {}, empty: {})'.format(file_name, len(missing or []),
+                                                                         len(empty or [])))
+                root.setToolTip(0, u'missing frames: {}\nempty frames: {}'.format(missing, empty))
+            if value_dict.get('knobs'):
+                self._pending_knobs[file_name] = value_dict.get('knobs')
+                root.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+            self.tree.addTopLevelItem(root)
+
+    def expand_item(self, item):
+        """
+        第一次展开路径时才生成节点名字的子项，几千个parm的工程打开结果列表时不用逐个查询节点
+        """
+        knobs = self._pending_knobs.pop(item.data(0, Qt.UserRole), None)
+        if not knobs or self.adapter is None:
+            return
+        for knob in knobs:
+            knob_root = QTreeWidgetItem(item)
+            knob_root.setText(0, self.adapter.node_name(knob))
+
+    def selecte_node(self, qmodelindex):
+        """
+        在houdini里双击GUI上节点路径或者nuke里双击GUI上节点名，会展示这个节点工具栏
+        :param qmodelindex:
+        :return:
+        """
+        if qmodelindex.parent() is None or self.adapter is None:
+            return
+        self.adapter.select_node(qmodelindex.text(0))
+
+
+class ReassignFilePath(QDialog):
+    def __init__(self, parent=None, adapter=None):
+        super(ReassignFilePath, self).__init__(parent)
+        self.adapter = adapter if adapter is not None else get_adapter()
+        self.resize(370, 150)
+        self.setWindowTitle(u'Repath Files')
+        self.init_UI()
+
+    def init_UI(self):
+        """
+        界面端
+        :return:
+        """
+        self.file_widget = FolderWidget(parent=self)
+        self.relative_assignments_widget = QCheckBox(u'Only replace does not exist')
+        self.relative_assignments_widget.setToolTip(u'只替换不存在的文件路径')
+        self.relative_assignments_widget.setChecked(True)
+        self.live_index_widget = QCheckBox(u'Keep live index')
+        self.live_index_widget.setToolTip(u'第一次替换时建立新文件夹的索引并在后台保持更新，之后的替换直接查询索引，不再扫描磁盘')
+        self.version_mode_widget = QComboBox()
+        self.version_mode_widget.addItems(list(VERSION_MODES))
+        self.version_mode_widget.setToolTip(u'文件名带版本号（v003）时：exact只匹配同一个版本，latest匹配最新的版本，'
+                                            u'fallback先找同一个版本，找不到时用最新的版本')
+
+        formLayout = QFormLayout()
+        formLayout.setLabelAlignment(Qt.AlignRight)
+        formLayout.addRow(QLabel("New Folder"), self.file_widget)
+        formLayout.addRow('', self.relative_assignments_widget)
+        formLayout.addRow('', self.live_index_widget)
+        formLayout.addRow(QLabel("Version"), self.version_mode_widget)
+
+        self.export_btn = QPushButton(u'Repath')
+        self.export_btn.clicked.connect(self.do_execute)
+        self.cancel_btn = QPushButton(u'Cancel', clicked=self.close)
+
+        btn_hbox = QHBoxLayout()
+        btn_hbox.addStretch(2)
+        btn_hbox.addWidget(self.export_btn)
+        btn_hbox.addStretch(1)
+        btn_hbox.addWidget(self.cancel_btn)
+        btn_hbox.addStretch(2)
+
+        view_Layout = QVBoxLayout()
+        view_Layout.addStretch()
+        view_Layout.addStretch(1)
+        view_Layout.addLayout(formLayout)
+        view_Layout.addStretch(1)
+        view_Layout.addLayout(btn_hbox)
+        view_Layout.addStretch()
+        self.setLayout(view_Layout)
+
+    @staticmethod
+    def messageBox(strings, flag='information'):
+        """
+        提示栏
+        :param strings: 显示信息
+        :param flag: 显示的图标
+        :return:
+        """
+        icon_dict = {
+                     'information': QMessageBox.Information,
+                     'critical':    QMessageBox.Critical,
+                    }
+        msgBox = QMessageBox()
+        msgBox.setIcon(icon_dict.get(flag.lower()))
+        msgBox.setText(u'{}'.format(strings))
+        msgBox.setStandardButtons(QMessageBox.Ok)
+        msgBox.exec_()
+
+    def do_execute(self):
+        """
+        根据当前DCC软件执行替换任务
+        :return:
+        """
+        nonExist = self.relative_assignments_widget.isChecked()
+        path = self.file_widget.get_folder()
+        if not path or not os.path.exists(path):
+            self.messageBox(u"输入的路径不存在", 'critical')
+            return False
+        if self.adapter is None:
+            self.messageBox(u"当前软件没有对应的DCC适配器", 'critical')
+            return False
+        start_from_env()
+        try:
+            adapter = self.adapter
+            file_parm_dict = adapter.collect(nonExist)
+
+            flag_dict = {}
+
+            new_file_knob_dict = None
+            live_index = self.live_index_widget.isChecked()
+            version_mode = self.version_mode_widget.currentText()
+            # 使用常驻索引时，本机有索引服务就优先在服务里查找，服务出错或者路径不在服务的根目录下时在本进程里查找
+            client = find_server() if live_index else None
+            if client is not None:
+                try:
+                    new_file_knob_dict, no_replace_file_knob_dict = client.get_new_file_knob_dict(
+                        path, file_parm_dict, version_mode=version_mode)
+                except Exception:
+                    new_file_knob_dict = None
+            if new_file_knob_dict is None:
+                index = get_live_index(path) if live_index else None
+                new_file_knob_dict, no_replace_file_knob_dict = get_new_file_knob_dict(
+                    path, file_parm_dict, index=index, version_mode=version_mode)
+            with INSTRUMENT.phase('apply'):
+                pt = ProgressTask('Copy files')
+
+                def progress(num, all_filename_num, filename, knob_num, all_knob_num, knob):
+                    if knob_num == 1:
+                        pt.setParentMessage('filename replace "<font color=yellow>{}</font>" ({})'.format(
+                            os.path.basename(filename), str(num) + ' of ' + str(all_filename_num)))
+                    pt.setChildMessage('Knob name  "<font color=yellow>{}</font>"  ({})'.format(
+                        adapter.ref_label(knob), str(knob_num) + ' of ' + str(all_knob_num)))
+                    pt.setChildProgress((float(knob_num) / all_knob_num) * 100)
+                    if knob_num == all_knob_num:
+                        pt.setParentProgress((float(num) / all_filename_num) * 100)
+
+                adapter.apply(new_file_knob_dict, progress)
+                pt.setParentProgress(100)
+            for filename, knobs in new_file_knob_dict.items():
+                flag_dict.setdefault(filename, {'knobs': knobs, 'color': Qt.green})
+
+            # 并行校验替换后的序列是否完整，以及没有替换的路径是否存在，序列按工程的帧范围检查缺少的帧
+            with INSTRUMENT.phase('validate'):
+                filenames = list(new_file_knob_dict.keys()) + list(no_replace_file_knob_dict.keys())
+                report_dict = validate_sequences(filenames, shot_frame_ranges(filenames, adapter.frame_range()))
+            for filename, value_dict in flag_dict.items():
+                report = report_dict.get(filename)
+                if report:
+                    value_dict['missing'] = report.missing
+                    value_dict['empty'] = report.empty
+            for filename, knobs in no_replace_file_knob_dict.items():
+                if report_dict[filename].exists:
+                    flag_dict.setdefault(filename, {'knobs': knobs, 'color': Qt.yellow})
+                else:
+                    flag_dict.setdefault(filename, {'knobs': knobs, 'color': Qt.red})
+
+            tree_widget = ReplaceList(self, adapter)
+            tree_widget.addItem(flag_dict)
+            tree_widget.showNormal()
+        finally:
+            # 出错时也要停止统计和cProfile
+            stop_and_emit()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+替换计划（dry-run）。先只做匹配和校验，把结果保存成一个计划文件，检查确认以后再在DCC里直接应用，应用时不再扫描磁盘。
+计划里保存的是parm（knob）的字符串标识（DCCAdapter.ref_id），所以计划可以在没有DCC软件的农场机器上生成：
+    # DCC里导出素材路径和parm标识
+    export_references(adapter, 'd:/refs.json')
+    # 农场机器上（可以使用常驻索引）生成计划
+    python repath_plan.py --path //nas/library --refs d:/refs.json --output d:/plan.json
+    # 回到DCC里应用计划
+    RepathPlan.load('d:/plan.json').apply(adapter)
+文件后缀是.msgpack并且安装了msgpack时保存成msgpack，否则保存成紧凑的JSON。
+"""
+
+import json
+
+from repath_core import VERSION_EXACT
+from repath_core import VERSION_MODES
+from repath_core import get_new_file_knob_dict
+from utils import validate_sequences
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 计划条目的校验状态
+STATUS_OK = 'ok'
+STATUS_INCOMPLETE = 'incomplete'    # 新序列有缺失帧或者0字节的帧
+STATUS_EXISTS = 'exists'            # 没有匹配到新路径，但是旧路径存在
+STATUS_MISSING = 'missing'          # 新路径或者旧路径都不存在
+STATUS_UNCHECKED = 'unchecked'
+
+
+def reference_dict(adapter, file_knob_dict):
+    """
+    把 {路径: [parm或knob]} 转换成 {路径: [parm或knob的标识]}
+    :param adapter: dcc_adapters.DCCAdapter
+    :param file_knob_dict: adapter.collect()的结果
+    :return: {路径: [ref_id, ...]}
+    """
+    return dict((filename, [adapter.ref_id(ref) for ref in refs]) for filename, refs in file_knob_dict.items())
+
+
+def export_references(adapter, filename, nonExist=True):
+    """
+    在DCC里收集素材路径，保存成 {路径: [ref_id, ...]} 的JSON文件，给农场机器生成计划使用
+    :return: {路径: [ref_id, ...]}
+    """
+    references = reference_dict(adapter, adapter.collect(nonExist))
+    with open(filename, 'w') as f:
+        json.dump(references, f, separators=(',', ':'))
+    return references
+
+
+class RepathPlan(object):
+    """
+    替换计划，每个条目是一个旧路径：
+    {'old': 'd:/a/b/c.%04d.exr', 'new': 'x:/lib/b/c.%04d.exr', 'refs': ['/obj/geo1/file1/file'],
+     'reason': 'padding', 'status': 'ok', 'missing': [], 'empty': []}
+    没有匹配到新路径的条目new是None
+    """
+    VERSION = 1
+
+    def __init__(self, path, entries=None, dcc=None):
+        self.path = path
+        self.entries = entries or []
+        self.dcc = dcc
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def matched(self):
+        return [entry for entry in self.entries if entry['new'] and entry['new'] != entry['old']]
+
+    def unmatched(self):
+        return [entry for entry in self.entries if not entry['new']]
+
+    def new_file_ref_dict(self):
+        """
+        :return: {新路径: [ref_id, ...]}，同一个新路径的多个旧路径会合并在一起
+        """
+        new_file_ref_dict = {}
+        for entry in self.matched():
+            new_file_ref_dict.setdefault(entry['new'], []).extend(entry['refs'])
+        return new_file_ref_dict
+
+    def apply(self, adapter, progress=None):
+        """
+        在DCC里应用计划，只按标识找回parm（knob）并写入，不扫描磁盘
+        :param adapter: dcc_adapters.DCCAdapter
+        :param progress: 传给adapter.apply的进度回调
+        :return: (写入的数量, 找不到的ref_id列表)
+        """
+        new_file_knob_dict = {}
+        unresolved = []
+        for filename, ref_ids in self.new_file_ref_dict().items():
+            for ref_id in ref_ids:
+                ref = adapter.resolve_ref(ref_id)
+                if ref is None:
+                    unresolved.append(ref_id)
+                else:
+                    new_file_knob_dict.setdefault(filename, []).append(ref)
+        return adapter.apply(new_file_knob_dict, progress), unresolved
+
+    def to_dict(self):
+        return {'version': self.VERSION, 'path': self.path, 'dcc': self.dcc, 'entries': self.entries}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != cls.VERSION:
+            raise ValueError('unsupported repath plan version: {}'.format(data.get('version')))
+        return cls(data['path'], data['entries'], data.get('dcc'))
+
+    def save(self, filename):
+        """
+        保存计划，.msgpack后缀并且安装了msgpack时保存成msgpack，否则保存成紧凑的JSON
+        """
+        if filename.endswith('.msgpack') and msgpack is not None:
+            with open(filename, 'wb') as f:
+                f.write(msgpack.packb(self.to_dict(), use_bin_type=True))
+        else:
+            with open(filename, 'w') as f:
+                json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, filename):
+        if filename.endswith('.msgpack') and msgpack is not None:
+            with open(filename, 'rb') as f:
+                return cls.from_dict(msgpack.unpackb(f.read(), raw=False))
+        with open(filename) as f:
+            return cls.from_dict(json.load(f))
+
+
+def build_plan(path, references, index=None, validate=True, dcc=None, version_mode=None, processes=None):
+    """
+    只做匹配和校验，生成替换计划
+    :param path: 要查找的路径
+    :param references: {旧路径: [ref_id, ...]}，reference_dict或export_references的结果
+    :param index: 可选的asset_index.SequenceIndex
+    :param validate: 是否校验新路径（以及没有匹配到的旧路径）是否存在和完整
+    :param dcc: 记录生成计划的DCC软件名字
+    :param version_mode: 文件名带版本号时的匹配方式，见get_new_file_knob_dict
+    :param processes: 匹配用的进程数，只在命令行里生效，见get_new_file_knob_dict
+    :return: RepathPlan
+    """
+    matches = {}
+    get_new_file_knob_dict(path, references, index=index, matches=matches, processes=processes,
+                           version_mode=version_mode)
+    entries = plan_entries(references, matches)
+    if validate:
+        validate_entries(entries)
+    return RepathPlan(path, entries, dcc)
+
+
+def plan_entries(references, matches):
+    """
+    用匹配结果生成计划条目，状态是STATUS_UNCHECKED
+    :param references: {旧路径: [ref_id, ...]}
+    :param matches: get_new_file_knob_dict记录的 {旧路径: (新路径, 匹配原因)}
+    :return: 条目列表
+    """
+    entries = []
+    for old_filename, ref_ids in references.items():
+        new_filename, reason = matches.get(old_filename, (None, None))
+        entries.append({'old': old_filename, 'new': new_filename, 'refs': list(ref_ids), 'reason': reason,
+                        'status': STATUS_UNCHECKED, 'missing': [], 'empty': []})
+    return entries
+
+
+def validate_entries(entries, report_dict=None):
+    """
+    校验条目的新路径（没有匹配到时是旧路径），原地修改条目的状态
+    :param entries: 计划条目列表
+    :param report_dict: 可选的validate_sequences结果，多个计划一起校验时传入同一个结果
+    """
+    if report_dict is None:
+        report_dict = validate_sequences([entry['new'] or entry['old'] for entry in entries])
+    for entry in entries:
+        report = report_dict[entry['new'] or entry['old']]
+        if not entry['new']:
+            entry['status'] = STATUS_EXISTS if report.exists else STATUS_MISSING
+        elif not report.exists:
+            entry['status'] = STATUS_MISSING
+        else:
+            entry['missing'], entry['empty'] = report.missing, report.empty
+            entry['status'] = STATUS_INCOMPLETE if report.missing or report.empty else STATUS_OK
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='build a repath plan without touching the DCC scene')
+    parser.add_argument('--path', required=True, help='folder to search for the new files')
+    parser.add_argument('--refs', required=True, help='JSON file written by export_references')
+    parser.add_argument('--output', required=True, help='plan file, .json or .msgpack')
+    parser.add_argument('--live-index', action='store_true', help='use (and keep) a live index of --path')
+    parser.add_argument('--no-validate', action='store_true')
+    parser.add_argument('--version-mode', choices=VERSION_MODES, default=VERSION_EXACT,
+                        help='how to match versioned names such as tex_v003: same version, latest, or same then latest')
+    parser.add_argument('--processes', type=int, help='match references in this many forked processes')
+    options = parser.parse_args(argv)
+    with open(options.refs) as f:
+        references = json.load(f)
+    index = None
+    if options.live_index:
+        from asset_index import get_live_index
+        index = get_live_index(options.path)
+    plan = build_plan(options.path, references, index=index, validate=not options.no_validate,
+                      version_mode=options.version_mode, processes=options.processes)
+    plan.save(options.output)
+    print('{} references, {} matched, {} unmatched'.format(len(plan), len(plan.matched()), len(plan.unmatched())))
+    return plan
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+紧凑的扫描结果存储。几百万个文件的素材库如果每个序列都保存一个DayuPath和一个属性字典，再加上每一帧一个int对象，内存占用非常大。
+这里文件夹路径只保存一次（用编号引用），每个序列是并列数组里的一行（文件夹编号、文件名、格式、pattern、位数、帧范围），
+帧列表压缩成连续的帧段，只有查询到的序列才会生成DayuPath和属性字典。
+"""
+
+from array import array
+from bisect import bisect_right
+
+from dayu_path import DayuPath as DiskPath
+from utils import split_version
+
+
+def frames_to_ranges(frames):
+    """
+    把排好序的帧列表压缩成连续帧段，例如 [1, 2, 3, 5, 7, 8] ——> [1, 3, 5, 5, 7, 8]
+    :param frames: 排好序的帧列表
+    :return: 开始帧和结束帧交替排列的列表
+    """
+    ranges = []
+    for frame in frames:
+        if ranges and frame == ranges[-1] + 1:
+            ranges[-1] = frame
+        elif not ranges or frame != ranges[-1]:
+            ranges.extend((frame, frame))
+    return ranges
+
+
+def ranges_to_frames(ranges):
+    """
+    frames_to_ranges的逆操作
+    :param ranges: 开始帧和结束帧交替排列的序列
+    :return: 帧列表
+    """
+    frames = []
+    for index in range(0, len(ranges), 2):
+        frames.extend(range(ranges[index], ranges[index + 1] + 1))
+    return frames
+
+
+def ranges_difference(ranges, other):
+    """
+    在帧段上直接计算差集（ranges里有、other里没有的帧），不展开帧列表，
+    例如 [1, 10], [3, 4, 8, 20] ——> [1, 2, 5, 7]
+    :param ranges: 开始帧和结束帧交替排列的序列
+    :param other: 开始帧和结束帧交替排列的序列
+    :return: 差集的帧段列表
+    """
+    result = []
+    index = 0
+    for start, end in zip(ranges[::2], ranges[1::2]):
+        # 跳过已经完全在start前面的帧段
+        while index < len(other) and other[index + 1] < start:
+            index += 2
+        current = start
+        scan = index
+        while scan < len(other) and other[scan] <= end:
+            if other[scan] > current:
+                result.extend((current, other[scan] - 1))
+            current = max(current, other[scan + 1] + 1)
+            scan += 2
+        if current <= end:
+            result.extend((current, end))
+    return result
+
+
+def missing_frames(ranges, frames):
+    """
+    在帧段里二分查找，返回frames里不在帧段里的帧，不需要展开帧段，例如 [1001, 1003, 1011, 1011], [1002, 1005, 1011] ——> [1005]
+    :param ranges: 开始帧和结束帧交替排列的序列
+    :param frames: 帧号或者UDIM贴图编号列表
+    :return: 缺少的帧列表
+    """
+    starts = ranges[::2]
+    missing = []
+    for frame in frames:
+        index = bisect_right(starts, frame) - 1
+        if index < 0 or ranges[index * 2 + 1] < frame:
+            missing.append(frame)
+    return missing
+
+
+class ScanStore(object):
+    """
+    扫描结果的紧凑存储，get(name)返回的列表和原来get_path_all_file字典里的值一样：
+    [{'ext': 'exr', 'filename': DayuPath('d:/a/b/c.%04d.exr'), 'pattern': '%04d', 'pattern_num': 4, 'frames': [1001, 1002]}]
+    """
+    def __init__(self):
+        # 文件夹路径只保存一次
+        self.dirs = []
+        self._dir_ids = {}
+        # ext和pattern的种类很少，同样只保存一次
+        self._strings = {}
+        # 每个序列一行的并列数组，帧号和编号用'q'（64位），windows上'l'只有32位
+        self.dir_id = array('q')
+        self.basename = []
+        self.ext = []
+        self.pattern = []
+        self.pattern_num = array('b')
+        self.frame_offset = array('q', [0])
+        self.frame_ranges = array('q')
+        # {name_format得到的name: array(行号)}
+        self.names = {}
+        # {资产名字: [(版本号, name), ...]}，第一次调用versions时才建立
+        self._versions = None
+
+    def __len__(self):
+        return len(self.basename)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def _intern(self, value):
+        return self._strings.setdefault(value, value)
+
+    def add(self, path, nameformat, frames):
+        """
+        添加一个序列
+        :param path: 序列路径 d:/a/b/c.%04d.exr
+        :param nameformat: utils.name_format(path)的结果
+        :param frames: 排好序的帧列表
+        :return: 行号
+        """
+        directory, basename = path.rsplit('/', 1) if '/' in path else ('', path)
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids.setdefault(directory, len(self.dirs))
+            self.dirs.append(directory)
+        row = len(self.basename)
+        self.dir_id.append(dir_id)
+        self.basename.append(basename)
+        self.ext.append(self._intern(nameformat.ext))
+        self.pattern.append(self._intern(nameformat.pattern))
+        self.pattern_num.append(nameformat.pattern_num if nameformat.pattern_num != '' else -1)
+        self.frame_ranges.extend(frames_to_ranges(frames))
+        self.frame_offset.append(len(self.frame_ranges))
+        self.names.setdefault(self._intern(nameformat.name), array('q')).append(row)
+        self._versions = None
+        return row
+
+    def path(self, row):
+        directory = self.dirs[self.dir_id[row]]
+        return '/'.join((directory, self.basename[row])) if directory else self.basename[row]
+
+    def frames(self, row):
+        return ranges_to_frames(self.frame_ranges[self.frame_offset[row]:self.frame_offset[row + 1]])
+
+    def frame_count(self, row):
+        ranges = self.frame_ranges[self.frame_offset[row]:self.frame_offset[row + 1]]
+        return sum(ranges[index + 1] - ranges[index] + 1 for index in range(0, len(ranges), 2))
+
+    def has_frames(self, row, frames):
+        """
+        检查一行是否包含所有给定的帧或者UDIM贴图编号，见missing_frames
+        :param row: 行号
+        :param frames: 帧号或者贴图编号列表
+        :return: bool
+        """
+        return not missing_frames(self.frame_ranges[self.frame_offset[row]:self.frame_offset[row + 1]], frames)
+
+    def attr_dict(self, row):
+        """
+        生成一行的属性字典，filename是带frames属性的DayuPath
+        :param row: 行号
+        :return: 属性字典
+        """
+        frames = self.frames(row)
+        pattern_num = self.pattern_num[row]
+        return {
+            'ext': self.ext[row],
+            'filename': DiskPath(self.path(row), frames=frames),
+            'pattern': self.pattern[row],
+            'pattern_num': pattern_num if pattern_num >= 0 else '',
+            'frames': frames,
+        }
+
+    def get(self, name, default=None):
+        rows = self.names.get(name)
+        if rows is None:
+            return default
+        return [self.attr_dict(row) for row in rows]
+
+    def versions(self, name):
+        """
+        同一个资产（去掉版本号以后名字一样）的所有版本
+        :param name: 任意一个版本的name
+        :return: 按版本号排好序的 [(版本号, name), ...]，name没有版本号时返回空列表
+        """
+        split = split_version(name)
+        if split is None:
+            return []
+        if self._versions is None:
+            versions = {}
+            for other in self.names:
+                other_split = split_version(other)
+                if other_split is not None:
+                    versions.setdefault(other_split[0], []).append((other_split[1], other))
+            for version_list in versions.values():
+                version_list.sort()
+            self._versions = versions
+        return self._versions.get(split[0], [])
+
+    def keys(self):
+        return self.names.keys()
+
+    def __iter__(self):
+        return iter(self.names)
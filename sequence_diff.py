@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+###################################################################
+# Author: Wenfeng Zhang
+# Email : zwf.vfx@Foxmail.com
+###################################################################
+"""
+比较两个素材根目录的序列差异，用于素材库迁移后的检查：哪些序列只在旧目录里、哪些只在新目录里、
+新目录里缺少哪些帧、哪些帧的文件大小不一样。两个目录在两个线程里同时扫描，扫描结果保存在紧凑的ScanStore里，
+缺少的帧直接在帧段上计算，文件大小只对两边都有的帧所在的文件夹读取一次目录：
+    python sequence_diff.py //old_nas/library //new_nas/library --output diff.json
+"""
+
+import json
+import os
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from dayu_path import DayuPath as DiskPath
+from scan_store import ScanStore
+from scan_store import frames_to_ranges
+from scan_store import ranges_difference
+from scan_store import ranges_to_frames
+from utils import name_format
+from utils import norm_key
+from utils import scan_directory
+
+# added/removed是相对路径列表，missing_frames/size_mismatch是{相对路径: 帧段列表}，单个文件大小不一样时帧段列表为空；
+# collisions是{根目录: [[只有大小写不同的相对路径, ...], ...]}，这些序列没法和另一边一一对应，不参与比较
+SequenceDiff = namedtuple('SequenceDiff', 'added removed missing_frames size_mismatch collisions')
+
+
+def scan_root(root, exts=None):
+    """
+    扫描一个根目录下的所有序列
+    :param root: 根目录
+    :param exts: 可选的文件格式列表，例如['.exr', '.jpg']
+    :return: (ScanStore, {norm_key(相对路径): (行号, 相对路径)}, [[只有大小写不同的相对路径, ...], ...])，
+             大小写冲突的序列不在字典里
+    """
+    root = DiskPath(root).rstrip('/')
+    store = ScanStore()
+    for file_name in DiskPath(root).scan(recursive=True, ext_filters=exts):
+        store.add(file_name, name_format(file_name), file_name.frames)
+    relative_dict = {}
+    collision_dict = {}
+    prefix = root + '/'
+    for row in range(len(store)):
+        path = store.path(row)
+        relative = path[len(prefix):] if path.startswith(prefix) else os.path.relpath(path, root).replace('\\', '/')
+        key = norm_key(relative)
+        if key in collision_dict:
+            collision_dict[key].append(relative)
+        elif key in relative_dict:
+            # 区分大小写的文件系统上两个序列只有大小写不同，不能确定对应另一边的哪一个
+            collision_dict[key] = [relative_dict.pop(key)[1], relative]
+        else:
+            relative_dict[key] = (row, relative)
+    collisions = sorted(sorted(relatives) for relatives in collision_dict.values())
+    return store, relative_dict, collisions
+
+
+def _compare_directory(args):
+    """
+    diff_roots的线程任务，两边的文件夹各读取一次，比较同一个文件夹下所有共同序列的文件大小
+    :param args: (旧文件夹, 新文件夹, [(相对路径, 旧文件名, 新文件名, 共同的帧列表), ...])
+    :return: [(相对路径, 大小不一样的帧列表), ...]，单个文件大小不一样时帧列表是[None]
+    """
+    old_directory, new_directory, items = args
+    old_entries = scan_directory(old_directory or '.')
+    new_entries = scan_directory(new_directory or '.')
+    result = []
+    for relative, old_basename, new_basename, frames in items:
+        mismatched = []
+        if frames:
+            # 每个序列只解析一次pattern，再批量展开所有帧的文件名
+            old_names = DiskPath(old_basename).template().names(frames)
+            new_names = DiskPath(new_basename).template().names(frames)
+        else:
+            frames, old_names, new_names = [None], [old_basename], [new_basename]
+        for frame, old_name, new_name in zip(frames, old_names, new_names):
+            old_size, new_size = old_entries.get(old_name), new_entries.get(new_name)
+            if old_size is None or new_size is None:
+                continue
+            if old_size() != new_size():
+                mismatched.append(frame)
+        if mismatched:
+            result.append((relative, mismatched))
+    return result
+
+
+def diff_roots(old_root, new_root, exts=None, sizes=True, threads=None):
+    """
+    比较两个根目录下的序列，相对路径不区分大小写和正反斜杠
+    :param old_root: 旧的根目录
+    :param new_root: 新的根目录
+    :param exts: 可选的文件格式列表
+    :param sizes: 是否比较两边都有的帧的文件大小
+    :param threads: 比较文件大小时同时读取文件夹的线程数，None时按新目录所在的文件系统选择
+    :return: SequenceDiff
+    """
+    pool = ThreadPool(2)
+    try:
+        (old_store, old_dict, old_collisions), (new_store, new_dict, new_collisions) = pool.map(
+            lambda root: scan_root(root, exts), [old_root, new_root])
+    finally:
+        pool.close()
+        pool.join()
+
+    collisions = dict((root, relatives) for root, relatives in [(old_root, old_collisions), (new_root, new_collisions)]
+                      if relatives)
+    # 和另一边的大小写冲突对应的序列也不算新增或者删除
+    old_collided = set(norm_key(relatives[0]) for relatives in old_collisions)
+    new_collided = set(norm_key(relatives[0]) for relatives in new_collisions)
+    added = sorted(relative for key, (_, relative) in new_dict.items()
+                   if key not in old_dict and key not in old_collided)
+    removed = sorted(relative for key, (_, relative) in old_dict.items()
+                     if key not in new_dict and key not in new_collided)
+    missing_frames = {}
+    directory_tasks = {}
+    for key, (old_row, relative) in old_dict.items():
+        if key not in new_dict:
+            continue
+        new_row = new_dict[key][0]
+        old_ranges = old_store.frame_ranges[old_store.frame_offset[old_row]:old_store.frame_offset[old_row + 1]]
+        new_ranges = new_store.frame_ranges[new_store.frame_offset[new_row]:new_store.frame_offset[new_row + 1]]
+        missing = ranges_difference(old_ranges, new_ranges)
+        if missing:
+            missing_frames[relative] = missing
+        if sizes:
+            directories = (old_store.dirs[old_store.dir_id[old_row]], new_store.dirs[new_store.dir_id[new_row]])
+            common = ranges_difference(old_ranges, missing) if missing else old_ranges
+            directory_tasks.setdefault(directories, []).append(
+                (relative, old_store.basename[old_row], new_store.basename[new_row], ranges_to_frames(common)))
+
+    size_mismatch = {}
+    if directory_tasks:
+        pool = ThreadPool(threads or DiskPath(new_root).io_profile.stat_workers)
+        try:
+            tasks = [(old_directory, new_directory, items)
+                     for (old_directory, new_directory), items in directory_tasks.items()]
+            for result in pool.imap_unordered(_compare_directory, tasks):
+                for relative, frames in result:
+                    size_mismatch[relative] = frames_to_ranges([f for f in frames if f is not None])
+        finally:
+            pool.close()
+            pool.join()
+    return SequenceDiff(added, removed, missing_frames, size_mismatch, collisions)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='sequence level diff between two asset roots')
+    parser.add_argument('old_root')
+    parser.add_argument('new_root')
+    parser.add_argument('--ext', action='append', help='only compare these extensions, e.g. --ext .exr')
+    parser.add_argument('--no-sizes', action='store_true', help='do not compare file sizes')
+    parser.add_argument('--threads', type=int, help='default depends on the file system of new_root')
+    parser.add_argument('--output', help='write the diff to this JSON file')
+    options = parser.parse_args(argv)
+    diff = diff_roots(options.old_root, options.new_root, options.ext, not options.no_sizes, options.threads)
+    print('added {}, removed {}, missing frames {}, size mismatch {}, case collisions {}'.format(
+        len(diff.added), len(diff.removed), len(diff.missing_frames), len(diff.size_mismatch),
+        sum(len(relatives) for relatives in diff.collisions.values())))
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(diff._asdict(), f, separators=(',', ':'), sort_keys=True)
+    return diff
+
+
+if __name__ == '__main__':
+    main()
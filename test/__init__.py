@@ -0,0 +1 @@
+"""Test of the repath tools."""
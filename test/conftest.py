@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import third-party modules
+import pytest
+
+
+def _make_files(root, names, content='1'):
+    for name in names:
+        root.join(name).write(content, ensure=True)
+    return str(root).replace('\\', '/')
+
+
+@pytest.fixture
+def make_files():
+    """
+    在py.path文件夹下建立测试用的素材文件，子文件夹自动创建
+    make_files(tmpdir, ['tex/wood.1001.exr'], content='1')返回正斜杠的文件夹路径
+    """
+    return _make_files
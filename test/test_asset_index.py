@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import built-in modules
+import errno
+import os
+import sys
+
+# Import third-party modules
+import pytest
+
+# Import local modules
+import asset_index
+from asset_index import IndexWatcher
+from asset_index import SequenceIndex
+from dayu_path import DayuPath
+
+
+@pytest.fixture
+def library(tmpdir, make_files):
+    return make_files(tmpdir, ['tex/wood_v003.1001.exr', 'tex/wood_v003.1002.exr', 'tex/wood_v005.1001.exr',
+                               'plates/pl_0010.1001.exr', 'plates/pl_0010.1002.exr', 'plates/pl_0010.1001.jpg',
+                               'cam.abc'])
+
+
+def test_build_and_view(library):
+    index = SequenceIndex(library).build()
+    assert len(index.sequences) == 5
+    assert index.versions('wood_v003.') == [(3, 'wood_v003.'), (5, 'wood_v005.')]
+    assert index.covers(library.upper())
+    assert index.covers(library + '/tex') and not index.covers(library + '_other')
+
+    view = index.view(library + '/plates', ['.exr'])
+    attr_dict_list = view.get('pl_0010.')
+    assert [(a['filename'], a['frames']) for a in attr_dict_list] == [(library + '/plates/pl_0010.%04d.exr',
+                                                                      [1001, 1002])]
+    assert index.view(library + '/tex').get('pl_0010.') is None
+    # 视图返回的是复制出来的帧列表，不受之后索引变化的影响
+    index.add_file(library + '/plates/pl_0010.1003.exr')
+    assert attr_dict_list[0]['frames'] == [1001, 1002]
+    assert view.get('pl_0010.')[0]['frames'] == [1001, 1002, 1003]
+
+
+def test_add_remove(library):
+    index = SequenceIndex(library).build()
+    generation = index.generation
+    index.add_file(library + '/tex/wood_v004.1001.exr')
+    assert index.versions('wood_v003.') == [(3, 'wood_v003.'), (4, 'wood_v004.'), (5, 'wood_v005.')]
+    index.remove_file(library + '/tex/wood_v003.1001.exr')
+    assert index.sequences[library + '/tex/wood_v003.%04d.exr']['frames'] == [1002]
+    index.remove_file(library + '/tex/wood_v003.1002.exr')
+    assert library + '/tex/wood_v003.%04d.exr' not in index.sequences
+    assert index.versions('wood_v005.') == [(4, 'wood_v004.'), (5, 'wood_v005.')]
+    index.remove_dir(library + '/plates')
+    assert 'pl_0010.' not in index.names
+    index.add_dir(library + '/plates')
+    assert len(index.names['pl_0010.']) == 2
+    assert index.generation == generation + 5
+
+
+def test_save_load(library, tmpdir):
+    index = SequenceIndex(library).build()
+    cache_file = str(tmpdir.join('index.json'))
+    index.save(cache_file)
+    loaded = SequenceIndex.load(cache_file)
+    assert loaded.root == index.root
+    assert loaded.sequences == index.sequences
+    assert loaded.versions_dict == index.versions_dict
+
+
+def test_polling_watcher(library):
+    index = SequenceIndex(library)
+    watcher = IndexWatcher(index, use_inotify=False)
+    watcher.setup()
+    index.build()
+    os.makedirs(library + '/new')
+    with open(library + '/new/rock.1001.exr', 'w') as f:
+        f.write('1')
+    os.remove(library + '/tex/wood_v005.1001.exr')
+    watcher.poll()
+    assert index.sequences[library + '/new/rock.%04d.exr']['frames'] == [1001]
+    assert index.versions('wood_v003.') == [(3, 'wood_v003.')]
+
+
+def test_watcher_network_root_polls(library, monkeypatch):
+    # 网络盘上的变化不会产生inotify事件，默认用轮询
+    monkeypatch.setattr(DayuPath, 'is_network', property(lambda self: True))
+    assert not IndexWatcher(SequenceIndex(library)).use_inotify
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is linux only')
+def test_watcher_add_watch_failure_polls(library, monkeypatch):
+    def add_watch(self, path):
+        raise OSError(errno.ENOSPC, 'inotify_add_watch failed', path)
+
+    monkeypatch.setattr(asset_index._Inotify, 'add_watch', add_watch)
+    index = SequenceIndex(library)
+    watcher = IndexWatcher(index, use_inotify=True)
+    watcher.setup()
+    assert not watcher.use_inotify
+    index.build()
+    os.remove(library + '/tex/wood_v005.1001.exr')
+    watcher.poll()
+    assert index.versions('wood_v003.') == [(3, 'wood_v003.')]
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import third-party modules
+import pytest
+
+# Import local modules
+import dependency_graph
+from dependency_graph import DependencyGraph
+from dependency_graph import clear_scene_cache
+from dependency_graph import parse_nuke_script
+from dependency_graph import parse_usda
+from dependency_graph import read_scene
+
+
+NUKE_SCRIPT = '''Root {
+ inputs 0
+ name {root}/comp.nk
+}
+Read {
+ inputs 0
+ file "{root}/gone/plt.####.exr"
+ name Read1
+}
+Group {
+ inputs 0
+ name Group1
+}
+Read {
+ inputs 0
+ file {{root}/gone/tex.exr}
+ name Read2
+}
+Write {
+ file {root}/out/comp.####.exr
+ name Write1
+}
+end_group
+Precomp {
+ file {precomp}
+ name Precomp1
+}
+Read {
+ file "[value root.name]/plt.exr"
+ name Read3
+}
+'''
+
+
+@pytest.fixture(autouse=True)
+def scene_cache():
+    clear_scene_cache()
+    yield
+    clear_scene_cache()
+
+
+def write_nuke(path, root, precomp=''):
+    path.write(NUKE_SCRIPT.replace('{root}', root).replace('{precomp}', precomp), ensure=True)
+    return str(path).replace('\\', '/')
+
+
+def test_parse_nuke_script(tmpdir):
+    root = str(tmpdir).replace('\\', '/')
+    scene = write_nuke(tmpdir.join('comp.nk'), root, root + '/pre.nk')
+    assert parse_nuke_script(scene) == {
+        root + '/gone/plt.####.exr': ['Read1.file'],
+        root + '/gone/tex.exr': ['Group1.Read2.file'],
+        root + '/pre.nk': ['Precomp1.file'],
+    }
+
+
+def test_parse_usda(tmpdir):
+    tmpdir.join('shot/scene.usda').write('\n'.join([
+        '#usda 1.0',
+        'def "geo" (references = @./geo/asset.usda@) {',
+        '    asset inputs:file = @../tex/wood.<UDIM>.exr@',
+        '    asset inputs:other = @@@d:/lib/with @ sign.exr@@@',
+        '    asset inputs:empty = @@',
+        '}',
+    ]), ensure=True)
+    root = str(tmpdir).replace('\\', '/')
+    # 相对路径按.usda文件所在的文件夹展开
+    assert parse_usda(str(tmpdir.join('shot/scene.usda'))) == {
+        root + '/shot/geo/asset.usda': ['line:2'],
+        root + '/tex/wood.<UDIM>.exr': ['line:3'],
+        'd:/lib/with @ sign.exr': ['line:4'],
+    }
+
+
+def test_build_cycle_and_depth(tmpdir):
+    root = str(tmpdir).replace('\\', '/')
+    a = write_nuke(tmpdir.join('a.nk'), root, root + '/b.nk')
+    b = write_nuke(tmpdir.join('b.nk'), root, root + '/c.nk')
+    c = write_nuke(tmpdir.join('c.nk'), root, root + '/a.nk')
+    graph = DependencyGraph([a], workers=2).build()
+    # a -> b -> c -> a的循环引用每个文件只读取一次
+    assert sorted(graph.scenes) == [a, b, c]
+    assert graph.dependencies(a) == [b, c]
+    assert graph.edges[c] == [a]
+    assert sorted(DependencyGraph([a], workers=2, max_depth=1).build().scenes) == [a, b]
+    assert list(DependencyGraph([a], workers=2, max_depth=0).build().scenes) == [a]
+    missing = DependencyGraph([root + '/none.nk'], workers=1).build().scenes[root + '/none.nk']
+    assert isinstance(missing.error, OSError)
+
+
+def test_resolve(tmpdir, make_files):
+    root = make_files(tmpdir, ['lib/plt.1001.exr'])
+    a = write_nuke(tmpdir.join('a.nk'), root, root + '/b.nk')
+    b = write_nuke(tmpdir.join('b.nk'), root)
+    graph = DependencyGraph([a], workers=2).build()
+    assert sorted(graph.references()[root + '/gone/plt.####.exr']) == [(a, 'Read1.file'), (b, 'Read1.file')]
+    plans = graph.resolve(root + '/lib')
+    assert sorted(plans) == [a, b]
+    entries = dict((entry['old'], entry) for entry in plans[a])
+    assert entries[root + '/gone/plt.####.exr']['new'] == root + '/lib/plt.####.exr'
+    assert entries[root + '/gone/plt.####.exr']['status'] == 'ok'
+    assert entries[root + '/gone/tex.exr']['new'] is None
+    assert plans[a].dcc == 'nuke'
+
+
+def test_scene_cache_limit(tmpdir, monkeypatch):
+    monkeypatch.setattr(dependency_graph, 'MAX_CACHED_SCENES', 2)
+    root = str(tmpdir).replace('\\', '/')
+    scenes = [write_nuke(tmpdir.join('{}.nk'.format(name)), root) for name in 'abc']
+    for scene in scenes:
+        read_scene(scene)
+    read_scene(scenes[1])
+    read_scene(scenes[0])
+    assert list(dependency_graph._SCENE_CACHE) == [scenes[1], scenes[0]]
+    assert read_scene(scenes[0]).references == parse_nuke_script(scenes[0])
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import built-in modules
+import io
+
+# Import third-party modules
+import pytest
+
+# Import local modules
+from hip_reader import HipFormatError
+from hip_reader import audit_hip_files
+from hip_reader import hip_references
+from hip_reader import iter_cpio
+from hip_reader import parse_parm_file
+from hip_reader import parse_variables
+
+
+def odc_archive(entries):
+    # houdini保存.hip使用的odc格式，数字是八进制，没有对齐
+    data = b''
+    for name, content in list(entries) + [('TRAILER!!!', b'')]:
+        name = name.encode('utf-8') + b'\0'
+        data += b'070707' + b'000000' * 7 + b'00000000000'
+        data += '{:06o}{:011o}'.format(len(name), len(content)).encode('ascii') + name + content
+    return data
+
+
+def newc_archive(entries):
+    # newc格式，数字是十六进制，文件名和内容都按4字节对齐
+    data = b''
+    for name, content in list(entries) + [('TRAILER!!!', b'')]:
+        name = name.encode('utf-8') + b'\0'
+        fields = [0, 0o100644, 0, 0, 1, 0, len(content), 0, 0, 0, 0, len(name), 0]
+        header = b'070701' + b''.join('{:08x}'.format(field).encode('ascii') for field in fields)
+        data += header + name + b'\0' * (-(len(header) + len(name)) % 4)
+        data += content + b'\0' * (-len(content) % 4)
+    return data
+
+
+class ReadOnlyStream(object):
+    # 不能seek的流，跳过的条目只能按块读掉
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+
+ENTRIES = [('obj/geo1/file1.parm', b'file\t[ 0\tlocks=0 ]\t(\t"$JOB/tex/wood.$F4.exr"\t)\n'),
+           ('obj/geo1/file1.init', b'x' * 7),
+           ('.variables', b"set -g JOB = '/mnt/proj'\nset -g EMPTY = ''\n"),
+           ('obj/geo1.parm', b'scale\t[ 0\tlocks=0 ]\t(\t1\t)\n')]
+
+
+@pytest.mark.parametrize('archive', [odc_archive, newc_archive])
+def test_iter_cpio(archive):
+    data = archive(ENTRIES)
+    assert list(iter_cpio(io.BytesIO(data))) == ENTRIES
+    wanted = lambda name: name.endswith('.parm')
+    expected = [entry for entry in ENTRIES if wanted(entry[0])]
+    assert list(iter_cpio(io.BytesIO(data), wanted)) == expected
+    assert list(iter_cpio(ReadOnlyStream(data), wanted)) == expected
+
+
+def test_iter_cpio_errors():
+    with pytest.raises(HipFormatError):
+        list(iter_cpio(io.BytesIO(b'PK\x03\x04 not cpio')))
+    with pytest.raises(HipFormatError):
+        list(iter_cpio(io.BytesIO(odc_archive(ENTRIES)[:100])))
+    assert list(iter_cpio(io.BytesIO(b''))) == []
+
+
+def test_parse_parm_file():
+    text = '\n'.join([
+        '{',
+        '    version 0.8',
+        'file\t[ 0\tlocks=0 ]\t(\t"d:/a/b.$F4.exr"\t)',
+        'quoted [ 0 locks=0 ] ( "d:/a/\\"q\\".exr" )',
+        'empty [ 0 locks=0 ] ( "" )',
+        'two [ 0 locks=0 ] ( "a" "b" )',
+        'mixed [ 0 locks=0 ] ( "a" 1 )',
+        'number [ 0 locks=0 ] ( 1001 )',
+        '}',
+    ])
+    assert parse_parm_file(text) == [('file', 'd:/a/b.$F4.exr'), ('quoted', 'd:/a/"q".exr'), ('empty', '')]
+
+
+def test_parse_variables():
+    text = "set -g JOB = '/mnt/proj'\nset ACES = /opt/aces\nsetenv NOT = 1\n"
+    assert parse_variables(text) == {'JOB': '/mnt/proj', 'ACES': '/opt/aces'}
+
+
+def test_hip_references(tmpdir, make_files):
+    root = make_files(tmpdir, ['tex/exists.exr'])
+    entries = [
+        ('.variables', "set -g JOB = '/mnt/proj'\n".encode('utf-8')),
+        ('obj/geo1/file1.parm', b'file [ 0 locks=0 ] ( "$JOB/tex/wood.$F4.exr" )\n'),
+        ('mat/shader.parm', b'map [ 0 locks=0 ] ( "$HIP/tex/exists.exr" )\nlabel [ 0 locks=0 ] ( "wood" )\n'),
+        ('obj/geo2/file1.parm', b'file [ 0 locks=0 ] ( "$JOB/tex/wood.$F4.exr" )\n'),
+        ('obj/geo2.init', b'\0' * 9),
+    ]
+    hip = tmpdir.join('shot.hip')
+    hip.write(odc_archive(entries), mode='wb')
+    references = hip_references(str(hip), nonExist=False)
+    assert references == {'/mnt/proj/tex/wood.$F4.exr': ['/obj/geo1/file1/file', '/obj/geo2/file1/file'],
+                          root + '/tex/exists.exr': ['/mat/shader/map']}
+    # 默认只收集不存在的路径
+    assert list(hip_references(str(hip))) == ['/mnt/proj/tex/wood.$F4.exr']
+
+
+def test_audit_hip_files(tmpdir, make_files):
+    make_files(tmpdir, ['lib/wood.1001.exr'])
+    hip = tmpdir.join('shot.hip')
+    hip.write(odc_archive([('obj/geo1/file1.parm', b'file [ 0 locks=0 ] ( "/mnt/gone/wood.$F4.exr" )\n')]), mode='wb')
+    broken = tmpdir.join('broken.hip')
+    broken.write(b'not a hip file', mode='wb')
+    results = dict(audit_hip_files([str(hip), str(broken)], str(tmpdir.join('lib')), processes=1))
+    assert isinstance(results[str(broken)], HipFormatError)
+    entry = results[str(hip)].entries[0]
+    assert entry['new'].endswith('/lib/wood.$F4.exr') and entry['refs'] == ['/obj/geo1/file1/file']
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import built-in modules
+import socket
+import threading
+
+# Import third-party modules
+import pytest
+
+# Import local modules
+import asset_index
+from asset_index import get_live_index
+from asset_index import release_live_indexes
+from index_server import IndexClient
+from index_server import IndexRequestHandler
+from index_server import IndexServer
+
+
+@pytest.fixture
+def library(tmpdir, make_files):
+    return make_files(tmpdir, ['lib/tex/wood.1001.exr', 'lib/tex/wood.1002.exr', 'lib/tex/rock_v003.1001.exr',
+                               'other/rock.1001.exr'])
+
+
+def test_server_roots(library):
+    server = IndexServer(('127.0.0.1', 0), IndexRequestHandler, [library + '/lib'], watch=False)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        client = IndexClient('http://127.0.0.1:{}'.format(server.server_address[1]))
+        assert client.available()
+        assert client.status()['roots'] == {library + '/lib': 2}
+        new_dict, missing_dict = client.get_new_file_knob_dict(library + '/lib', {'d:/old/wood.%04d.exr': ['n1'],
+                                                                                  'd:/old/gone.exr': ['n2']})
+        assert new_dict == {library + '/lib/tex/wood.%04d.exr': ['n1']}
+        assert missing_dict == {'d:/old/gone.exr': ['n2']}
+        # 按版本匹配时几个旧版本的parm（knob）合并到同一个新路径下
+        new_dict, _ = client.get_new_file_knob_dict(library + '/lib', {'d:/old/rock_v001.%04d.exr': ['n4'],
+                                                                       'd:/old/rock_v002.%04d.exr': ['n5']},
+                                                    version_mode='latest')
+        assert {key: sorted(value) for key, value in new_dict.items()} == \
+            {library + '/lib/tex/rock_v003.%04d.exr': ['n4', 'n5']}
+        with pytest.raises(Exception):
+            client.get_new_file_knob_dict(library + '/lib', {'d:/old/rock_v001.%04d.exr': ['n4']}, version_mode='x')
+        # 不在启动时指定的根目录下的路径不会建立新的索引
+        with pytest.raises(Exception):
+            client.get_new_file_knob_dict(library + '/other', {'d:/old/rock.%04d.exr': ['n3']})
+        assert list(server.indexes) == [library + '/lib']
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_no_leak_on_failure(library, monkeypatch):
+    started = []
+    start_index = asset_index.start_index
+
+    def fake_start_index(root, watch=True):
+        if started:
+            raise OSError('index failed')
+        started.append(start_index(root, watch))
+        return started[-1]
+
+    monkeypatch.setattr(asset_index, 'start_index', fake_start_index)
+    # 端口被占用时在建立索引之前就失败
+    blocker = socket.socket()
+    blocker.bind(('127.0.0.1', 0))
+    blocker.listen(1)
+    try:
+        with pytest.raises(socket.error):
+            IndexServer(blocker.getsockname(), IndexRequestHandler, [library + '/lib'])
+        assert started == []
+    finally:
+        blocker.close()
+    # 第二个根目录建立索引失败时，第一个根目录的监听线程停止
+    with pytest.raises(OSError):
+        IndexServer(('127.0.0.1', 0), IndexRequestHandler, [library + '/lib', library + '/other'])
+    _, watcher = started[0]
+    assert watcher._stop_event.is_set()
+
+
+def test_live_index_lock_and_eviction(library, monkeypatch):
+    monkeypatch.setattr(asset_index, 'MAX_LIVE_INDEXES', 1)
+    release_live_indexes()
+    try:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_live_index(library + '/lib')))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(id(index) for index in results)) == 1
+        assert len(asset_index._LIVE_INDEXES) == 1
+        _, watcher = asset_index._LIVE_INDEXES[results[0].root]
+        get_live_index(library + '/other')
+        assert list(asset_index._LIVE_INDEXES) == [library + '/other']
+        assert watcher._stop_event.is_set()
+    finally:
+        release_live_indexes()
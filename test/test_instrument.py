@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import local modules
+from dayu_path.mounts import _IO_COUNTER
+from instrument import INSTRUMENT
+from repath_core import get_path_all_file
+from utils import validate_sequences
+
+
+def test_counters(tmpdir, make_files):
+    root = make_files(tmpdir, ['a/x.1001.exr', 'a/x.1002.exr', 'b/notes.txt', 'b/deep/y.exr'])
+    INSTRUMENT.start()
+    try:
+        store = get_path_all_file(root, ['.exr'])
+        counters = dict(INSTRUMENT.counters)
+        assert counters['dirs_listed'] == 4
+        assert counters['regex_calls'] == len(store) == 2
+        assert counters['sequences_seen'] == 2
+        assert counters['files_seen'] == 3
+
+        INSTRUMENT.counters.clear()
+        validate_sequences([root + '/a/x.%04d.exr', root + '/b/deep/y.exr', root + '/b/gone.exr'],
+                           threads=1)
+        assert INSTRUMENT.counters['validate_dirs_listed'] == 1
+        # 序列的两帧各一次，单个文件各一次
+        assert INSTRUMENT.counters['stats_issued'] == 4
+    finally:
+        report = INSTRUMENT.stop()
+    assert report['phases']['scan']['calls'] == 1
+    assert _IO_COUNTER[0] is None
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import built-in modules
+import sys
+import types
+
+# Import third-party modules
+import pytest
+
+# Import local modules
+from instrument import INSTRUMENT
+from asset_index import SequenceIndex
+from repath_core import VERSION_EXACT
+from repath_core import VERSION_FALLBACK
+from repath_core import VERSION_LATEST
+from repath_core import can_fork
+from repath_core import get_new_file_knob_dict
+from repath_core import hou_file_parm_dict
+
+
+@pytest.fixture
+def new_root(tmpdir, make_files):
+    return make_files(tmpdir, ['tex/wood.1001.exr', 'tex/wood.1002.exr', 'tex/wood.1011.exr',
+                               'plate/plt.0001.exr', 'plate/plt.0002.exr'])
+
+
+def test_match_udim(new_root):
+    matches = {}
+    knob_dict = {'d:/old/wood.<UDIM>.exr': ['n1'], 'd:/old/plt.<UDIM>.exr': ['n2'], 'd:/old/plt.%04d.exr': ['n3']}
+    new_dict, rest = get_new_file_knob_dict(new_root, knob_dict, matches=matches)
+    assert new_dict == {new_root + '/tex/wood.<UDIM>.exr': ['n1'], new_root + '/plate/plt.%04d.exr': ['n3']}
+    # 编号不在1001到1999之间的序列不能匹配UDIM路径
+    assert rest == {'d:/old/plt.<UDIM>.exr': ['n2']}
+    assert matches['d:/old/wood.<UDIM>.exr'][1] == 'padding'
+
+
+def test_match_extensionless(new_root):
+    # 文件夹引用解析不出文件名，不能匹配，但是不影响其他路径
+    knob_dict = {'/nonexist/render': ['k'], 'd:/old/plt.%04d.exr': ['j']}
+    new_dict, rest = get_new_file_knob_dict(new_root, knob_dict)
+    assert new_dict == {new_root + '/plate/plt.%04d.exr': ['j']}
+    assert rest == {'/nonexist/render': ['k']}
+
+
+class FakeParm(object):
+    def __init__(self, raw_value, string_type='FileReference'):
+        self.raw_value = raw_value
+        self.string_type = string_type
+        self.locked = True
+
+    def parmTemplate(self):
+        name = lambda value: types.SimpleNamespace(name=lambda: value)
+        return types.SimpleNamespace(type=lambda: name('String'), stringType=lambda: name(self.string_type))
+
+    def rawValue(self):
+        return self.raw_value
+
+    def lock(self, on):
+        self.locked = on
+
+
+def test_hou_file_parm_dict(monkeypatch):
+    parms = [FakeParm('$HIP/tex/wood.$F4.exr'), FakeParm('$HIP/render'), FakeParm('/mnt/job/geo'),
+             FakeParm('//nas/lib/rock.exr'), FakeParm('tex/relative.exr'), FakeParm('$HIP/x.exr', 'Regular')]
+    root = types.SimpleNamespace(allParms=lambda: parms)
+    hou = types.SimpleNamespace(node=lambda path: root, getenv=lambda name: {'HIP': '/mnt/shot'}.get(name))
+    monkeypatch.setitem(sys.modules, 'hou', hou)
+    # 只收集有文件后缀的绝对路径，$HIP/render、/mnt/job/geo这样的文件夹不收集
+    file_parm_dict = hou_file_parm_dict(nonExist=False)
+    assert file_parm_dict == {'/mnt/shot/tex/wood.$F4.exr': [parms[0]], '//nas/lib/rock.exr': [parms[3]]}
+    assert not parms[0].locked and parms[1].locked
+
+
+@pytest.mark.skipif(not can_fork(), reason='matching in processes needs fork')
+def test_match_in_pool(tmpdir, make_files):
+    names = ['shot{:02d}/plt{}.{:04d}.exr'.format(shot, shot % 5, frame) for shot in range(20) for frame in (1, 2)]
+    root = make_files(tmpdir, names)
+    knob_dict = dict(('d:/old/shot{:02d}/plt{}.%04d.exr'.format(shot, shot % 5), ['n{}'.format(shot)])
+                     for shot in range(20))
+    knob_dict['d:/old/gone.%04d.exr'] = ['gone']
+    serial_matches, pool_matches = {}, {}
+    INSTRUMENT.start()
+    try:
+        serial = get_new_file_knob_dict(root, knob_dict, matches=serial_matches)
+        serial_counters = dict(INSTRUMENT.counters)
+        INSTRUMENT.counters = {}
+        pool = get_new_file_knob_dict(root, knob_dict, matches=pool_matches, processes=3)
+        pool_counters = dict(INSTRUMENT.counters)
+    finally:
+        INSTRUMENT.stop()
+    assert pool == serial
+    assert pool_matches == serial_matches
+    # 子进程里的计数也会带回父进程
+    assert pool_counters['regex_calls'] == serial_counters['regex_calls'] > 0
+
+
+@pytest.fixture
+def versioned_root(tmpdir, make_files):
+    return make_files(tmpdir, ['tex/wood_v003.1001.exr', 'tex/wood_v005.1001.exr', 'old/rock_v002.exr'])
+
+
+@pytest.mark.parametrize('use_index', [False, True])
+@pytest.mark.parametrize('version_mode, wood_v003, wood_v004', [
+    (None, 'wood_v003.%04d.exr', None),
+    (VERSION_EXACT, 'wood_v003.%04d.exr', None),
+    (VERSION_LATEST, 'wood_v005.%04d.exr', 'wood_v005.%04d.exr'),
+    (VERSION_FALLBACK, 'wood_v003.%04d.exr', 'wood_v005.%04d.exr'),
+])
+def test_version_modes(versioned_root, use_index, version_mode, wood_v003, wood_v004):
+    index = SequenceIndex(versioned_root).build() if use_index else None
+    matches = {}
+    knob_dict = {'d:/old/wood_v003.%04d.exr': ['n1'], 'd:/old/wood_v004.%04d.exr': ['n2'],
+                 'd:/old/plain.exr': ['n3']}
+    new_dict, rest = get_new_file_knob_dict(versioned_root, knob_dict, index=index, matches=matches,
+                                            version_mode=version_mode)
+    expected = {}
+    for name, knobs in [(wood_v003, ['n1']), (wood_v004, ['n2'])]:
+        if name:
+            expected.setdefault(versioned_root + '/tex/' + name, []).extend(knobs)
+    assert new_dict == expected
+    assert 'd:/old/plain.exr' in rest
+    if version_mode == VERSION_LATEST:
+        # 两个旧版本都匹配到最新的版本，parm（knob）合并在一起
+        assert new_dict == {versioned_root + '/tex/wood_v005.%04d.exr': ['n1', 'n2']}
+        assert matches['d:/old/wood_v004.%04d.exr'][1] == 'name:latest'
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import third-party modules
+import pytest
+
+# Import local modules
+from repath_plan import STATUS_EXISTS
+from repath_plan import STATUS_INCOMPLETE
+from repath_plan import STATUS_MISSING
+from repath_plan import STATUS_OK
+from repath_plan import RepathPlan
+from repath_plan import build_plan
+from repath_plan import msgpack
+
+
+@pytest.fixture
+def library(tmpdir, make_files):
+    make_files(tmpdir, ['lib/a/shot/plt.1001.exr', 'lib/a/shot/plt.1002.exr', 'lib/b/shot/plt.1001.exr',
+                        'lib/tex.1001.exr', 'lib/tex.1003.exr', 'old/here.exr'])
+    return tmpdir
+
+
+def test_build_plan(library):
+    root = str(library).replace('\\', '/')
+    references = {'d:/proj/a/shot/plt.%04d.exr': ['/obj/plt/file'],
+                  'd:/proj/tex.%04d.exr': ['/obj/tex/file', '/mat/tex/map'],
+                  root + '/old/here.exr': ['/obj/here/file'],
+                  'd:/proj/gone.exr': ['/obj/gone/file']}
+    plan = build_plan(root + '/lib', references, dcc='houdini')
+    entries = dict((entry['old'], entry) for entry in plan)
+    plate = entries['d:/proj/a/shot/plt.%04d.exr']
+    assert plate['new'] == root + '/lib/a/shot/plt.%04d.exr'
+    assert plate['reason'] == 'name:parent'
+    assert plate['status'] == STATUS_OK
+    texture = entries['d:/proj/tex.%04d.exr']
+    assert (texture['status'], texture['missing']) == (STATUS_INCOMPLETE, [1002])
+    assert entries[root + '/old/here.exr']['status'] == STATUS_EXISTS
+    assert entries['d:/proj/gone.exr']['status'] == STATUS_MISSING
+    assert len(plan.matched()) == 2 and len(plan.unmatched()) == 2
+    assert plan.new_file_ref_dict()[texture['new']] == ['/obj/tex/file', '/mat/tex/map']
+
+
+@pytest.mark.parametrize('suffix', ['.json', '.msgpack'])
+def test_plan_round_trip(library, suffix):
+    if suffix == '.msgpack' and msgpack is None:
+        pytest.skip('msgpack is not installed')
+    root = str(library).replace('\\', '/')
+    plan = build_plan(root + '/lib', {'d:/proj/tex.%04d.exr': ['/obj/tex/file']}, dcc='nuke')
+    filename = str(library.join('plan' + suffix))
+    plan.save(filename)
+    loaded = RepathPlan.load(filename)
+    assert (loaded.path, loaded.dcc, loaded.entries) == (plan.path, plan.dcc, plan.entries)
+
+
+def test_plan_version(library):
+    data = RepathPlan('d:/lib').to_dict()
+    data['version'] = RepathPlan.VERSION + 1
+    with pytest.raises(ValueError):
+        RepathPlan.from_dict(data)
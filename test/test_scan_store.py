@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import third-party modules
+import pytest
+
+# Import local modules
+from dayu_path import DayuPath
+from repath_core import get_path_all_file
+from scan_store import ScanStore
+from scan_store import frames_to_ranges
+from scan_store import missing_frames
+from scan_store import ranges_to_frames
+from utils import name_format
+
+
+def old_path_all_file(path, exts):
+    # ScanStore之前get_path_all_file返回的字典
+    result = {}
+    for file_name in DayuPath(path).scan(recursive=True, function_filter=lambda f: f.lower().endswith(exts)):
+        nf = name_format(file_name)
+        result.setdefault(nf.name, []).append({
+            'ext': nf.ext,
+            'filename': file_name,
+            'pattern': nf.pattern,
+            'pattern_num': nf.pattern_num,
+            'frames': file_name.frames,
+        })
+    return result
+
+
+@pytest.mark.parametrize('frames', [[], [1], [1, 2, 3, 5, 7, 8], [1001, 1002, 1011], [0, 2 ** 40, 2 ** 40 + 1]])
+def test_frame_ranges(frames):
+    assert ranges_to_frames(frames_to_ranges(frames)) == frames
+
+
+def test_store_matches_dict(tmpdir, make_files):
+    path = make_files(tmpdir, ['a/c.1001.exr', 'a/c.1002.exr', 'a/c.1004.exr', 'b/c.001.jpg', 'b/c.002.jpg',
+                               'b/d.exr', 'b/deep/c.1001.exr', 'b/e.mov', 'b/e_v001.exr'])
+    exts = ('.exr', '.jpg')
+    store = get_path_all_file(path, exts)
+    old = old_path_all_file(path, exts)
+    assert isinstance(store, ScanStore)
+    assert sorted(store.keys()) == sorted(old.keys())
+    assert len(store.dirs) == 3
+    for name, old_list in old.items():
+        new_list = store.get(name)
+        key = lambda attr_dict: attr_dict['filename']
+        for old_dict, new_dict in zip(sorted(old_list, key=key), sorted(new_list, key=key)):
+            assert new_dict == old_dict
+            assert new_dict['filename'].frames == old_dict['frames']
+    assert store.get('missing.') is None
+    assert 'c.' in store and 'missing.' not in store
+
+
+def test_missing_frames():
+    ranges = frames_to_ranges([1001, 1002, 1003, 1011])
+    assert missing_frames(ranges, [1002, 1005, 1011, 1012, 1000]) == [1005, 1012, 1000]
+    assert missing_frames([], [1001]) == [1001]
+    assert missing_frames(ranges, []) == []
+
+
+def test_store_frames(tmpdir, make_files):
+    path = make_files(tmpdir, ['plt.1001.exr', 'plt.1002.exr', 'plt.1003.exr', 'tex.1001.exr', 'tex.1012.exr'])
+    store = get_path_all_file(path, ('.exr',))
+    plate = store.get('plt.')[0]
+    # 从1001开始的普通序列不会被当成UDIM贴图
+    assert 'udim' not in plate
+    row = store.names['tex.'][0]
+    assert store.has_frames(row, [1001, 1012])
+    assert not store.has_frames(row, [1001, 1002])
+    assert store.frame_count(row) == 2
+
+
+def test_store_versions(tmpdir, make_files):
+    path = make_files(tmpdir, ['a/wood_v003.1001.exr', 'b/wood_v010.1001.exr', 'a/wood_v005.exr', 'rock_v001.exr',
+                               'plain.exr'])
+    store = get_path_all_file(path, ('.exr',))
+    assert store.versions('wood_v003.') == [(3, 'wood_v003.'), (10, 'wood_v010.')]
+    assert store.versions('wood_v999.') == store.versions('wood_v003.')
+    # 单个文件的name没有结尾的点，和同名的序列不是同一个资产
+    assert store.versions('wood_v005') == [(5, 'wood_v005')]
+    assert store.versions('rock_v001') == [(1, 'rock_v001')]
+    assert store.versions('plain') == []
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import third-party modules
+import pytest
+
+# Import local modules
+from sequence_diff import diff_roots
+from sequence_diff import main
+
+
+@pytest.fixture
+def roots(tmpdir, make_files):
+    old_root = make_files(tmpdir.join('old'), ['shot/plt.1001.exr', 'shot/plt.1002.exr', 'shot/plt.1003.exr',
+                                               'shot/gone.exr', 'Tex/wood.exr', 'shot/mov.1001.exr'])
+    new_root = make_files(tmpdir.join('new'), ['SHOT/plt.1001.exr', 'SHOT/plt.1003.exr', 'SHOT/new.exr',
+                                               'tex/wood.exr'])
+    make_files(tmpdir.join('new'), ['SHOT/mov.1001.exr'], content='22')
+    return old_root, new_root
+
+
+def test_diff_roots(roots):
+    diff = diff_roots(*roots)
+    assert diff.added == ['SHOT/new.exr']
+    assert diff.removed == ['shot/gone.exr']
+    assert diff.missing_frames == {'shot/plt.%04d.exr': [1002, 1002]}
+    assert diff.size_mismatch == {'shot/mov.%04d.exr': [1001, 1001]}
+    assert diff.collisions == {}
+    assert diff_roots(*roots, sizes=False).size_mismatch == {}
+
+
+def test_diff_case_collision(roots, tmpdir, make_files):
+    old_root, new_root = roots
+    # 区分大小写的文件系统上，新目录里有两个只有大小写不同的序列
+    make_files(tmpdir.join('new'), ['Tex/wood.exr'])
+    diff = diff_roots(old_root, new_root)
+    assert diff.collisions == {new_root: [['Tex/wood.exr', 'tex/wood.exr']]}
+    assert 'Tex/wood.exr' not in diff.removed and 'tex/wood.exr' not in diff.added
+
+
+def test_main_output(roots, tmpdir):
+    output = str(tmpdir.join('diff.json'))
+    diff = main(list(roots) + ['--no-sizes', '--output', output])
+    assert tmpdir.join('diff.json').check() and diff.removed == ['shot/gone.exr']
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Import third-party modules
+import pytest
+
+# Import local modules
+from utils import _localized_copy_task
+from utils import _scheduled_copy_task
+from utils import replace_version
+from utils import scan_directory
+from utils import _validate_directory
+from utils import shot_frame_ranges
+from utils import split_version
+from utils import validate_sequences
+
+
+@pytest.fixture
+def plate_dir(tmpdir, make_files):
+    make_files(tmpdir, ['plt.1001.exr', 'plt.1002.exr', 'plt.1004.exr', 'tex.1001.exr', 'tex.1012.exr',
+                        'single.mov', 'sub/inside.exr'])
+    tmpdir.join('plt.1005.exr').write('')
+    return tmpdir
+
+
+def test_scan_directory(plate_dir):
+    entries = scan_directory(str(plate_dir))
+    assert 'plt.1001.exr' in entries and 'sub' in entries
+    assert entries['plt.1001.exr']() == 1
+    assert entries['plt.1005.exr']() == 0
+    assert scan_directory(str(plate_dir.join('not_here'))) == {}
+
+
+def test_validate_directory(plate_dir):
+    directory = str(plate_dir).replace('\\', '/')
+    items = [(directory + '/plt.%04d.exr', None),
+             (directory + '/plt.####.exr', (1000, 1006)),
+             (directory + '/tex.<UDIM>.exr', None),
+             (directory + '/tex.<UDIM>.exr', [1001, 1002, 1012]),
+             (directory + '/nothing.%04d.exr', None)]
+    result = _validate_directory((directory, items, True))
+    assert [report for _, report in result] == [
+        (True, [1001, 1002, 1004, 1005], [1003], [1005]),
+        (True, [1001, 1002, 1004, 1005], [1000, 1003, 1006], [1005]),
+        (True, [1001, 1012], [], []),
+        (True, [1001, 1012], [1002], []),
+        (False, [], [], []),
+    ]
+    assert _validate_directory((directory, items[:1], False))[0][1][3] == []
+
+
+def test_validate_sequences(plate_dir):
+    directory = str(plate_dir).replace('\\', '/')
+    filenames = [directory + '/plt.%04d.exr', directory + '/tex.<UDIM>.exr', directory + '/single.mov',
+                 directory + '/gone.mov']
+    frame_ranges = shot_frame_ranges(filenames, (1001, 1006))
+    assert frame_ranges == {directory + '/plt.%04d.exr': (1001, 1006)}
+    assert shot_frame_ranges(filenames, None) == {}
+    report_dict = validate_sequences(filenames, frame_ranges, threads=2)
+    assert report_dict[directory + '/plt.%04d.exr'].missing == [1003, 1006]
+    assert report_dict[directory + '/tex.<UDIM>.exr'].missing == []
+    assert report_dict[directory + '/single.mov'].exists
+    assert not report_dict[directory + '/gone.mov'].exists
+
+
+def test_validate_udim_plate(tmpdir, make_files):
+    # 从1001开始的普通序列按连续的帧范围检查，UDIM路径只检查给出的贴图编号
+    directory = make_files(tmpdir, ['plt.1001.exr', 'plt.1003.exr', 'tex.1001.exr', 'tex.1003.exr'])
+    report_dict = validate_sequences([directory + '/plt.%04d.exr', directory + '/tex.<UDIM>.exr'],
+                                     {directory + '/tex.<UDIM>.exr': [1001, 1002, 1003, 1004]})
+    assert report_dict[directory + '/plt.%04d.exr'].missing == [1002]
+    assert report_dict[directory + '/tex.<UDIM>.exr'].missing == [1002, 1004]
+
+
+class FakeProgress(object):
+    # 代替ProgressBar.ProgressTask，cancel_after个文件以后wasCanceled返回True
+    def __init__(self, cancel_after=None):
+        self.cancel_after = cancel_after
+        self.files = 0
+
+    def setParentMessage(self, message):
+        pass
+
+    def setChildMessage(self, message):
+        self.files += 1
+
+    def setParentProgress(self, value):
+        pass
+
+    def setChildProgress(self, value):
+        pass
+
+    def wasCanceled(self):
+        return self.cancel_after is not None and self.files >= self.cancel_after
+
+
+def test_localized_copy_task(tmpdir, make_files):
+    src = make_files(tmpdir.join('src'), ['a.1001.exr', 'a.1002.exr', 'b.exr'])
+    out = str(tmpdir.join('out')).replace('\\', '/')
+    tmpdir.join('out/b.exr').write('old', ensure=True)
+    file_dict = {src + '/a.%04d.exr': [out, out + '2'], src + '/b.exr': out, src + '/gone.%04d.exr': out}
+    errors = _localized_copy_task(file_dict, ('copy',), False, FakeProgress(), [])
+    # 返回的是原文件序列路径，已经存在的目标文件不会被覆盖
+    assert sorted(errors) == [src + '/b.exr', src + '/gone.%04d.exr']
+    assert tmpdir.join('out/b.exr').read() == 'old'
+    assert tmpdir.join('out2/a.1002.exr').check()
+    assert _localized_copy_task({src + '/b.exr': out}, ('copy',), True, FakeProgress(), []) == []
+    assert tmpdir.join('out/b.exr').read() == '1'
+
+
+def test_localized_copy_cancel(tmpdir, make_files):
+    src = make_files(tmpdir.join('src'), ['a.1001.exr', 'b.1001.exr'])
+    out = str(tmpdir.join('out')).replace('\\', '/')
+    file_dict = {src + '/a.%04d.exr': [out, out + '2'], src + '/b.%04d.exr': out}
+    assert _localized_copy_task(file_dict, ('copy',), False, FakeProgress(cancel_after=1), []) == []
+    # 第一个文件放好以后就取消了，后面的输出文件夹和序列都不再拷贝
+    assert len(tmpdir.join('out').listdir()) == 1
+    assert not tmpdir.join('out2').check()
+
+
+def test_scheduled_copy_task(tmpdir, make_files):
+    from dayu_path.throttle import CopyScheduler
+    src = make_files(tmpdir.join('src'), ['a.1001.exr', 'a.1002.exr', 'b.exr'])
+    out = str(tmpdir.join('out')).replace('\\', '/')
+    tmpdir.join('out/b.exr').write('old', ensure=True)
+    scheduler = CopyScheduler(workers=1, strategies=('copy',))
+    file_dict = {src + '/a.%04d.exr': [out, out + '2'], src + '/b.exr': out, src + '/gone.%04d.exr': out}
+    errors = _scheduled_copy_task(file_dict, scheduler, (1002, 1002), False, FakeProgress(), [])
+    assert sorted(errors) == [src + '/b.exr', src + '/gone.%04d.exr']
+    assert tmpdir.join('out/b.exr').read() == 'old'
+    assert tmpdir.join('out2/a.1001.exr').check()
+    assert _scheduled_copy_task({src + '/b.exr': out}, scheduler, None, True, FakeProgress(), []) == []
+    assert tmpdir.join('out/b.exr').read() == '1'
+
+
+@pytest.mark.parametrize('name, result', [
+    ('pl_0010_plt_v0003.', ('pl_0010_plt_v#.', 3, 'v0003')),
+    ('tex_V12_v004_diffuse.', ('tex_V12_v#_diffuse.', 4, 'v004')),
+    ('wood.', None),
+    ('dev001.', None),
+    ('v2.', ('v#.', 2, 'v2')),
+])
+def test_split_version(name, result):
+    assert split_version(name) == result
+
+
+def test_replace_version():
+    assert replace_version('tex_v003.$F4.exr', 'v005') == 'tex_v005.$F4.exr'
+    assert replace_version('v1/tex_v003_v004.exr', 'v010') == 'v1/tex_v003_v010.exr'
+    assert replace_version('wood.exr', 'v005') == 'wood.exr'
@@ -5,6 +5,17 @@
 # Email : zwf.vfx@Foxmail.com
 ###################################################################
 
+from instrument import INSTRUMENT
+
+
+def norm_key(path):
+    """
+    路径比较用的标准化key：反斜杠换成正斜杠并且全部小写，例如 'D:\\Proj\\Tex.EXR' ——> 'd:/proj/tex.exr'
+    :param path: 路径或者文件名
+    :return: 标准化的字符串
+    """
+    return path.replace('\\', '/').lower()
+
 
 def name_format(filename):
     """
@@ -20,6 +31,7 @@ def name_format(filename):
     import re
     import os
     from collections import namedtuple
+    INSTRUMENT.count('regex_calls')
     basename = os.path.basename(filename)
     num = len(basename.split('.'))
     if num == 1:
@@ -74,6 +86,63 @@ def name_format(filename):
     return nameformat(name, pattern, ext, absname, pattern_num)
 
 
+# UDIM贴图的编号范围，1001是第一块，每行10块，最多100行
+UDIM_FIRST = 1001
+UDIM_LAST = 1999
+
+
+def is_udim_pattern(pattern):
+    """
+    判断name_format得到的pattern是不是UDIM标记，<UDIM>（nuke、arnold、redshift）或者%(UDIM)d（houdini、renderman）
+    :param pattern: name_format得到的pattern
+    :return: bool
+    """
+    return bool(pattern) and pattern.lower() in ('<udim>', '%(udim)d')
+
+
+def is_udim_tiles(frames):
+    """
+    判断一组排好序的编号能不能是一套UDIM贴图（都在1001到1999之间）。只看编号没法区分UDIM贴图和从1001开始的普通序列，
+    所以是不是UDIM由路径里的<UDIM>、%(UDIM)d标记决定，这个函数只用来排除UDIM路径不可能匹配的序列
+    :param frames: 排好序的编号列表
+    :return: bool
+    """
+    return bool(frames) and UDIM_FIRST <= frames[0] and frames[-1] <= UDIM_LAST
+
+
+# 文件名里的版本号，例如tex_v003、plt_V0012，前面不能是字母，避免把rev12、dev3当成版本号
+VERSION_TOKEN_REGEX = r'(?<![a-zA-Z])[vV](\d+)(?!\d)'
+
+
+def split_version(name):
+    """
+    把name_format得到的name分成不带版本号的资产名字和版本号，同一个资产的不同版本得到一样的资产名字，例如：
+    'pl_0010_plt_v0003.' ——> ('pl_0010_plt_v#.', 3, 'v0003')
+    :param name: name_format得到的name，或者文件名
+    :return: (资产名字, 版本号, 版本号字符串)，没有版本号时返回None
+    """
+    import re
+    match = None
+    for match in re.finditer(VERSION_TOKEN_REGEX, name):
+        pass
+    if match is None:
+        return None
+    return name[:match.start()] + 'v#' + name[match.end():], int(match.group(1)), match.group(0)
+
+
+def replace_version(name, token):
+    """
+    把文件名里最后一个版本号换成token，例如 ('tex_v003.$F4.exr', 'v005') ——> 'tex_v005.$F4.exr'
+    """
+    import re
+    match = None
+    for match in re.finditer(VERSION_TOKEN_REGEX, name):
+        pass
+    if match is None:
+        return name
+    return name[:match.start()] + token + name[match.end():]
+
+
 def find_folder_name(path):
     """
     检测已存在的文件夹，如果已存在，则返回一个新名字，末尾自带(x)排序,例如D:/a/b, D:/a/b(1), D:/a/b(2)
@@ -131,32 +200,42 @@ def is_ascii(s):
     return isprintable
 
 
-def get_all_file(lpath, recursive=False, ext='*'):
+def get_all_file(lpath, recursive=False, ext='*', exclude=None, max_depth=None, ignore_hidden=False):
     """
     列出所有的指定格式的文件，如果没有给格式则列出所有文件
     :param lpath: 要查找的路径
     :param recursive:是否要循环查找子文件夹，默认为不查找
     :param ext: 要筛选的文件格式,可以是单个格式字符串，也可以是格式的列表
+    :param exclude: 递归查找时不进入的文件夹规则列表，见dayu_path.prune.DirectoryPruner，根目录下的.scanignore也会读取
+    :param max_depth: 递归查找时最多进入几层子文件夹，None表示不限制
+    :param ignore_hidden: 递归查找时是否跳过隐藏文件夹
     :return: 返回寻找到的文件列表
     """
     import os
+    from dayu_path.mounts import io_profile
+    from dayu_path.prune import DirectoryPruner
+    from dayu_path.prune import walk_tree
     file_list = []
+    if recursive:
+        pruner = DirectoryPruner(lpath, exclude=exclude, max_depth=max_depth, ignore_hidden=ignore_hidden)
+        workers = io_profile(lpath).walk_workers
+    else:
+        # 不往子文件夹遍历时只读取lpath本身，子文件夹在进入之前就跳过
+        pruner = DirectoryPruner(lpath, max_depth=0, ignore_hidden=False, ignore_file=None)
+        workers = 1
+
+    def walk():
+        for dirpath, _, filenames in walk_tree(lpath, pruner, workers):
+            yield dirpath, filenames
 
     if ext == '*':
-        for dirpath, _, filenames in os.walk(lpath):
-            if not recursive:
-                # 如果不往子文件夹遍历就检查列出的文件路径和输入的文件路径是否相同，不同则为子文件夹，就continue
-                if lpath.replace('\\', '/').lower() != dirpath.replace('\\', '/').lower():
-                    continue
+        for dirpath, filenames in walk():
             for name in filenames:
                 file_list.append('/'.join((dirpath, name)).replace('\\', '/'))
     else:
         exts = ext if isinstance(ext, (list, tuple)) else [ext]
         ext_list = [e.lower() if '.' in e else '.'+e.lower() for e in exts]
-        for dirpath, dirnames, filenames in os.walk(lpath):
-            if not recursive:
-                if lpath.replace('\\', '/').lower() != dirpath.replace('\\', '/').lower():
-                    continue
+        for dirpath, filenames in walk():
             for name in filenames:
                 if os.path.splitext(name)[-1].lower() in ext_list:
                     file_list.append('/'.join((dirpath, name)).replace('\\', '/'))
@@ -200,40 +279,317 @@ def get_pattern_sequence(filename, flag=False):
     return file_list
 
 
-def recursive_file(filename, file_list, slice_=-2):
+def scan_directory(directory):
+    """
+    列出一个文件夹下的所有文件和子文件夹，只做一次目录读取，返回文件名和获取文件大小方法的字典。
+    有os.scandir（或者scandir模块）时使用它，windows下文件大小直接来自目录读取结果，不需要再stat。
+    :param directory: 文件夹路径
+    :return: {文件名: 返回文件大小的函数}，文件夹不存在返回空字典
+    """
+    import os
+    try:
+        from os import scandir
+    except ImportError:
+        try:
+            from scandir import scandir
+        except ImportError:
+            scandir = None
+
+    def entry_size(entry):
+        INSTRUMENT.count('stats_issued')
+        return entry.stat().st_size
+
+    def path_size(name):
+        INSTRUMENT.count('stats_issued')
+        return os.path.getsize(os.path.join(directory, name))
+
+    INSTRUMENT.count('validate_dirs_listed')
+    try:
+        if scandir is not None:
+            return dict((entry.name, lambda entry=entry: entry_size(entry)) for entry in scandir(directory))
+        return dict((name, lambda name=name: path_size(name)) for name in os.listdir(directory))
+    except OSError:
+        return {}
+
+
+def _validate_directory(args):
+    """
+    validate_sequences的线程任务，读取一次文件夹，校验同一个文件夹下的所有序列
+    :param args: (文件夹路径, [(序列完整路径, 帧范围或None), ...], 是否检查0字节文件)
+    :return: [(文件完整路径, (是否存在, 已有帧列表, 缺失帧列表, 0字节帧列表)), ...]
+    """
+    import re
+    from scan_store import frames_to_ranges
+    from scan_store import missing_frames
+    from scan_store import ranges_difference
+    from scan_store import ranges_to_frames
+    directory, items, check_empty = args
+    entries = scan_directory(directory or '.')
+    result = []
+    for filename, frame_range in items:
+        nameformat = name_format(filename)
+        digits = r'\d{{{},}}'.format(nameformat.pattern_num) if nameformat.pattern_num else r'\d+'
+        frame_regex = re.compile(r'^{}({})\.{}$'.format(re.escape(nameformat.name), digits, re.escape(nameformat.ext)),
+                                 re.IGNORECASE)
+        frame_sizes = {}
+        for name, size in entries.items():
+            match = frame_regex.match(name)
+            if match:
+                frame_sizes[int(match.group(1))] = size
+        frames = sorted(frame_sizes)
+        # 缺少的帧在压缩的帧段上计算，几万张的UDIM贴图和很长的帧范围都不需要逐帧比较
+        ranges = frames_to_ranges(frames)
+        if is_udim_pattern(nameformat.pattern):
+            # UDIM贴图本来就不是连续的，只有给出了需要的贴图编号时才检查缺少的贴图
+            missing = missing_frames(ranges, sorted(frame_range)) if frame_range else []
+        elif frame_range:
+            missing = ranges_to_frames(ranges_difference([int(frame_range[0]), int(frame_range[-1])], ranges))
+        elif frames:
+            missing = ranges_to_frames(ranges_difference([frames[0], frames[-1]], ranges))
+        else:
+            missing = []
+        empty = [frame for frame in frames if not frame_sizes[frame]()] if check_empty else []
+        result.append((filename, (bool(frames), frames, missing, empty)))
+    return result
+
+
+def validate_sequences(filenames, frame_ranges=None, threads=None, check_empty=True):
+    """
+    并行校验一批文件或者序列是否完整存在。序列所在的文件夹只读取一次目录，不是每一帧stat一次，
+    单个文件用DayuPath.stat_many批量查询，不同的文件夹在线程池里同时读取，例如：
+    {'d:/a/b.%04d.exr': (exists=True, frames=[1001, 1002, 1004], missing=[1003], empty=[1004]),
+     'd:/a/c.exr': (exists=False, frames=[], missing=[], empty=[]),
+    }
+    :param filenames: 文件或序列路径列表 ['d:/a/b.%04d.exr', 'd:/a/c.exr']
+    :param frame_ranges: 可选的{序列路径: (开始帧, 结束帧)}字典，没有给出的序列用找到的最小帧和最大帧作为帧范围；
+                         UDIM路径（<UDIM>、%(UDIM)d）的值是需要的贴图编号列表，没有给出时不检查缺少的贴图
+    :param threads: 同时读取文件夹的线程数，None时按第一个路径所在的文件系统选择
+    :param check_empty: 是否检查0字节的文件，linux下需要对找到的每个文件stat一次
+    :return: {路径: namedtuple(exists, frames, missing, empty)}，单文件的empty里是文件名
+    """
+    import os
+    from collections import namedtuple
+    from multiprocessing.pool import ThreadPool
+    from dayu_path import DayuPath
+    sequence_report = namedtuple('sequence_report', ['exists', 'frames', 'missing', 'empty'])
+    frame_ranges = frame_ranges or {}
+    directory_dict = {}
+    single_files = []
+    for filename in filenames:
+        nameformat = name_format(filename)
+        if not nameformat or not nameformat.pattern or nameformat.pattern.isdigit():
+            single_files.append(filename)
+            continue
+        directory = os.path.dirname(filename.replace('\\', '/'))
+        directory_dict.setdefault(directory, []).append((filename, frame_ranges.get(filename)))
+    report_dict = {}
+    if threads is None:
+        sample = os.path.dirname(single_files[0].replace('\\', '/')) if single_files else next(iter(directory_dict), '')
+        threads = DayuPath(sample or '.').io_profile.stat_workers
+    if single_files:
+        stat_dict = DayuPath.stat_many(single_files, workers=threads, only_exists=not check_empty)
+        for filename in single_files:
+            st = stat_dict.get(filename)
+            empty = [os.path.basename(filename)] if check_empty and st is not None and not st.st_size else []
+            report_dict[filename] = sequence_report(bool(st), [], [], empty)
+    tasks = [(directory, items, check_empty) for directory, items in directory_dict.items()]
+    if len(tasks) > 1 and threads > 1:
+        pool = ThreadPool(min(threads, len(tasks)))
+        try:
+            results = pool.map(_validate_directory, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_validate_directory(task) for task in tasks]
+    for result in results:
+        for filename, report in result:
+            report_dict[filename] = sequence_report(*report)
+    return report_dict
+
+
+def shot_frame_ranges(filenames, frame_range):
+    """
+    给validate_sequences用的帧范围字典：所有序列都使用工程的帧范围，UDIM贴图和单个文件不需要帧范围
+    :param filenames: 文件或序列路径列表
+    :param frame_range: 工程的(开始帧, 结束帧)，None时返回空字典
+    :return: {序列路径: (开始帧, 结束帧)}
+    """
+    if not frame_range:
+        return {}
+    frame_ranges = {}
+    for filename in filenames:
+        nameformat = name_format(filename)
+        if nameformat and nameformat.pattern and not nameformat.pattern.isdigit() \
+                and not is_udim_pattern(nameformat.pattern):
+            frame_ranges[filename] = frame_range
+    return frame_ranges
+
+
+def path_suffix_key(path):
+    """
+    把路径拆分成小写、倒序的路径元组，用来做最长公共后缀的比较，例如：
+    'D:/a/B/c.exr'  ——>  ('c.exr', 'b', 'a', 'd:')
+    :param path: 文件完整路径
+    :return: 倒序的路径名字元组
+    """
+    return tuple(reversed(norm_key(path).split('/')))
+
+
+def recursive_file(filename, file_list, slice_=-2, key_cache=None):
     """
     当出现不同文件重名的情况时，例如'D:/a/b/c.exr'和'D:/a/e/c.exr'都是a总文件夹下里的c.exr，但是父文件夹不一样，
-    调用此函数会从父级一层一层查找相同名，直到找到位置，否则返回False
+    调用此函数会从父级一层一层比较相同名，找出和给定路径父级文件夹最长公共后缀的那个文件，否则返回False。
+    每个路径只会拆分和小写一次，得到倒序的父级文件夹元组（见path_suffix_key），然后一次遍历就能找到最匹配的文件。
     :param filename: 给定的要替换的文件路径
     :param file_list: 列出来的重名的文件列表
-    :param slice_: 要查找的文件名字序号，因为要从父级查找所以是-2开始，也就是文件所在的文件夹名字，如果有两个或两个以上都一样，就继续往上找，直至不同
+    :param slice_: 开始比较的文件名字序号，因为要从父级查找所以是-2开始，也就是文件所在的文件夹名字
+    :param key_cache: 可选的字典，缓存每个路径的path_suffix_key结果，多次调用时传入同一个字典可以避免重复拆分路径
     :return: 如果找到就返回文件，否则False
     """
     if filename in file_list:
         return filename
     if len(file_list) == 1:
         return file_list[0]
-    file_name_list = filename.replace('\\', '/').split('/')
-    if -len(file_name_list) > slice_:
+    key_cache = {} if key_cache is None else key_cache
+    skip = -slice_ - 1
+
+    def suffix_key(path):
+        key = key_cache.get(path)
+        if key is None:
+            key = key_cache.setdefault(path, path_suffix_key(path))
+        return key[skip:]
+
+    target = suffix_key(filename)
+    if not target:
         return file_list[-1]
-    folder_name = file_name_list[slice_].lower()
-    file_parent_name_list = [f for f in file_list if f.replace('\\', '/').split('/')[slice_].lower() == folder_name]
-    if not file_parent_name_list:
+    best_score = -1
+    best_list = []
+    for file_ in file_list:
+        key = suffix_key(file_)
+        score = 0
+        for target_part, part in zip(target, key):
+            if target_part != part:
+                break
+            score += 1
+        if score > best_score:
+            best_score = score
+            best_list = [file_]
+        elif score == best_score:
+            best_list.append(file_)
+    if not best_score:
         return False if slice_ == -1 else file_list[0]
-    elif len(file_parent_name_list) == 1:
-        return file_parent_name_list[0]
-    else:
-        return recursive_file(filename, file_parent_name_list, slice_-1)
+    # 所有父级文件夹都一样时（给定路径的层级已经比较完），和原来逐层查找一样返回最后一个
+    if len(best_list) > 1 and best_score == len(target):
+        return best_list[-1]
+    return best_list[0]
+
+
+def _scheduled_copy_task(file_dict, scheduler, frame_range, overwrite, pt, error_list):
+    """
+    copy_progress_task使用CopyScheduler时的实现，先把所有序列加进调度器，再一起拷贝
+    """
+    import os
+    from dayu_path import DayuPath
+    total = 0
+    # {目标文件: 原文件序列路径}，拷贝失败时记录的是原文件序列路径
+    source_dict = {}
+    for from_file, output in file_dict.items():
+        from_ = get_pattern_sequence(from_file) if output else []
+        if not from_:
+            error_list.append(from_file)
+            continue
+        out_list = list(output) if isinstance(output, (list, tuple, set)) else [output]
+        frames = [DayuPath(src).frame for src in from_]
+        frames = [None if frame == -1 else frame for frame in frames]
+        for out_path in out_list:
+            out_path = out_path.replace('\\', '/').rstrip('/')
+            pairs = [(src, '/'.join((out_path, os.path.basename(src)))) for src in from_]
+            scheduler.add_sequence(pairs, frames, frame_range, sequence=(from_file, out_path))
+            source_dict.update((dst, from_file) for _, dst in pairs)
+            total += len(pairs)
+    progress = {'number': 0}
+
+    def callback(dst, result):
+        progress['number'] += 1
+        if isinstance(result, Exception) and source_dict[dst] not in error_list:
+            error_list.append(source_dict[dst])
+        pt.setChildMessage('Child {} "<font color=yellow>{}</font>"  ({})'.format(
+            result if not isinstance(result, Exception) else 'Error', os.path.basename(dst),
+            str(progress['number'])+' of '+str(total)))
+        pt.setParentProgress((float(progress['number'])/total)*100)
+        if pt.wasCanceled():
+            scheduler.cancel()
+
+    pt.setParentMessage('Parent Copy {} files from {} sequences'.format(total, len(file_dict)))
+    scheduler.run(callback=callback, overwrite=overwrite)
+    pt.setParentProgress(100)
+    return error_list
+
+
+def _localized_copy_task(file_dict, strategies, overwrite, pt, error_list):
+    """
+    copy_progress_task使用strategies时的实现，每放好一个文件检查一次是否取消，取消以后还没开始的文件不再放置
+    """
+    import os
+    import threading
+    from dayu_path.localize import localize_files
+    stop_event = threading.Event()
+    from_file_number = len(file_dict)
+    for num, (from_file, output) in enumerate(file_dict.items(), 1):
+        if stop_event.is_set():
+            break
+        from_ = get_pattern_sequence(from_file) if output else []
+        if not from_:
+            error_list.append(from_file)
+            continue
+        pt.setParentMessage('Parent Copy "<font color=yellow>{}</font>" sequence ({})'.format(
+            os.path.basename(from_file), str(num)+' of '+str(from_file_number)))
+        out_list = list(output) if isinstance(output, (list, tuple, set)) else [output]
+        failed = []
+        for out_path in out_list:
+            if stop_event.is_set():
+                break
+            out_path = out_path.replace('\\', '/').rstrip('/')
+            if not os.path.exists(out_path):
+                os.makedirs(out_path, 0o777)
+            pairs = [(src, '/'.join((out_path, os.path.basename(src)))) for src in from_]
+            progress = {'number': 0}
+
+            def callback(dst, result):
+                progress['number'] += 1
+                if isinstance(result, Exception):
+                    failed.append(dst)
+                pt.setChildMessage('Child {} "<font color=yellow>{}</font>"  ({})'.format(
+                    result if not isinstance(result, Exception) else 'Error', os.path.basename(dst),
+                    str(progress['number'])+' of '+str(len(pairs))))
+                pt.setChildProgress((float(progress['number'])/len(pairs))*100)
+                if pt.wasCanceled():
+                    stop_event.set()
+
+            localize_files(pairs, strategies=strategies, parents=False, callback=callback, stop_event=stop_event,
+                           overwrite=overwrite)
+        if failed:
+            error_list.append(from_file)
+        pt.setParentProgress((float(num)/from_file_number)*100)
+    pt.setParentProgress(100)
+    return error_list
 
 
-def copy_progress_task(file_dict):
+def copy_progress_task(file_dict, strategies=None, scheduler=None, frame_range=None, overwrite=False):
     """
     一个双进度条的拷贝函数，父进度条显示的是每个序列的整体进度，子进度条显示的是每个文件在其所在序列里的进度
     :param file_dict: 导入的必须是原文件序列和输出的文件夹组成字典,输出文件夹可以使个列表，也就是一套序列可以复制到多个文件夹里，类似于
                       {d:/a/b/c.%04d.exr: d:/output,
                       d:/a/b/c.%04d.exr: [d:/output, d:/output2]
                       }
-    :return: 无法拷贝的路径
+    :param strategies: 可选的放置方式列表，例如 ('reflink', 'copy')，见dayu_path.localize。
+                       给出时不使用robocopy，同一个磁盘上用克隆（明确给出'hardlink'时也可以用硬链接），跨磁盘时并行字节拷贝
+    :param scheduler: 可选的dayu_path.throttle.CopyScheduler，给出时所有序列交给它限速拷贝，
+                      多个序列轮流拷贝，父进度条显示的是所有文件的整体进度
+    :param frame_range: 使用scheduler时可选的(开始帧, 结束帧)，当前镜头帧范围内的帧先拷贝
+    :param overwrite: 使用strategies或者scheduler时目标文件已经存在是否覆盖，不覆盖时这个序列算作无法拷贝
+    :return: 无法拷贝的原文件序列路径
     """
     import os
     import subprocess
@@ -242,6 +598,10 @@ def copy_progress_task(file_dict):
 
     error_list = []
     pt = ProgressTask('Copy files')
+    if scheduler is not None:
+        return _scheduled_copy_task(file_dict, scheduler, frame_range, overwrite, pt, error_list)
+    if strategies:
+        return _localized_copy_task(file_dict, strategies, overwrite, pt, error_list)
     stop_flag = False
     from_file_number = len(file_dict.keys())
     for num, (from_file, output) in enumerate(file_dict.items(), 1):